@@ -1,27 +1,136 @@
 import streamlit as st
 import os
-import subprocess
 import json
+import time
 from pathlib import Path
+from contextlib import closing
 from datetime import datetime
 
+from scripts.results_index import load_index as load_results_index, step_status, find_files, list_dir
+from scripts.job_runner import SubmissionManager
+from scripts.log_tail import LogTail, grep_log, ERROR_PATTERN
+from scripts import telemetry
+from scripts import executor as local_executor
+from scripts import ui_cache
+from scripts import sample_registry
+from scripts.download_server import DownloadServer, TOKEN_TTL
+from scripts.fastq_inventory import load_inventory, barcode_summary
+from scripts.coverage_store import CoverageStore
+from scripts.step_manifest import load_manifests, STEP_NAMES
+from scripts.sample_sheet import batch_status
+
 # Définit ici le dossier de base contenant les FASTQ
 base_folder_fastq = "/scratch/dkdiakite/data/archives/test_pipline/fastq_pass"
 def list_files(base_path, extensions=None):
-    """Liste tous les fichiers dans un dossier avec les extensions spécifiées"""
-    files_list = []
+    """Liste tous les fichiers dans un dossier avec les extensions spécifiées (inventaire en cache)"""
     if not os.path.exists(base_path):
         st.warning(f"Le dossier {base_path} n'existe pas.")
-        return files_list
-        
-    for root, dirs, files in os.walk(base_path):
-        for file in files:
-            if extensions:
-                if any(file.endswith(ext) for ext in extensions):
-                    files_list.append(os.path.relpath(os.path.join(root, file), base_path))
-            else:
-                files_list.append(os.path.relpath(os.path.join(root, file), base_path))
-    return sorted(files_list)
+        return []
+    return ui_cache.fastq_files(base_path, tuple(extensions) if extensions else None)
+
+
+@st.cache_resource
+def open_coverage_store(path, mtime):
+    """Store de couverture ouvert une fois par version du fichier (bins lus à la demande)."""
+    return CoverageStore(path)
+
+
+def display_coverage(sample_dir):
+    """Couverture par contig et profil d'une région, lus depuis qc/coverage.cov."""
+    store_path = sample_dir / "qc" / "coverage.cov"
+    if not store_path.exists():
+        return
+    try:
+        store = open_coverage_store(str(store_path), store_path.stat().st_mtime)
+    except (OSError, ValueError) as e:
+        st.error(f"Fichier de couverture illisible : {e}")
+        return
+
+    st.markdown(f"**Couverture** (bins de {store.bin_size} pb)")
+    st.dataframe(
+        [
+            {
+                "Contig": row["contig"],
+                "Longueur": row["length"],
+                "Moyenne (X)": round(row["mean"], 2),
+                **{f"≥{n}X (%)": round(row[f"pct_{n}x"], 2) for n in (1, 10, 20, 30)},
+            }
+            for row in store.summary()
+        ],
+        hide_index=True,
+    )
+    if not store.exact_hist:
+        st.caption("Fractions ≥ N X estimées à partir des bins (fichier issu de mosdepth)")
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        contig = st.selectbox("Contig", store.contigs, key=f"cov_contig_{sample_dir.name}")
+    length = store.length(contig)
+    with col2:
+        start = st.number_input("Début", min_value=0, max_value=length, value=0,
+                                key=f"cov_start_{sample_dir.name}")
+    with col3:
+        end = st.number_input("Fin", min_value=0, max_value=length, value=length,
+                              key=f"cov_end_{sample_dir.name}")
+    if end <= start:
+        st.warning("La fin doit être supérieure au début")
+        return
+    positions, means = store.profile(contig, int(start), int(end))
+    st.caption(f"Profondeur moyenne sur la région : {store.mean(contig, int(start), int(end)):.2f} X")
+    st.line_chart({"position": positions, "profondeur": means}, x="position", y="profondeur")
+
+
+@st.fragment
+def display_fastq_volume(base_path):
+    """Volume d'entrée par barcode, avec comptage des lectures à la demande."""
+    inventory = load_inventory(base_path)
+    with st.expander(f"📊 Volume par barcode ({len(inventory['files'])} fichiers)"):
+        compute = st.button("🔢 Compter lectures et bases", key="count_fastq_reads",
+                            help="Lecture complète des FASTQ non encore comptés (résultat mis en cache)")
+        if compute:
+            with st.spinner("Comptage des lectures..."):
+                summary = barcode_summary(inventory, compute_counts=True)
+        else:
+            summary = barcode_summary(inventory)
+        st.dataframe(
+            [
+                {
+                    "Barcode": row["barcode"],
+                    "Fichiers": row["files"],
+                    "Taille (GB)": round(row["bytes"] / 1024 ** 3, 2),
+                    "Lectures": row["reads"] if row["counted"] == row["files"] else None,
+                    "Bases (Gb)": round(row["bases"] / 1e9, 2) if row["counted"] == row["files"] else None,
+                }
+                for row in summary
+            ],
+            hide_index=True,
+        )
+
+STATE_ICONS = {"COMPLETED": "✅", "RUNNING": "🔄", "PENDING": "⏳", "REQUEUED": "⏳"}
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_batch_status(batch_dir):
+    """États sacct d'un lot, rafraîchis au plus une fois par minute."""
+    return batch_status(batch_dir)
+
+
+def display_status_matrix(rows):
+    """Matrice échantillon × étape (une ligne par échantillon, une colonne par étape)."""
+    def cell(state):
+        if not state or state == "UNKNOWN":
+            return "—"
+        return f"{STATE_ICONS.get(state, '❌')} {state}"
+
+    st.dataframe(
+        [
+            {"Échantillon": row["sample"],
+             **{f"{step}. {STEP_NAMES[int(step)]}": cell(state) for step, state in row.items() if step != "sample"}}
+            for row in rows
+        ],
+        hide_index=True,
+        use_container_width=True,
+    )
 # Configuration de la page
 st.set_page_config(
     page_title="Pipeline Hematim - UPJV",
@@ -41,79 +150,229 @@ if 'sample_name' not in st.session_state:
 if 'config_loaded' not in st.session_state:
     st.session_state.config_loaded = False
 
-# Fonction pour charger la configuration
+# Fonction pour charger la configuration (registre, à défaut config_<sample>.txt importé)
 def load_config(sample_name):
-    config_file = f"results/{sample_name}/config_{sample_name}.txt"
-    config = {}
-    if os.path.exists(config_file):
-        with open(config_file, 'r') as f:
-            for line in f:
-                if '=' in line:
-                    key, value = line.strip().split('=', 1)
-                    config[key] = value
+    with closing(sample_registry.connect()) as conn:
+        config = sample_registry.get_params(conn, sample_name)
+        if config is None:
+            config_file = sample_registry.config_path(sample_name)
+            if not os.path.exists(config_file):
+                return {}
+            sample_registry.import_config(conn, config_file)
+            config = sample_registry.get_params(conn, sample_name)
     return config
 
-# Fonction pour sauvegarder la configuration
+# Fonction pour sauvegarder la configuration (registre + export de config_<sample>.txt pour run_pipeline.sh)
 def save_config(sample_name, config):
-    result_dir = f"results/{sample_name}"
-    os.makedirs(result_dir, exist_ok=True)
-    config_file = f"{result_dir}/config_{sample_name}.txt"
-    
-    with open(config_file, 'w') as f:
-        for key, value in config.items():
-            f.write(f"{key}={value}\n")
+    with closing(sample_registry.connect()) as conn:
+        sample_registry.save_config(conn, sample_name, config, replace=True)
+    # Le nouvel échantillon n'attend pas l'expiration des caches de la sidebar
+    ui_cache.list_samples.clear()
+    ui_cache.registered_samples.clear()
+
+@st.cache_resource
+def get_submission_manager():
+    """Pool de soumissions partagé par toutes les sessions (survit aux reruns)."""
+    return SubmissionManager(max_workers=4)
+
 
-def run_pipeline_command(command):
-    """Exécute une commande bash de manière sécurisée avec gestion des erreurs."""
-    import shlex
+@st.cache_resource
+def get_download_server():
+    """(serveur de téléchargement en flux partagé par toutes les sessions, erreur).
+
+    Un échec d'ouverture du port est conservé : il n'est pas retenté à chaque clic."""
     try:
-        if isinstance(command, str):
-            cmd_list = shlex.split(command)
-        else:
-            cmd_list = command
+        return DownloadServer(allowed_roots=("results", "logs")), None
+    except OSError as e:
+        return None, str(e)
 
 
-        process = subprocess.run(
-            cmd_list,
-            capture_output=True,
-            text=True,
-            timeout=600,
-            env=os.environ.copy(),
-            cwd=os.getcwd()
-        )
-        return process.returncode, process.stdout, process.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "Timeout: La commande a dépassé le temps limite"
-    except FileNotFoundError as e:
-        return -1, "", f"Fichier ou commande introuvable: {str(e)}"
-    except Exception as e:
-        return -1, "", f"Erreur inconnue: {str(e)}"
+# Taille maximale servie par st.download_button (sans serveur de flux joignable)
+INLINE_DOWNLOAD_LIMIT = 50 * 1024 * 1024
 
+DOWNLOAD_URL_HINT = ("Pour télécharger les gros fichiers en flux, définir PIPELINE_DOWNLOAD_URL : URL publique "
+                     "du serveur de téléchargement derrière le proxy de l'interface (port fixe PIPELINE_DOWNLOAD_PORT).")
 
 
+def display_download(file_path, key, label="⬇️"):
+    """Bouton de téléchargement préparé à la demande.
 
-def display_debug_info(returncode, stdout, stderr, command):
-    """Affiche le résultat de la commande avec détails."""
-    if returncode == 0:
-        st.success(f"✅ Commande exécutée avec succès (code: {returncode})")
-    else:
-        st.error(f"❌ Erreur d'exécution (code: {returncode})")
+    Servi en flux par DownloadServer si PIPELINE_DOWNLOAD_URL est défini (le
+    navigateur ne joint pas le 127.0.0.1 du nœud), sinon par st.download_button."""
+    links = st.session_state.setdefault("download_links", {})
+    if key not in links and not st.button(label, key=f"download_{key}"):
+        return
 
+    error = "PIPELINE_DOWNLOAD_URL non défini"
+    if os.environ.get("PIPELINE_DOWNLOAD_URL"):
+        url, expires = links.get(key, (None, 0))
+        # Jeton expiré (TOKEN_TTL) : nouveau lien plutôt qu'une erreur du serveur
+        if url is None or expires <= time.time():
+            server, error = get_download_server()
+            try:
+                if server is None:
+                    raise OSError(error)
+                url, expires = server.link_for(file_path), time.time() + TOKEN_TTL
+            except Exception as e:
+                url, expires, error = None, 0, str(e)
+        links[key] = (url, expires)
+        if url:
+            st.link_button("Télécharger", url)
+            return
+    else:
+        links[key] = (None, 0)
 
-    with st.expander(" Commande exécutée"):
-        st.code(" ".join(command) if isinstance(command, list) else command, language="bash")
+    try:
+        size = os.path.getsize(file_path)
+    except OSError as e:
+        st.error(f"Erreur de téléchargement: {e}")
+        return
+    if size > INLINE_DOWNLOAD_LIMIT:
+        st.error(f"Téléchargement en flux indisponible ({error}), fichier trop volumineux pour un envoi direct")
+        st.caption(DOWNLOAD_URL_HINT)
+        return
+    with open(file_path, 'rb') as f:
+        st.download_button(
+            label="Télécharger",
+            data=f.read(),
+            file_name=os.path.basename(file_path),
+            key=f"dl_{key}"
+        )
+    st.caption(DOWNLOAD_URL_HINT)
 
 
-    if stdout:
-        with st.expander("📤 Sortie Standard (stdout)"):
-            st.text_area("Sortie", stdout, height=200)
+def run_pipeline_command(command, origin="", meta=None):
+    """Lance une commande bash en arrière-plan et retourne immédiatement son handle."""
+    sub = get_submission_manager().submit(command, label=origin, meta=meta)
+    st.session_state.setdefault("submissions", []).append(sub.id)
+    return sub
 
 
-    if stderr:
-        with st.expander("❌ Erreurs (stderr)"):
-            st.text_area("Erreurs", stderr, height=200)
+def display_submission_help(sub):
+    """Aide au diagnostic d'une soumission en échec."""
+    returncode = sub.returncode
+    st.markdown("### 💡 Aide au diagnostic")
+    
+    if returncode == 127:
+        st.error("❌ **Commande introuvable**: Vérifiez que `run_pipeline.sh` existe et est exécutable")
+        st.code("chmod +x run_pipeline.sh", language="bash")
+    
+    elif returncode == 1:
+        st.warning("⚠️ **Erreur générale**: Consultez les logs stderr ci-dessus")
+    
+    elif returncode == 2:
+        st.warning("⚠️ **Erreur de paramètres**: Vérifiez les arguments passés au script")
+    
+    elif returncode == -1:
+        st.error("❌ **Erreur système**: Problème avec l'exécution de la commande")
+    
+    # Vérifications supplémentaires
+    st.markdown("**Vérifications suggérées:**")
+    
+    # Vérifier l'existence du script
+    if not os.path.exists("run_pipeline.sh"):
+        st.error("❌ Le fichier `run_pipeline.sh` n'existe pas dans le répertoire courant")
+    else:
+        st.success("✅ Le fichier `run_pipeline.sh` existe")
+        
+        # Vérifier les permissions
+        if not os.access("run_pipeline.sh", os.X_OK):
+            st.warning("⚠️ Le fichier `run_pipeline.sh` n'est pas exécutable")
+            st.code("chmod +x run_pipeline.sh", language="bash")
+        else:
+            st.success("✅ Le fichier `run_pipeline.sh` est exécutable")
+    
+    # Vérifier l'existence des fichiers d'entrée
+    for fastq_path in sub.meta.get("fastq_files", []):
+        if not os.path.exists(fastq_path):
+            st.error(f"❌ Fichier FASTQ introuvable: {fastq_path}")
+        else:
+            st.success(f"✅ Fichier FASTQ trouvé: {os.path.basename(fastq_path)}")
+    
+    # Vérifier le fichier BED
+    bed_file = sub.meta.get("bed_file")
+    if bed_file:
+        if not os.path.exists(bed_file):
+            st.error(f"❌ Fichier BED introuvable: {bed_file}")
+        else:
+            st.success(f"✅ Fichier BED trouvé: {os.path.basename(bed_file)}")
 
 
+def display_submission(sub):
+    """Affiche l'état, les jobs capturés et la sortie d'une soumission."""
+    col_result1, col_result2 = st.columns(2)
+    
+    with col_result1:
+        if not sub.done:
+            st.info(f"⏳ Soumission #{sub.id} en cours ({sub.elapsed():.0f} s)...")
+        elif sub.returncode == 0:
+            st.success(f"✅ Soumission #{sub.id} terminée avec succès!")
+        else:
+            st.error(f"❌ Erreur lors de la soumission #{sub.id} (Code: {sub.returncode})")
+    
+    with col_result2:
+        if sub.done:
+            st.info(f" Code de retour: {sub.returncode}")
+        elif st.button("⏹ Annuler", key=f"cancel_submission_{sub.id}"):
+            sub.cancel()
+    
+    # Jobs SLURM capturés au fil de la sortie
+    if sub.job_ids:
+        st.write("**Jobs soumis :** " + ", ".join(
+            f"{label or 'job'} → `{job_id}`" for label, job_id in sub.job_ids
+        ))
+    
+    with st.expander(" Commande exécutée", expanded=False):
+        st.code(sub.command_str, language="bash")
+    
+    stdout = sub.output("stdout")
+    stderr = sub.output("stderr")
+    
+    if stdout:
+        with st.expander("📤 Sortie standard (stdout)", expanded=not sub.done or sub.returncode != 0):
+            st.code(stdout, language="text")
+    
+    if stderr:
+        with st.expander("⚠️ Erreurs (stderr)", expanded=True):
+            st.code(stderr, language="text")
+    
+    if sub.done:
+        if sub.returncode != 0:
+            display_submission_help(sub)
+        
+        #  Sauvegarde du log, une seule fois par soumission
+        if not sub.meta.get("logged"):
+            sub.meta["logged"] = True
+            save_debug_log(sub.meta.get("sample_name", ""), sub.command_str, sub.returncode, stdout, stderr)
+
+
+@st.fragment(run_every=2)
+def display_live_submissions(origin):
+    """Rafraîchit uniquement ce fragment tant qu'une soumission est en cours."""
+    manager = get_submission_manager()
+    subs = [manager.get(i) for i in st.session_state.get("submissions", [])]
+    subs = [s for s in subs if s is not None and s.label == origin]
+    for sub in reversed(subs):
+        with st.container(border=True):
+            display_submission(sub)
+    if all(sub.done for sub in subs):
+        st.rerun()
+
+
+def display_submissions(origin):
+    """Affiche les soumissions lancées depuis un onglet (en direct si l'une est en cours)."""
+    manager = get_submission_manager()
+    subs = [manager.get(i) for i in st.session_state.get("submissions", [])]
+    subs = [s for s in subs if s is not None and s.label == origin]
+    if not subs:
+        return
+    st.markdown("###  Résultats de l'exécution")
+    if any(not sub.done for sub in subs):
+        display_live_submissions(origin)
+    else:
+        for sub in reversed(subs):
+            with st.container(border=True):
+                display_submission(sub)
 
 
 def save_debug_log(sample_name, command, returncode, stdout, stderr):
@@ -138,6 +397,62 @@ def save_debug_log(sample_name, command, returncode, stdout, stderr):
     except Exception as e:
         st.error(f"❌ Erreur lors de la sauvegarde du log: {str(e)}")
 
+def get_log_tail(log_path):
+    """LogTail de la session pour ce fichier (offset et buffer conservés entre les reruns)."""
+    tails = st.session_state.setdefault("log_tails", {})
+    if log_path not in tails:
+        tails[log_path] = LogTail(log_path)
+    return tails[log_path]
+
+
+def display_log_tail(log_path, log_name):
+    """Affiche les dernières lignes d'un log en ne lisant que les octets nouveaux."""
+    tail = get_log_tail(log_path)
+    tail.poll()
+    if tail.truncated:
+        st.caption(f"Seules les {len(tail.lines)} dernières lignes sont affichées")
+    st.text_area(
+        f"Contenu de {log_name}",
+        tail.text(),
+        height=300
+    )
+
+
+@st.fragment(run_every=3)
+def display_log_tail_live(log_path, log_name):
+    """Version auto-rafraîchie de display_log_tail (seul ce fragment est recalculé)."""
+    display_log_tail(log_path, log_name)
+
+
+@st.fragment
+def threads_counter():
+    """Compteur de threads : ➖ / ➕ ne relancent que ce fragment, pas l'onglet actif."""
+    col_minus, col_input, col_plus = st.columns([1, 2, 1])
+
+
+    with col_minus:
+        if st.button("➖", key="minus_threads"):
+            if st.session_state.threads_value > 1:
+                st.session_state.threads_value -= 1
+
+
+    with col_input:
+        threads = st.number_input(
+            "threads",
+            min_value=1,
+            max_value=64,
+            value=st.session_state.threads_value,
+            label_visibility="collapsed"
+        )
+        st.session_state.threads_value = threads
+
+
+    with col_plus:
+        if st.button("➕", key="plus_threads"):
+            if st.session_state.threads_value < 64:
+                st.session_state.threads_value += 1
+
+
 # Configuration de base
 
 with st.sidebar:
@@ -180,16 +495,17 @@ with st.sidebar:
         st.markdown("**Modifier un échantillon existant**")
 
 
-        results_dir = "results"
-        existing_samples = []
-
-
-        if os.path.exists(results_dir):
-            existing_samples = [
-                item for item in os.listdir(results_dir)
-                if os.path.isdir(os.path.join(results_dir, item))
-                and os.path.exists(os.path.join(results_dir, item, f"config_{item}.txt"))
-            ]
+        # Registre des échantillons (results/samples.sqlite), filtrable par statut et référence
+        with st.expander("🔎 Filtres"):
+            status_filter = st.selectbox("Statut", ["Tous", *sample_registry.SAMPLE_STATUSES],
+                                         key="registry_status_filter")
+            references = sorted({row["reference"] for row in ui_cache.registered_samples() if row["reference"]})
+            reference_filter = st.selectbox("Référence", ["Toutes", *references], key="registry_reference_filter")
+        registered = ui_cache.registered_samples(
+            None if status_filter == "Tous" else status_filter,
+            None if reference_filter == "Toutes" else reference_filter,
+        )
+        existing_samples = [row["sample"] for row in registered]
 
 
         if existing_samples:
@@ -264,43 +580,66 @@ with st.sidebar:
         help="Partitions SLURM disponibles"
     )
 
-
-    st.markdown("**Nombre de threads**")
-    col_minus, col_input, col_plus = st.columns([1, 2, 1])
+    executor_choice = st.radio(
+        "Exécution des jobs",
+        ["SLURM", "Locale"],
+        horizontal=True,
+        key="executor_choice",
+        help="Locale : pool de processus de cette machine (budgets CPU / mémoire, sans file d'attente SLURM)"
+    )
+    executor = "local" if executor_choice == "Locale" else "slurm"
 
 
+    st.markdown("**Nombre de threads**")
     if 'threads_value' not in st.session_state:
         st.session_state.threads_value = int(st.session_state.get('loaded_threads', 16))
+    threads_counter()
+    threads = st.session_state.threads_value
 
 
-    with col_minus:
-        if st.button("➖", key="minus_threads"):
-            if st.session_state.threads_value > 1:
-                st.session_state.threads_value -= 1
-
-
-    with col_input:
-        threads = st.number_input(
-            "threads",
-            min_value=1,
-            max_value=64,
-            value=st.session_state.threads_value,
-            label_visibility="collapsed"
-        )
-        st.session_state.threads_value = threads
-
-
-    with col_plus:
-        if st.button("➕", key="plus_threads"):
-            if st.session_state.threads_value < 64:
-                st.session_state.threads_value += 1
-
+# Onglets principaux : seul l'onglet actif est exécuté à chaque rerun
+# (st.tabs exécuterait les quatre, scans de fichiers compris)
+TABS = [" Pipeline Complet", " Étapes Manuelles", " Monitoring", " Résultats et Suivi"]
+active_tab = st.radio("Onglet", TABS, horizontal=True, key="active_tab", label_visibility="collapsed")
 
-# Onglets principaux
-tab1, tab2, tab3, tab4 = st.tabs([" Pipeline Complet", " Étapes Manuelles", " Monitoring", " Résultats et Suivi"])
 
-with tab1:
+def render_pipeline_complet():
     st.header("Lancement du Pipeline Complet")
+
+    # Lot multi-échantillons : une feuille TSV, un job array par étape
+    with st.expander("📋 Lot multi-échantillons (feuille d'échantillons)"):
+        st.caption("TSV : sample, input (dossier/fichier FASTQ ou BAM), bed (optionnel), phasing (yes/no)")
+        sample_sheet = st.text_input("Chemin de la feuille d'échantillons", key="sample_sheet_path")
+        col_limit, col_steps = st.columns([1, 3])
+        with col_limit:
+            array_limit = st.number_input("Tâches simultanées", min_value=1, max_value=64, value=4,
+                                          key="array_limit")
+        with col_steps:
+            sheet_steps = st.multiselect(
+                "Étapes",
+                ["1", "2", "3", "4", "6", "7"],
+                default=["1", "2", "3", "4", "6", "7"],
+                format_func=lambda s: f"{s}. {STEP_NAMES[int(s)]}",
+                key="sample_sheet_steps",
+            )
+        sheet_ok = bool(sample_sheet) and os.path.isfile(sample_sheet) and bool(sheet_steps)
+        if sample_sheet and not os.path.isfile(sample_sheet):
+            st.warning(f"⚠️ Feuille introuvable : {sample_sheet}")
+        if st.button("▶ Lancer le lot", key="launch_sample_sheet", disabled=not sheet_ok):
+            cmd = [
+                "bash", "run_pipeline.sh", "--non-interactive",
+                "--sample_sheet", sample_sheet,
+                "--reference", reference,
+                "--partition", partition,
+                "--threads", str(threads),
+                "--array_limit", str(array_limit),
+                "--executor", executor,
+                "--option", "1",
+            ]
+            for step in sheet_steps:
+                cmd.extend(["--step", step])
+            run_pipeline_command(cmd, origin="lot_echantillons", meta={"sample_sheet": sample_sheet})
+        display_submissions("lot_echantillons")
     
     if not sample_name:
         st.warning("Veuillez d'abord spécifier un nom d'échantillon dans la sidebar")
@@ -324,6 +663,8 @@ with tab1:
             #st.info(f"📂 **Dossier source:** `{base_folder_fastq}`")
             #st.info(f" **{len(fastq_files)} fichiers FASTQ** détectés")
             
+            display_fastq_volume(base_folder_fastq)
+            
             # Checkbox pour tout sélectionner
             select_all = st.checkbox(
                 "🔄 Tout sélectionner", 
@@ -399,9 +740,7 @@ with tab1:
                 st.success(f"Fichier BED enregistré sous : {saved_bed_path}")
             
             # Lister tous les fichiers BED déjà présents dans le dossier
-            bed_files_in_folder = [
-                f for f in os.listdir(bed_folder) if f.endswith(".bed")
-            ]
+            bed_files_in_folder = ui_cache.bed_files(bed_folder)
             
             # Choisir le fichier BED à utiliser
             bed_file = None
@@ -415,11 +754,29 @@ with tab1:
             else:
                 st.warning("⚠️ Aucun fichier BED disponible. Veuillez en uploader un.")
 
-            
+            # Mode ciblé : BAM restreint au BED (+ marge) extrait une fois après l'alignement
+            targeted = bool(bed_file)
+            target_padding = 1000
+            if bed_file:
+                targeted = st.checkbox(
+                    " Mode ciblé (panel)",
+                    value=True,
+                    help="Les étapes SNPs, SVs, CNVkit et QC lisent un BAM restreint aux régions du BED"
+                )
+                if targeted:
+                    target_padding = st.number_input(
+                        "Marge autour des régions (pb)", min_value=0, max_value=1000000, value=1000, step=500
+                    )
+
             do_phasing = st.checkbox(
                 " Effectuer le phasage avec WhatsHap",
                 help="Active le phasage des variants détectés"
             )
+
+            force_rerun = st.checkbox(
+                " Forcer la réexécution",
+                help="Soumet aussi les étapes déjà à jour (entrées, paramètres et outils inchangés)"
+            )
             
             # Validation du fichier BED
             if bed_file and not os.path.exists(bed_file):
@@ -440,6 +797,9 @@ with tab1:
             if bed_file and os.path.exists(bed_file):
                 st.write(f"• **BED:** ✅ Spécifié")
             
+            if targeted:
+                st.write(f"• **Mode ciblé:** ✅ Marge {target_padding} pb")
+
             if do_phasing:
                 st.write(f"• **Phasage:** ✅ Activé")
         
@@ -488,7 +848,9 @@ with tab1:
                 "threads": str(threads),
                 "fastq_input": fastq_to_pass,
                 "bed_file": bed_file if bed_file else "",
-                "do_phasing": str(do_phasing)
+                "do_phasing": str(do_phasing),
+                "targeted": "yes" if targeted else "no",
+                "target_padding": str(target_padding)
             }
             save_config(sample_name, config)
             st.success("📁 Configuration sauvegardée avant lancement")
@@ -500,134 +862,41 @@ with tab1:
                 "--partition", partition,
                 "--threads", str(threads),
                 "--fastq_input", fastq_to_pass,
+                "--executor", executor,
                 "--option", "1"
             ]
             
             if bed_file and os.path.exists(bed_file):
                 cmd.extend(["--bed", bed_file])
+                if targeted:
+                    cmd.extend(["--target_padding", str(target_padding)])
+                else:
+                    cmd.append("--no-targeted")
             
             if do_phasing:
                 cmd.append("--phase")
+
+            if force_rerun:
+                cmd.append("--force")
             
-            try:
-                with st.spinner("⏳ Soumission du pipeline en cours..."):
-                    command_str = " ".join(cmd)
-                    returncode, stdout, stderr = run_pipeline_command(command_str)
-                
-                #  Affichage détaillé des résultats (comme dans tab2)
-                st.markdown("###  Résultats de l'exécution")
-                
-                # Affichage de la commande exécutée
-                with st.expander(" Commande exécutée", expanded=False):
-                    st.code(command_str, language="bash")
-                
-                # Affichage des résultats
-                col_result1, col_result2 = st.columns(2)
-                
-                with col_result1:
-                    if returncode == 0:
-                        st.success("✅ Pipeline soumis avec succès!")
-                    else:
-                        st.error(f"❌ Erreur lors de la soumission (Code: {returncode})")
-                
-                with col_result2:
-                    st.info(f" Code de retour: {returncode}")
-                
-                # Affichage de la sortie standard
-                if stdout:
-                    with st.expander("📤 Sortie standard (stdout)", expanded=returncode != 0):
-                        st.code(stdout, language="text")
-                
-                # Affichage des erreurs
-                if stderr:
-                    with st.expander("⚠️ Erreurs (stderr)", expanded=True):
-                        st.code(stderr, language="text")
-                
-                # Messages d'aide selon le code de retour
-                if returncode != 0:
-                    st.markdown("### 💡 Aide au diagnostic")
-                    
-                    if returncode == 127:
-                        st.error("❌ **Commande introuvable**: Vérifiez que `run_pipeline.sh` existe et est exécutable")
-                        st.code("chmod +x run_pipeline.sh", language="bash")
-                    
-                    elif returncode == 1:
-                        st.warning("⚠️ **Erreur générale**: Consultez les logs stderr ci-dessus")
-                    
-                    elif returncode == 2:
-                        st.warning("⚠️ **Erreur de paramètres**: Vérifiez les arguments passés au script")
-                    
-                    elif returncode == -1:
-                        st.error("❌ **Erreur système**: Problème avec l'exécution de la commande")
-                    
-                    # Vérifications supplémentaires
-                    st.markdown("**Vérifications suggérées:**")
-                    
-                    # Vérifier l'existence du script
-                    if not os.path.exists("run_pipeline.sh"):
-                        st.error("❌ Le fichier `run_pipeline.sh` n'existe pas dans le répertoire courant")
-                    else:
-                        st.success("✅ Le fichier `run_pipeline.sh` existe")
-                        
-                        # Vérifier les permissions
-                        if not os.access("run_pipeline.sh", os.X_OK):
-                            st.warning("⚠️ Le fichier `run_pipeline.sh` n'est pas exécutable")
-                            st.code("chmod +x run_pipeline.sh", language="bash")
-                        else:
-                            st.success("✅ Le fichier `run_pipeline.sh` est exécutable")
-                    
-                    # Vérifier l'existence des fichiers d'entrée
-                    if not select_all:
-                        for fastq_path in fastq_to_pass.split(","):
-                            if not os.path.exists(fastq_path):
-                                st.error(f"❌ Fichier FASTQ introuvable: {fastq_path}")
-                            else:
-                                st.success(f"✅ Fichier FASTQ trouvé: {os.path.basename(fastq_path)}")
-                    
-                    # Vérifier le fichier BED
-                    if bed_file:
-                        if not os.path.exists(bed_file):
-                            st.error(f"❌ Fichier BED introuvable: {bed_file}")
-                        else:
-                            st.success(f"✅ Fichier BED trouvé: {os.path.basename(bed_file)}")
-                
-                #  Sauvegarde du log (comme dans tab2)
-                save_debug_log(sample_name, command_str, returncode, stdout, stderr)
-                
-                # Sauvegarde de la configuration seulement en cas de succès
-                # if returncode == 0:
-                #     config = {
-                #         "sample_name": sample_name,
-                #         "reference": reference,
-                #         "partition": partition,
-                #         "threads": str(threads),
-                #         "fastq_input": fastq_to_pass,
-                #         "bed_file": bed_file if bed_file else "",
-                #         "do_phasing": str(do_phasing)
-                #     }
-                #     save_config(sample_name, config)
-                #     st.success("📁 Configuration sauvegardée")
-                                
-            except Exception as e:
-                st.error(f"❌ Erreur Python: {str(e)}")
-                
-                # Affichage de détails supplémentaires pour le debugging
-                with st.expander("🔧 Informations de débogage", expanded=True):
-                    st.code(f"""
-        Type d'erreur: {type(e).__name__}
-        Message: {str(e)}
-        Répertoire de travail: {os.getcwd()}
-        Script existe: {os.path.exists('run_pipeline.sh')}
-        Script exécutable: {os.access('run_pipeline.sh', os.X_OK) if os.path.exists('run_pipeline.sh') else 'N/A'}
-                    """, language="text")
-                
-                # Sauvegarder aussi les erreurs Python
-                save_debug_log(sample_name, command_str if 'command_str' in locals() else str(cmd), -999, "", str(e))
+            #  Soumission en arrière-plan : la session reste utilisable pendant sbatch
+            run_pipeline_command(
+                cmd,
+                origin="pipeline_complet",
+                meta={
+                    "sample_name": sample_name,
+                    "fastq_files": [] if select_all else fastq_to_pass.split(","),
+                    "bed_file": bed_file,
+                },
+            )
+        
+        display_submissions("pipeline_complet")
         # Message d'aide si pas de sélection
         if not can_launch and not fastq_to_pass:
             st.info("💡 **Astuce:** Sélectionnez des fichiers FASTQ ou cochez 'Tout sélectionner' pour continuer")
 
-with tab2:
+
+def render_etapes_manuelles():
     st.header("Étapes Manuelles")
     
     if not sample_name:
@@ -689,6 +958,7 @@ with tab2:
             modified_bam = None
             region_file = None
             do_phasing_manual = False
+            targeted_manual = True
             
             # Paramètres d'entrée selon les dépendances
             if alignment_selected:
@@ -769,6 +1039,18 @@ with tab2:
                     )
                 # else:
                 #     st.text(" Phasage (nécessite l'étape SNPs)")
+                force_rerun_manual = st.checkbox(
+                    " Forcer la réexécution",
+                    key="force_rerun_manual",
+                    help="Soumet aussi les étapes déjà à jour (entrées, paramètres et outils inchangés)"
+                )
+                if region_file:
+                    targeted_manual = st.checkbox(
+                        " Mode ciblé (panel)",
+                        value=True,
+                        key="targeted_manual",
+                        help="Les étapes lisent un BAM restreint aux régions, extrait une seule fois"
+                    )
             
             # Validation avant exécution
             st.markdown("---")
@@ -826,7 +1108,8 @@ with tab2:
                     "--sample", sample_name,
                     "--reference", reference,
                     "--partition", partition,
-                    "--threads", str(threads)
+                    "--threads", str(threads),
+                    "--executor", executor
                 ]
 
                 cmd.extend(["--option", "2"])
@@ -854,52 +1137,148 @@ with tab2:
 
                 if region_file and os.path.exists(region_file):
                     cmd.extend(["--bed", region_file])
+                    if not targeted_manual:
+                        cmd.append("--no-targeted")
 
 
                 if do_phasing_manual:
                     cmd.append("--phase")
 
 
-                #  Exécution robuste
-                with st.spinner("⏳ Soumission des étapes en cours..."):
-                    command_str = " ".join(cmd)
-                    returncode, stdout, stderr = run_pipeline_command(command_str)
-
+                if force_rerun_manual:
+                    cmd.append("--force")
 
-                #  Affichage des résultats
-                display_debug_info(returncode, stdout, stderr, cmd)
 
-
-                #  Sauvegarde du log
-                save_debug_log(sample_name, command_str, returncode, stdout, stderr)
-
-
-                if returncode == 0:
-                    st.success("✅ Étapes soumises avec succès!")
-                else:
-                    st.error("❌ Une erreur est survenue. Vérifiez les logs.")
+                #  Soumission en arrière-plan, sans bloquer les autres lancements
+                run_pipeline_command(
+                    cmd,
+                    origin="etapes_manuelles",
+                    meta={"sample_name": sample_name, "bed_file": region_file},
+                )
+            
+            display_submissions("etapes_manuelles")
 
             # Message d'aide
             if not can_execute:
                 st.info("💡 **Astuce:** Vérifiez que tous les fichiers requis sont spécifiés et existants")
 
-with tab3:
+
+@st.fragment
+def display_local_jobs():
+    """Pool local (--executor local) : jobs en attente, en cours et terminés dans l'heure."""
+    local_jobs = ui_cache.local_jobs(3600)
+    if not local_jobs:
+        return
+    st.subheader("Jobs locaux")
+    cpus_budget, mem_budget = local_executor.budget()
+    st.caption(f"Budget de la machine : {cpus_budget} CPUs, {mem_budget / 1024:.0f} Go")
+    st.dataframe(local_jobs, use_container_width=True, hide_index=True)
+    active_jobs = [j["job_id"] for j in local_jobs if j["state"] in ("PENDING", "RUNNING")]
+    if active_jobs:
+        col_job, col_cancel = st.columns([3, 1])
+        with col_job:
+            job_to_cancel = st.selectbox("Job local", active_jobs, key="local_job_to_cancel")
+        with col_cancel:
+            if st.button("⛔ Annuler", key="cancel_local_job"):
+                local_executor.cancel([job_to_cancel])
+                ui_cache.local_jobs.clear()
+                st.rerun(scope="fragment")
+
+
+@st.fragment
+def display_batches():
+    """Lots multi-échantillons : matrice échantillon × étape (états des tâches des job arrays)."""
+    batches = ui_cache.batches("results")
+    if not batches:
+        return
+    st.subheader("Lots multi-échantillons")
+    selected_batch = st.selectbox("Lot", batches, format_func=os.path.basename, key="monitor_batch")
+    if st.button("🔄 Actualiser le lot", key="refresh_batch"):
+        load_batch_status.clear()
+    display_status_matrix(load_batch_status(selected_batch))
+
+
+@st.fragment
+def display_telemetry(sample_name):
+    """Télémétrie sacct : durée, CPU et mémoire réellement consommés par étape."""
+    st.subheader("Télémétrie des jobs (sacct)")
+    
+    if st.button("📊 Collecter la télémétrie", key="collect_telemetry"):
+        try:
+            telemetry_conn = telemetry.connect()
+            try:
+                with st.spinner("Interrogation de sacct..."):
+                    nb_updated = telemetry.collect(telemetry_conn)
+            finally:
+                telemetry_conn.close()
+            # États sacct reportés sur les étapes du registre des échantillons
+            with closing(sample_registry.connect()) as registry_conn:
+                sample_registry.sync_telemetry(registry_conn)
+            ui_cache.telemetry_rows.clear()
+            st.success(f"{nb_updated} job(s) mis à jour")
+        except Exception as e:
+            st.error(f"Erreur lors de la collecte sacct: {str(e)}")
+    
+    telemetry_rows = ui_cache.telemetry_rows(sample_name or None)
+    if telemetry_rows:
+        st.markdown("**Efficacité moyenne par étape** (CPU utilisé ÷ CPU demandé, pic mémoire ÷ mémoire demandée)")
+        st.dataframe(
+            [
+                {
+                    "Étape": f"{row['step']} - {row['label']}",
+                    "Jobs": row["jobs"],
+                    "Durée moy. (h)": round(row["elapsed_h"], 2) if row["elapsed_h"] is not None else None,
+                    "Efficacité CPU": f"{row['cpu_eff']:.0%}" if row["cpu_eff"] is not None else "-",
+                    "Pic mémoire max (Go)": round(row["max_rss_gb"], 1) if row["max_rss_gb"] is not None else None,
+                    "Efficacité mémoire": f"{row['mem_eff']:.0%}" if row["mem_eff"] is not None else "-",
+                }
+                for row in telemetry.step_summary(telemetry_rows)
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+        with st.expander(f"Détail des {len(telemetry_rows)} jobs terminés"):
+            st.dataframe(
+                [
+                    {
+                        "Job": row["job_id"],
+                        "Échantillon": row["sample"],
+                        "Étape": row["label"],
+                        "État": row["state"],
+                        "Durée (h)": round(row["elapsed_h"], 2) if row["elapsed_h"] is not None else None,
+                        "CPUs": row["cpus"],
+                        "Efficacité CPU": f"{row['cpu_eff']:.0%}" if row["cpu_eff"] is not None else "-",
+                        "MaxRSS (Go)": round(row["max_rss_gb"], 1) if row["max_rss_gb"] is not None else None,
+                        "Mémoire demandée (Go)": round(row["req_mem_gb"], 1) if row["req_mem_gb"] is not None else None,
+                        "Efficacité mémoire": f"{row['mem_eff']:.0%}" if row["mem_eff"] is not None else "-",
+                    }
+                    for row in telemetry_rows
+                ],
+                hide_index=True,
+                use_container_width=True
+            )
+    else:
+        st.info("Aucune donnée de télémétrie. Cliquez sur « Collecter la télémétrie » une fois des jobs terminés.")
+
+
+def render_monitoring():
     st.header("Monitoring des Jobs")
     
     if st.button("🔄 Actualiser le statut"):
-        try:
-            # Commande pour vérifier les jobs SLURM
-            result = subprocess.run(["squeue", "-u", os.getenv("USER", "")], 
-                                  capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                st.subheader("Jobs en cours")
-                st.code(result.stdout)
+        # Sortie partagée entre sessions pendant 15 s : les clics répétés n'interrogent pas slurmctld
+        returncode, output = ui_cache.squeue(os.getenv("USER", ""))
+        if returncode == 0:
+            st.subheader("Jobs en cours")
+            st.code(output)
+        elif executor == "slurm":
+            if returncode is None:
+                st.error(f"Erreur: {output}")
             else:
                 st.warning("Impossible de récupérer le statut des jobs")
-                
-        except Exception as e:
-            st.error(f"Erreur: {str(e)}")
+
+    display_local_jobs()
+    display_batches()
+    display_telemetry(sample_name)
     
     # Affichage des logs récents
     # if sample_name:
@@ -937,11 +1316,11 @@ with tab3:
     if st.session_state.show_logs:
         log_dir = "logs"
         if os.path.exists(log_dir):
-            # Récupérer tous les fichiers de logs
-            all_log_files = [f for f in os.listdir(log_dir) if f.endswith('.out')]
+            # Récupérer tous les fichiers de logs (triés du plus récent au plus ancien, en cache)
+            all_log_files = ui_cache.log_files(log_dir)
             
             # Filtrer par sample_name seulement s'il est défini et existe
-            if 'sample_name' in locals() and sample_name:
+            if sample_name:
                 sample_log_files = [f for f in all_log_files if sample_name in f]
                 log_files = sample_log_files
                 title = f"Logs pour l'échantillon '{sample_name}'"
@@ -949,14 +1328,7 @@ with tab3:
                 log_files = all_log_files
                 title = "Tous les fichiers de logs"
             
-            # Trier par date de modification (plus récents en premier)
             if log_files:
-                log_files = sorted(
-                    log_files,
-                    key=lambda x: os.path.getmtime(os.path.join(log_dir, x)),
-                    reverse=True
-                )
-                
                 # Sélecteur de fichier de log
                 selected_log = st.selectbox(
                     title,
@@ -966,30 +1338,46 @@ with tab3:
                 
                 if selected_log:
                     log_path = os.path.join(log_dir, selected_log)
-                    try:
-                        with open(log_path, 'r', encoding='utf-8') as f:
-                            log_content = f.read()
-                        
-                        # Affichage du contenu du log
-                        st.text_area(
-                            f"Contenu de {selected_log}",
-                            log_content,
-                            height=300,
-                            key="log_content"  # Ajout d'une clé unique
-                        )
-                        
-                        # Bouton pour télécharger le log
-                        st.download_button(
-                            label="📥 Télécharger ce log",
-                            data=log_content,
-                            file_name=selected_log,
-                            mime="text/plain"
+                    
+                    # Mode suivi : seuls les octets ajoutés depuis le dernier rerun sont lus
+                    live_tail = st.toggle(
+                        "🔴 Suivi en direct (rafraîchissement toutes les 3 s)",
+                        key="log_live_tail"
+                    )
+                    if live_tail:
+                        display_log_tail_live(log_path, selected_log)
+                    else:
+                        display_log_tail(log_path, selected_log)
+                    
+                    # Recherche d'erreurs sur le log complet (mmap, sans lecture intégrale en mémoire)
+                    col_search, col_search_btn = st.columns([4, 1])
+                    with col_search:
+                        search_pattern = st.text_input(
+                            "Motif recherché (expression régulière)",
+                            value=ERROR_PATTERN,
+                            key="log_search_pattern"
                         )
-                        
-                    except Exception as e:
-                        st.error(f"Erreur lors de la lecture du log: {str(e)}")
+                    with col_search_btn:
+                        st.write("")
+                        run_search = st.button("🔍 Rechercher", key="log_search_button")
+                    
+                    if run_search and search_pattern:
+                        try:
+                            hits, limited = grep_log(log_path, search_pattern)
+                        except Exception as e:
+                            st.error(f"Motif invalide : {str(e)}")
+                        else:
+                            if hits:
+                                st.code("\n".join(f"{line_no:>8}: {line}" for line_no, line in hits), language="text")
+                                if limited:
+                                    st.caption(f"Affichage limité aux {len(hits)} premières occurrences")
+                            else:
+                                st.success("Aucune occurrence trouvée dans le log")
+                    
+                    # Téléchargement préparé uniquement à la demande, servi en flux
+                    display_download(log_path, f"log_{selected_log}", label="📥 Préparer le téléchargement du log")
             else:
-                if 'sample_name' in locals() and sample_name:
+                if sample_name:
                     st.info(f"Aucun fichier de log trouvé pour l'échantillon '{sample_name}'")
                 else:
                     st.info("Aucun fichier de log trouvé dans le dossier logs/")
@@ -997,18 +1385,235 @@ with tab3:
             st.warning("Le dossier 'logs' n'existe pas. Vérifiez que vos jobs génèrent bien des logs dans ce répertoire.")
 
 
-with tab4:
+@st.fragment
+def display_sample_results(selected_sample):
+    """Résultats d'un échantillon : les interactions (index, couverture, téléchargements) ne relancent que ce fragment."""
+    sample_dir = Path("results") / selected_sample
+    
+    # Sous-onglets pour organiser les résultats
+    sub_tab1, sub_tab2, sub_tab3, sub_tab4 = st.tabs([
+        " État d'avancement", 
+        "📁 Fichiers de sortie", 
+        " Métriques QC", 
+        "📋 Rapports"
+    ])
+    
+    with sub_tab1:
+        st.subheader(f"État d'avancement - {selected_sample}")
+        
+        # Définition des étapes avec informations détaillées
+        steps_info = {
+            " Alignement": {
+                "files": [f"{selected_sample}.bam", f"{selected_sample}.bam.bai"],
+                "path": "mapping",
+                "step": 1,
+                "description": "Alignement des reads sur le génome de référence"
+            },
+            " Appel de variants (SNPs/INDELs)": {
+                "files": ["merge_output.vcf.gz", "merge_output.vcf.gz.tbi"],
+                "path": "snps_clair3",
+                "step": 2,
+                "description": "Détection des variants courts avec Clair3"
+            },
+            " Variants structuraux (SVs)": {
+                "files": ["*.vcf", "*.vcf.gz", "*.sv", "*.bed"],
+                "path": "svs",
+                "step": 3,
+                "description": "Détection des variants structuraux"
+            },
+            " Variations du nombre de copies (CNVs)": {
+                "files": [f"{selected_sample}.cns", f"{selected_sample}.cnr"],
+                "path": "cnvkit",
+                "step": 4,
+                "description": "Analyse des variations du nombre de copies"
+            },
+            " Contrôle qualité": {
+                "files": ["multiqc_report.html", "multiqc_data"],
+                "path": "qc",
+                "step": 6,
+                "description": "Rapport de qualité global"
+            },
+            " Annotation": {
+                "files": ["*_annotation_vep.tsv", "*_annovar_pileup.hg38_multianno.vcf", "*_annovar_pileup.hg38_multianno.txt"],
+                "path": "annotation",
+                "step": 7,
+                "description": "Annotation fonctionnelle des variants"
+            }
+        }
+        
+        # Index incrémental des résultats (pas de nouveau parcours de l'arborescence à chaque rerun)
+        if st.button("🔄 Rafraîchir l'index des résultats", key="refresh_results_index"):
+            results_index = load_results_index(sample_dir, force=True)
+        else:
+            results_index = load_results_index(sample_dir)
+        steps_files = step_status(results_index, steps_info)
+        manifests = load_manifests(selected_sample)
+
+        # Affichage en colonnes pour un meilleur layout
+        col1, col2 = st.columns([2, 1])
+        
+        completed_steps = 0
+        total_steps = len(steps_info)
+        
+        for step_name, step_info in steps_info.items():
+            step_path = sample_dir / step_info["path"]
+            files_found = steps_files[step_name]
+            
+            with col1:
+                if files_found:
+                    st.success(f"✅ **{step_name}**")
+                    st.caption(step_info["description"])
+                    manifest = manifests.get(step_info["step"])
+                    if manifest:
+                        status = f"🟰 À jour depuis le {manifest['completed_at'].replace('T', ' ')}"
+                        if manifest.get("last_skipped"):
+                            status += f" · non resoumise le {manifest['last_skipped'].replace('T', ' ')}"
+                        st.caption(status)
+                    with st.expander(f"Fichiers générés ({len(files_found)})"):
+                        for file_name in files_found:
+                            st.text(f"📄 {file_name}")
+                    completed_steps += 1
+                else:
+                    st.error(f"❌ **{step_name}**")
+                    st.caption(step_info["description"])
+                    st.caption(" En attente ou en cours...")
+                    
+                    # Debug : afficher le chemin recherché
+                    if st.checkbox(f"Debug {step_name}", key=f"debug_{step_name}"):
+                        listing = list_dir(results_index, step_info["path"])
+                        st.text(f"Chemin recherché: {step_path}")
+                        st.text(f"Chemin existe: {listing is not None}")
+                        if listing is not None:
+                            st.text("Fichiers dans le dossier:")
+                            dirs, files = listing
+                            for item in dirs:
+                                st.text(f"  - {item} (dir)")
+                            for item in sorted(files):
+                                st.text(f"  - {item} (file)")
+        
+        # Barre de progression globale
+        with col2:
+            progress = completed_steps / total_steps
+            st.metric("Progression globale", f"{completed_steps}/{total_steps}")
+            st.progress(progress)
+            
+            if progress == 1.0:
+                st.balloons()
+                st.success(" Pipeline terminé !")
+            elif progress > 0:
+                st.info(f" {completed_steps} étapes terminées")
+            else:
+                st.warning("🔄 Pipeline en cours de démarrage")
+    
+    with sub_tab2:
+        st.subheader("📁 Fichiers de sortie disponibles")
+        
+        if sample_dir.exists():
+            # Types de fichiers importants avec descriptions
+            file_types = {
+                "*.vcf*": " Fichiers de variants",
+                "*.bam": " Fichiers d'alignement",
+                "*.html": "📋 Rapports HTML",
+                "*.pdf": "📄 Rapports PDF",
+                "*.cns": " Données CNV",
+                "*.png": " Graphiques"
+            }
+            
+            all_files = []
+            for pattern, description in file_types.items():
+                files = find_files(results_index, pattern)
+                if files:
+                    st.write(f"**{description}**")
+                    for rel_path, size, mtime in files[:10]:  # Limiter l'affichage
+                        file_path = sample_dir / rel_path
+                        file_size = size / (1024 * 1024)  # MB
+                        file_date = datetime.fromtimestamp(mtime)
+                        
+                        col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+                        with col1:
+                            st.text(f"📄 {file_path.name}")
+                        with col2:
+                            st.text(f"{file_size:.1f} MB")
+                        with col3:
+                            st.text(file_date.strftime("%H:%M"))
+                        with col4:
+                            display_download(str(file_path), rel_path)
+                    st.divider()
+        else:
+            st.warning("📂 Répertoire de résultats non trouvé")
+    
+    with sub_tab3:
+        st.subheader(" Métriques de qualité")
+        
+        # Recherche de fichiers de métriques
+        qc_files = {
+            "MultiQC": sample_dir / "qc" / "multiqc_report.html",
+            "NanoPlot": sample_dir / "qc" / "NanoPlot-report.html", 
+            "FastQC": sample_dir / "qc" / "fastqc_report.html"
+        }
+        
+        metrics_found = False
+        for qc_name, qc_path in qc_files.items():
+            if qc_path.exists():
+                metrics_found = True
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.success(f"✅ Rapport {qc_name} disponible")
+                with col2:
+                    if st.button(f" Voir", key=f"view_{qc_name}"):
+                        st.info(f"Ouverture du rapport {qc_name}...")
+        
+        if not metrics_found:
+            st.info(" Aucun rapport de qualité trouvé pour cet échantillon")
+            st.caption("Les rapports seront disponibles une fois l'étape QC terminée")
+
+        display_coverage(sample_dir)
+    
+    with sub_tab4:
+        st.subheader("📋 Rapports détaillés")
+        
+        # Boutons pour générer des rapports personnalisés
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            if st.button(" Rapport de variants"):
+                st.info("🔄 Génération du rapport de variants en cours...")
+                # Ici vous pourriez appeler une fonction pour générer le rapport
+        
+        with col2:
+            if st.button(" Rapport CNV"):
+                st.info("🔄 Génération du rapport CNV en cours...")
+        
+        with col3:
+            if st.button(" Rapport complet"):
+                st.info("🔄 Génération du rapport complet en cours...")
+        
+        st.divider()
+        
+        # Espace pour afficher des visualisations
+        st.subheader(" Visualisations")
+        
+        # Placeholder pour des graphiques
+        if st.checkbox("Afficher les statistiques d'alignement"):
+            # Ici vous pourriez ajouter des graphiques avec matplotlib/plotly
+            st.info(" Graphiques d'alignement à implémenter")
+        
+        if st.checkbox("Afficher la distribution des variants"):
+            st.info(" Distribution des variants à implémenter")
+
+
+def render_resultats():
     st.header(" Résultats et Suivi")
     
     # Sélection d'échantillon avec info contextuelle
-    if 'sample_name' in locals() and sample_name:
+    if sample_name:
         selected_sample = sample_name
         st.info(f" Affichage des résultats pour l'échantillon sélectionné : **{sample_name}**")
     else:
         # Si pas d'échantillon sélectionné, permettre la sélection
         results_dir = Path("results")
         if results_dir.exists():
-            available_samples = [d.name for d in results_dir.iterdir() if d.is_dir()]
+            available_samples = ui_cache.list_samples("results", False)
             if available_samples:
                 selected_sample = st.selectbox(" Sélectionner un échantillon", available_samples)
             else:
@@ -1018,220 +1623,27 @@ with tab4:
             st.warning("Dossier 'results/' non trouvé")
             selected_sample = None
     
+    # Vue d'ensemble : présence des sorties de chaque étape pour tous les échantillons
+    # (un glob par échantillon et par étape : matrice partagée, recalculée au plus une fois par minute)
+    overview = ui_cache.sample_overview("results")
+    if len(overview) > 1:
+        with st.expander(f"🧮 Vue d'ensemble ({len(overview)} échantillons)"):
+            display_status_matrix(overview)
+
     if selected_sample:
-        sample_dir = Path("results") / selected_sample
-        
-        # Sous-onglets pour organiser les résultats
-        sub_tab1, sub_tab2, sub_tab3, sub_tab4 = st.tabs([
-            " État d'avancement", 
-            "📁 Fichiers de sortie", 
-            " Métriques QC", 
-            "📋 Rapports"
-        ])
-        
-        with sub_tab1:
-            st.subheader(f"État d'avancement - {selected_sample}")
-            
-            # Définition des étapes avec informations détaillées
-            steps_info = {
-                " Alignement": {
-                    "files": [f"{selected_sample}.bam", f"{selected_sample}.bam.bai"],
-                    "path": "mapping",
-                    "description": "Alignement des reads sur le génome de référence"
-                },
-                " Appel de variants (SNPs/INDELs)": {
-                    "files": ["merge_output.vcf.gz", "merge_output.vcf.gz.tbi"],
-                    "path": "snps_clair3",
-                    "description": "Détection des variants courts avec Clair3"
-                },
-                " Variants structuraux (SVs)": {
-                    "files": ["*.vcf", "*.vcf.gz", "*.sv", "*.bed"],
-                    "path": "svs",
-                    "description": "Détection des variants structuraux"
-                },
-                " Variations du nombre de copies (CNVs)": {
-                    "files": [f"{selected_sample}.cns", f"{selected_sample}.cnr"],
-                    "path": "cnvkit",
-                    "description": "Analyse des variations du nombre de copies"
-                },
-                " Contrôle qualité": {
-                    "files": ["multiqc_report.html", "multiqc_data"],
-                    "path": "qc",
-                    "description": "Rapport de qualité global"
-                },
-                " Annotation": {
-                    "files": ["*_annotation_vep.tsv", "*_annovar_pileup.hg38_multianno.vcf", "*_annovar_pileup.hg38_multianno.txt"],
-                    "path": "annotation",
-                    "description": "Annotation fonctionnelle des variants"
-                }
-            }
-            
-            # Affichage en colonnes pour un meilleur layout
-            col1, col2 = st.columns([2, 1])
-            
-            completed_steps = 0
-            total_steps = len(steps_info)
-            
-            for step_name, step_info in steps_info.items():
-                step_path = sample_dir / step_info["path"]
-                files_found = []
-                
-                # Vérification améliorée de l'existence des fichiers
-                if step_path.exists():
-                    for file_pattern in step_info["files"]:
-                        file_path = step_path / file_pattern
-                        
-                        # Vérifier si c'est un fichier ou un dossier
-                        if file_path.exists():
-                            files_found.append(file_pattern)
-                        else:
-                            # Essayer avec des patterns glob pour plus de flexibilité
-                            glob_results = list(step_path.glob(file_pattern))
-                            if glob_results:
-                                files_found.extend([f.name for f in glob_results])
-                
-                with col1:
-                    if files_found:
-                        st.success(f"✅ **{step_name}**")
-                        st.caption(step_info["description"])
-                        with st.expander(f"Fichiers générés ({len(files_found)})"):
-                            for file_name in files_found:
-                                st.text(f"📄 {file_name}")
-                        completed_steps += 1
-                    else:
-                        st.error(f"❌ **{step_name}**")
-                        st.caption(step_info["description"])
-                        st.caption(" En attente ou en cours...")
-                        
-                        # Debug : afficher le chemin recherché
-                        if st.checkbox(f"Debug {step_name}", key=f"debug_{step_name}"):
-                            st.text(f"Chemin recherché: {step_path}")
-                            st.text(f"Chemin existe: {step_path.exists()}")
-                            if step_path.exists():
-                                st.text("Fichiers dans le dossier:")
-                                for item in step_path.iterdir():
-                                    st.text(f"  - {item.name} ({'dir' if item.is_dir() else 'file'})")
-            
-            # Barre de progression globale
-            with col2:
-                progress = completed_steps / total_steps
-                st.metric("Progression globale", f"{completed_steps}/{total_steps}")
-                st.progress(progress)
-                
-                if progress == 1.0:
-                    st.balloons()
-                    st.success(" Pipeline terminé !")
-                elif progress > 0:
-                    st.info(f" {completed_steps} étapes terminées")
-                else:
-                    st.warning("🔄 Pipeline en cours de démarrage")
-        
-        with sub_tab2:
-            st.subheader("📁 Fichiers de sortie disponibles")
-            
-            if sample_dir.exists():
-                # Types de fichiers importants avec descriptions
-                file_types = {
-                    "*.vcf*": " Fichiers de variants",
-                    "*.bam": " Fichiers d'alignement",
-                    "*.html": "📋 Rapports HTML",
-                    "*.pdf": "📄 Rapports PDF",
-                    "*.cns": " Données CNV",
-                    "*.png": " Graphiques"
-                }
-                
-                all_files = []
-                for pattern, description in file_types.items():
-                    files = list(sample_dir.rglob(pattern))
-                    if files:
-                        st.write(f"**{description}**")
-                        for file_path in files[:10]:  # Limiter l'affichage
-                            file_size = file_path.stat().st_size / (1024 * 1024)  # MB
-                            file_date = datetime.fromtimestamp(file_path.stat().st_mtime)
-                            
-                            col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
-                            with col1:
-                                st.text(f"📄 {file_path.name}")
-                            with col2:
-                                st.text(f"{file_size:.1f} MB")
-                            with col3:
-                                st.text(file_date.strftime("%H:%M"))
-                            with col4:
-                                if st.button("⬇️", key=f"download_{file_path.name}"):
-                                    try:
-                                        with open(file_path, 'rb') as f:
-                                            st.download_button(
-                                                label="Télécharger",
-                                                data=f.read(),
-                                                file_name=file_path.name,
-                                                key=f"dl_{file_path.name}"
-                                            )
-                                    except Exception as e:
-                                        st.error(f"Erreur de téléchargement: {e}")
-                        st.divider()
-            else:
-                st.warning("📂 Répertoire de résultats non trouvé")
-        
-        with sub_tab3:
-            st.subheader(" Métriques de qualité")
-            
-            # Recherche de fichiers de métriques
-            qc_files = {
-                "MultiQC": sample_dir / "qc" / "multiqc_report.html",
-                "NanoPlot": sample_dir / "qc" / "NanoPlot-report.html", 
-                "FastQC": sample_dir / "qc" / "fastqc_report.html"
-            }
-            
-            metrics_found = False
-            for qc_name, qc_path in qc_files.items():
-                if qc_path.exists():
-                    metrics_found = True
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.success(f"✅ Rapport {qc_name} disponible")
-                    with col2:
-                        if st.button(f" Voir", key=f"view_{qc_name}"):
-                            st.info(f"Ouverture du rapport {qc_name}...")
-            
-            if not metrics_found:
-                st.info(" Aucun rapport de qualité trouvé pour cet échantillon")
-                st.caption("Les rapports seront disponibles une fois l'étape QC terminée")
-        
-        with sub_tab4:
-            st.subheader("📋 Rapports détaillés")
-            
-            # Boutons pour générer des rapports personnalisés
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                if st.button(" Rapport de variants"):
-                    st.info("🔄 Génération du rapport de variants en cours...")
-                    # Ici vous pourriez appeler une fonction pour générer le rapport
-            
-            with col2:
-                if st.button(" Rapport CNV"):
-                    st.info("🔄 Génération du rapport CNV en cours...")
-            
-            with col3:
-                if st.button(" Rapport complet"):
-                    st.info("🔄 Génération du rapport complet en cours...")
-            
-            st.divider()
-            
-            # Espace pour afficher des visualisations
-            st.subheader(" Visualisations")
-            
-            # Placeholder pour des graphiques
-            if st.checkbox("Afficher les statistiques d'alignement"):
-                # Ici vous pourriez ajouter des graphiques avec matplotlib/plotly
-                st.info(" Graphiques d'alignement à implémenter")
-            
-            if st.checkbox("Afficher la distribution des variants"):
-                st.info(" Distribution des variants à implémenter")
-    
+        display_sample_results(selected_sample)
     else:
         st.info(" Sélectionnez un échantillon pour voir ses résultats")
 
+
+tab_renderers = {
+    TABS[0]: render_pipeline_complet,
+    TABS[1]: render_etapes_manuelles,
+    TABS[2]: render_monitoring,
+    TABS[3]: render_resultats,
+}
+tab_renderers[active_tab]()
+
 # Footer
 st.markdown("---")
 st.markdown("*Pipeline développé pour l'UPJV - Version Streamlit*")
\ No newline at end of file
@@ -5,6 +5,8 @@ export PIPELINE_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 
 non_interactive=false
+force_steps=false
+executor="${PIPELINE_EXECUTOR:-slurm}"
 CONFIG_FILE="user_config.txt"
 
 # Si on connaît déjà le nom de l’échantillon (via --sample), on construit tout de suite le bon chemin
@@ -61,6 +63,7 @@ reference=$reference
 partition=$partition
 threads=$threads
 EOF
+        sample_registry import --config "$CONFIG_FILE" > /dev/null
         echo "Configuration enregistrée dans $CONFIG_FILE"
   
 }
@@ -79,6 +82,310 @@ function reset_config() {
     fi
 }
 
+# === Registre des échantillons (scripts/sample_registry.py, results/samples.sqlite) ===
+# Paramètres, jobs et états des étapes ; un échec du registre ne bloque pas les soumissions.
+function sample_registry() {
+    PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.sample_registry "$@" || echo "⚠️ Registre des échantillons non mis à jour ($1)" >&2
+}
+
+# === Journal des jobs soumis (lu par scripts/telemetry.py pour interroger sacct) ===
+function record_job() {
+    local step=$1
+    local jobid=$2
+    [[ -z "$sample_name" || -z "$jobid" ]] && return
+    mkdir -p "results/${sample_name}"
+    printf '%s\t%s\t%s\n' "$(date '+%Y-%m-%dT%H:%M:%S')" "$step" "$jobid" >> "results/${sample_name}/jobs.tsv"
+    printf '%s\t%s\t%s\n' "$sample_name" "$step" "$jobid" | sample_registry record-jobs
+}
+
+# === Exécuteur des jobs (--executor slurm|local) ===
+# slurm : sbatch. local : pool de processus de la machine (scripts/executor.py),
+# mêmes options et même sortie "Submitted batch job N" ; les budgets CPU et
+# mémoire (PIPELINE_LOCAL_CPUS, PIPELINE_LOCAL_MEM_GB) et les dépendances sont
+# appliqués par le démon local, sans file d'attente SLURM.
+function submit_job() {
+    if [[ "$executor" == "local" ]]; then
+        PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.executor submit "$@"
+    else
+        sbatch "$@"
+    fi
+}
+
+# === Soumission de l'étape 2 (Clair3) découpée en shards ===
+# Un job array appelle Clair3 sur des régions de taille équilibrée (hg38.bed,
+# restreint au BED utilisateur), puis un job de rassemblement concatène les
+# VCF dans snps_clair3/merge_output.vcf.gz et lance le phasage éventuel.
+# Les ressources prédites de l'étape (predict_resources 2) sont partagées entre
+# les tâches simultanées ; le rassemblement passe par submit_step (sentinelle).
+# Renseigne SNPS_JOBID (job dont dépendent les étapes suivantes).
+# Réglages (config de l'échantillon) : clair3_shards (24, 1 = sans découpage),
+# clair3_concurrency (8 tâches simultanées), clair3_shard_mem (mémoire par
+# tâche, défaut : prédiction / tâches simultanées, au moins 8G).
+function submit_snps() {
+    local dep_opt=$1
+    local bam=$2
+    local bed=$3
+    local phasing=$4
+    local shards=${clair3_shards:-24}
+    local shard_dir="results/${sample_name}/snps_clair3/shards"
+    local n_shards=""
+    SNPS_JOBID=""
+
+    mkdir -p logs
+    if [[ $shards -gt 1 && -f "$PIPELINE_DIR/hg38.bed" ]]; then
+        n_shards=$(python3 "$PIPELINE_DIR/scripts/bed_shards.py" --genome "$PIPELINE_DIR/hg38.bed" \
+            ${bed:+--bed "$bed"} --fai "${reference}.fai" --shards "$shards" --outdir "$shard_dir")
+    fi
+
+    if [[ -z "$n_shards" ]]; then
+        # Génome entier en une seule allocation (ressources prédites par predict_resources)
+        submit_step 2 $dep_opt --output="logs/step2_snps_%j.out" \
+            sbatch/step2_snps.sbatch "$sample_name" "$bam" "$reference" "$STEP_CPUS" "$bed" "$phasing"
+        SNPS_JOBID=$STEP_JOBID
+        return
+    fi
+
+    local concurrency=${clair3_concurrency:-8}
+    [[ $concurrency -gt $n_shards ]] && concurrency=$n_shards
+    local shard_cpus=$(( STEP_CPUS / concurrency ))
+    [[ $shard_cpus -lt 2 ]] && shard_cpus=2
+    local shard_mem_gb=$(( ${STEP_MEM%G} / concurrency ))
+    [[ $shard_mem_gb -lt 8 ]] && shard_mem_gb=8
+    local shard_mem=${clair3_shard_mem:-${shard_mem_gb}G}
+
+    echo "   ➤ Clair3 découpé en $n_shards shards ($concurrency simultanés, $shard_cpus CPUs et $shard_mem chacun)"
+    local jobid_array
+    jobid_array=$(submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$shard_cpus" \
+        --mem="$shard_mem" --array="1-${n_shards}%${concurrency}" \
+        --output="logs/step2_snps_%A_%a.out" \
+        sbatch/step2_snps.sbatch "$sample_name" "$bam" "$reference" "$shard_cpus" "" "no" shard "$shard_dir" | awk '{print $4}')
+    if [[ -z "$jobid_array" ]]; then
+        return
+    fi
+    echo "Shards Clair3 soumis - Job ID : $jobid_array"
+    record_job 2 "$jobid_array"
+
+    # Rassemblement et phasage : ressources prédites et sentinelle de relance
+    submit_step 2 --dependency=afterok:$jobid_array --output="logs/step2_snps_%j.out" \
+        sbatch/step2_snps.sbatch "$sample_name" "$bam" "$reference" "$STEP_CPUS" "" "$phasing" gather "$shard_dir"
+    SNPS_JOBID=$STEP_JOBID
+}
+
+# === Manifestes d'étape (scripts/step_manifest.py) ===
+# Une étape dont les entrées (empreintes), les paramètres et les outils n'ont
+# pas changé depuis sa dernière réussite est marquée à jour et n'est pas
+# soumise. --force (ou force_steps=true dans la config) relance tout.
+# Arguments : numéro d'étape puis options --input rôle=chemin / --param clé=valeur.
+function step_up_to_date() {
+    local step=$1
+    shift
+    [[ "$force_steps" == "true" ]] && return 1
+    python3 "$PIPELINE_DIR/scripts/step_manifest.py" check --sample "$sample_name" --step "$step" "$@"
+}
+
+# Enregistre le manifeste après la réussite du job (petit job afterok).
+# Pour un job suivi par une sentinelle de relance (submit_step), le manifeste
+# reste en attente : la sentinelle le reporte sur le job relancé ou l'annule.
+function record_step_manifest() {
+    local step=$1
+    local jobid=$2
+    shift 2
+    [[ -z "$jobid" ]] && return
+    local cmd
+    cmd=$(printf '%q ' python3 "$PIPELINE_DIR/scripts/step_manifest.py" commit \
+        --sample "$sample_name" --step "$step" --job "$jobid" "$@")
+    # Étape COMPLETED (et ses sorties) dans le registre une fois le manifeste écrit
+    cmd+="&& $(printf '%q ' env PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.sample_registry step \
+        --sample "$sample_name" --step "$step" --state COMPLETED --job "$jobid")"
+    local kill_opt="--kill-on-invalid-dep=yes"
+    [[ " $ARMED_JOBS " == *" $jobid "* ]] && kill_opt=""
+    submit_job --export=ALL --dependency=afterok:$jobid $kill_opt --partition="$partition" \
+        --cpus-per-task=1 --mem=1G --time=00:10:00 --job-name="manifest_step${step}" \
+        --output="logs/manifest_step${step}_%j.out" --wrap="$cmd" > /dev/null
+}
+
+# === Ressources prédites par étape (scripts/resource_model.py) ===
+# Mémoire, CPUs et durée déduits de la taille de l'entrée (BAM, FASTQ, VCF), de
+# l'étendue du BED et des jobs passés (télémétrie sacct), avec une marge.
+# Entrée pas encore produite (lancement complet) : estimation depuis les FASTQ
+# (fastq_input) ou les jobs passés de l'étape.
+# Renseigne STEP_MEM, STEP_CPUS, STEP_TIME ; repli sur les anciennes valeurs fixes.
+# Arguments : étape, entrée principale, BED (optionnel).
+function predict_resources() {
+    local step=$1
+    local input=$2
+    local bed=$3
+    local prediction
+    prediction=$(PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.resource_model predict \
+        --step "$step" --input "$input" --upstream "$fastq_input" --bed "$bed" --threads "$threads")
+    if [[ -n "$prediction" ]]; then
+        read -r STEP_MEM STEP_CPUS STEP_TIME STEP_INPUT_BYTES STEP_BED_FRACTION <<< "$prediction"
+    else
+        STEP_MEM=256G; [[ "$step" == "1" ]] && STEP_MEM=128G
+        STEP_CPUS=$threads
+        STEP_TIME=""
+        STEP_INPUT_BYTES=0
+        STEP_BED_FRACTION=1
+    fi
+}
+
+# Soumet une étape avec les ressources de predict_resources ; renseigne STEP_JOBID.
+# Une sentinelle (afternotok) la resoumet avec plus de mémoire ou de temps
+# après un OUT_OF_MEMORY ou un TIMEOUT.
+# Arguments : étape, puis options sbatch (--opt=valeur), script et ses arguments.
+function submit_step() {
+    local step=$1
+    shift
+    local args=(--export=ALL --partition="$partition" --cpus-per-task="$STEP_CPUS" --mem="$STEP_MEM")
+    [[ -n "$STEP_TIME" ]] && args+=(--time="$STEP_TIME")
+    args+=("$@")
+    STEP_JOBID=$(submit_job "${args[@]}" | awk '{print $4}')
+    [[ -z "$STEP_JOBID" ]] && return 1
+    # Pool local : mémoire bornée par la machine, pas de sentinelle de relance
+    [[ "$executor" == "local" ]] && return 0
+    if PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.resource_model arm --job "$STEP_JOBID" --step "$step" \
+        --sample "$sample_name" --input-bytes "$STEP_INPUT_BYTES" --bed-fraction "$STEP_BED_FRACTION" \
+        -- "${args[@]}" > /dev/null; then
+        ARMED_JOBS+=" $STEP_JOBID"
+    fi
+}
+
+# === Mode ciblé (panel) : BAM restreint au BED, extrait une seule fois ===
+# Avec un BED, les étapes 2, 3, 4 et 6 lisent results/<sample>/targeted/<bed>/<bam>
+# au lieu du BAM génome entier : lectures chevauchant le BED élargi de
+# target_padding pb (1000 par défaut), extraites par un seul job après
+# l'alignement (sbatch/slice_bam.sbatch). L'étape 5 lit de même son BAM modifié
+# restreint au fichier de régions (targeted/<régions>/methylation/). targeted=no
+# (config) ou --no-targeted garde le BAM génome entier. Un BAM ciblé plus récent
+# que sa source, extrait de la même source et du même BED avec la même marge,
+# est réutilisé sans job.
+# Arguments : BAM source, BED, option de dépendance du BAM source, sous-dossier (optionnel).
+# Renseigne TARGETED_BAM et TARGETED_DEP (option de dépendance de l'étape).
+declare -A TARGETED_JOBS=()
+function targeted_bam() {
+    local source=$1
+    local bed=$2
+    local dep_opt=$3
+    local subdir=$4
+    TARGETED_BAM=$source
+    TARGETED_DEP=$dep_opt
+    [[ "$targeted" == "no" || -z "$bed" || ! -f "$bed" ]] && return
+
+    local padding=${target_padding:-1000}
+    local out="results/${sample_name}/targeted/$(basename "$bed" .bed)/${subdir:+$subdir/}$(basename "$source")"
+    TARGETED_BAM=$out
+    # Déjà traité dans ce lancement : même job pour toutes les étapes
+    if [[ -n "${TARGETED_JOBS[$out]+x}" ]]; then
+        TARGETED_DEP=""
+        [[ -n "${TARGETED_JOBS[$out]}" ]] && TARGETED_DEP="--dependency=afterok:${TARGETED_JOBS[$out]}"
+        return
+    fi
+
+    if [[ -z "$dep_opt" && "$force_steps" != "true" && -s "$out.bai" && "$out" -nt "$source" \
+        && "$(cat "${out%.bam}.stamp" 2>/dev/null)" == "$source $(cksum < "$bed") $padding" ]]; then
+        echo "   ➤ BAM ciblé à jour : $out"
+        TARGETED_JOBS[$out]=""
+        TARGETED_DEP=""
+        return
+    fi
+
+    local jobid
+    jobid=$(submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task=4 --mem=8G \
+        --output="logs/slice_bam_%j.out" \
+        sbatch/slice_bam.sbatch "$source" "$bed" "$out" "$padding" 4 | awk '{print $4}')
+    if [[ -z "$jobid" ]]; then
+        echo "⚠️ Extraction ciblée non soumise, BAM génome entier utilisé"
+        TARGETED_BAM=$source
+        return
+    fi
+    echo "   ➤ BAM ciblé ($(basename "$bed"), marge $padding pb) : $out - Job ID : $jobid"
+    TARGETED_JOBS[$out]=$jobid
+    TARGETED_DEP="--dependency=afterok:$jobid"
+}
+
+# === Lot multi-échantillons (--sample_sheet) ===
+# Chaque étape est soumise en un seul job array sur tous les échantillons de la
+# feuille (array_limit tâches simultanées, 4 par défaut). La tâche i d'une étape
+# attend la tâche i de l'étape dont elle consomme la sortie (aftercorr), selon
+# le graphe de scripts/step_graph.py. L'index FASTA et l'index minimap2 sont
+# construits une seule fois avant les arrays (prepare_reference.sbatch).
+# Dossier du lot : results/batches/<feuille>_<date> (tâches, jobs.tsv).
+function execute_sample_sheet() {
+    local sheet=$1
+    shift
+    local steps=("$@")
+    local batch_dir="results/batches/$(basename "${sheet%.*}")_$(date '+%Y%m%d_%H%M%S')"
+    local limit=${array_limit:-4}
+    local -A step_mem=([1]=128G [2]=256G [3]=256G [4]=256G [6]=256G [7]=256G)
+    local -A step_time=()
+
+    local n_samples
+    n_samples=$(PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.sample_sheet prepare --sheet "$sheet" \
+        --reference "$reference" --partition "$partition" --threads "$threads" \
+        --batch-dir "$batch_dir" "${steps[@]}") || return 1
+    # Mémoire et durée prédites (resources.tsv), sinon valeurs fixes et --time du script
+    local res_step res_mem res_time
+    while IFS=$'\t' read -r res_step res_mem res_time; do
+        step_mem[$res_step]=$res_mem
+        step_time[$res_step]=$res_time
+    done < "$batch_dir/resources.tsv"
+    echo "📋 Lot de $n_samples échantillon(s) : $batch_dir ($limit tâches simultanées par étape)"
+    [[ "$executor" == "local" ]] && echo "🖥️  Exécution locale : $(PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.executor info)"
+
+    local plan
+    plan=$(PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.step_graph plan "${steps[@]}") || return 1
+    PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.step_graph report --sample "<échantillon>" "${steps[@]}"
+    echo ""
+
+    mkdir -p logs
+    local jobid_prepare=""
+    if [[ " ${steps[*]} " == *" 1 "* || ! -s "${reference}.fai" ]]; then
+        jobid_prepare=$(submit_job --export=ALL --partition="$partition" --cpus-per-task="$threads" --mem=32G \
+            --output="logs/prepare_reference_%j.out" \
+            sbatch/prepare_reference.sbatch "$reference" "$threads" | awk '{print $4}')
+        echo "Préparation de la référence soumise - Job ID : $jobid_prepare"
+    fi
+
+    local -A step_jobs=()
+    local step deps d i sample
+    while IFS=$'\t' read -r step deps; do
+        local conditions=()
+        [[ -n "$jobid_prepare" ]] && conditions+=("afterok:$jobid_prepare")
+        local upstream=()
+        for d in ${deps//,/ }; do
+            [[ -n "${step_jobs[$d]}" ]] && upstream+=("${step_jobs[$d]}")
+        done
+        [[ ${#upstream[@]} -gt 0 ]] && conditions+=("aftercorr:$(IFS=:; echo "${upstream[*]}")")
+        local dep_opt=""
+        [[ ${#conditions[@]} -gt 0 ]] && dep_opt="--dependency=$(IFS=,; echo "${conditions[*]}")"
+
+        local jobid
+        jobid=$(submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" \
+            --mem="${step_mem[$step]}" ${step_time[$step]:+--time="${step_time[$step]}"} --array="1-${n_samples}%${limit}" \
+            --output="logs/step${step}_array_%A_%a.out" \
+            sbatch/array_task.sbatch "$batch_dir/step${step}.tasks" | awk '{print $4}')
+        if [[ -z "$jobid" ]]; then
+            echo "Erreur lors de la soumission de l'étape $step"
+            return 1
+        fi
+        step_jobs[$step]=$jobid
+        echo "Étape $step (array de $n_samples) soumise - Job ID : $jobid"
+        printf '%s\t%s\t%s\n' "$(date '+%Y-%m-%dT%H:%M:%S')" "$step" "$jobid" >> "$batch_dir/jobs.tsv"
+
+        # Journal par échantillon (télémétrie sacct) : tâche <array>_<indice> ;
+        # registre mis à jour en un seul appel pour toutes les tâches de l'étape
+        while IFS=$'\t' read -r i sample; do
+            mkdir -p "results/${sample}"
+            printf '%s\t%s\t%s\n' "$(date '+%Y-%m-%dT%H:%M:%S')" "$step" "${jobid}_${i}" >> "results/${sample}/jobs.tsv"
+            printf '%s\t%s\t%s\n' "$sample" "$step" "${jobid}_${i}"
+        done < "$batch_dir/samples.tsv" | sample_registry record-jobs
+    done <<< "$plan"
+
+    echo ""
+    echo " Lot soumis : $n_samples échantillon(s), étapes ${steps[*]}"
+    echo " Suivi : python3 -m scripts.sample_sheet status --batch-dir $batch_dir"
+}
+
 # === Fonction pour afficher le menu ===
 function show_menu() {
     echo ""
@@ -109,6 +416,7 @@ function execute_steps_with_dependencies() {
    
     echo ""
     echo "🔄 Exécution des étapes avec gestion des dépendances : ${steps[*]}"
+    [[ "$executor" == "local" ]] && echo "🖥️  Exécution locale : $(PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.executor info)"
     echo ""
    
     # Variables pour stocker les job IDs des étapes critiques
@@ -119,9 +427,47 @@ function execute_steps_with_dependencies() {
     local jobid_qc=""
     local jobid_methylation=""
     local jobid_annotation=""
+
+    # Mesures sacct des jobs précédents (modèle de ressources), sans bloquer si sacct est absent
+    PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.telemetry collect > /dev/null 2>&1
+    # Registre : paramètres du lancement (config_<sample>.txt réexporté) et états sacct des étapes
+    if [[ -n "$sample_name" ]]; then
+        sample_registry set --sample "$sample_name" reference="$reference" partition="$partition" threads="$threads"
+    fi
+    sample_registry sync > /dev/null
+
+    # Méthylation : BAM modifié connu avant le plan. Sortie de l'alignement
+    # (results/<sample>/mapping/), il fait attendre l'alignement à l'étape 5.
+    if [[ " ${steps[*]} " == *" 5 "* && -z "$modified_bam" ]]; then
+        read -p "Chemin du fichier BAM modifié (annoté avec modkit) : " modified_bam
+    fi
+
+    # Ordre de soumission et dépendances réelles (artefacts consommés / produits)
+    local plan
+    local graph_opts=(--sample "$sample_name" --modified-bam "$modified_bam")
+    plan=$(PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.step_graph plan "${graph_opts[@]}" "${steps[@]}") || return 1
+    PYTHONPATH="$PIPELINE_DIR" python3 -m scripts.step_graph report "${graph_opts[@]}" "${steps[@]}"
+    echo ""
+    local -a plan_steps=()
+    local -A step_deps=()
+    local -A step_jobs=()
+    local s d
+    while IFS=$'\t' read -r s d; do
+        plan_steps+=("$s")
+        step_deps[$s]=$d
+    done <<< "$plan"
    
-    # Traitement séquentiel des étapes avec dépendances
-    for step in "${steps[@]}"; do
+    # Soumission dans l'ordre du graphe, chaque étape après les seules étapes qui produisent ses entrées
+    for step in "${plan_steps[@]}"; do
+        local dep_jobs=()
+        for d in ${step_deps[$step]//,/ }; do
+            [[ -n "${step_jobs[$d]}" ]] && dep_jobs+=("${step_jobs[$d]}")
+        done
+        local dep_opt=""
+        if [[ ${#dep_jobs[@]} -gt 0 ]]; then
+            dep_opt="--dependency=afterok:$(IFS=:; echo "${dep_jobs[*]}")"
+        fi
+
         case $step in
             1) # Alignement
                 echo " Étape 1 - Alignement"
@@ -132,13 +478,23 @@ function execute_steps_with_dependencies() {
                         continue
                     fi
                 fi
+
+                local manifest_args=(--input "fastq=$fastq_input" --input "reference=$reference")
+                if step_up_to_date 1 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 1 à jour, non soumise"
+                    continue
+                fi
                
-                jobid_align=$(sbatch --export=ALL --partition="$partition" --cpus-per-task="$threads" --mem=128G \
-                    --output="logs/step1_align_%j.out" \
-                    sbatch/step1_align.sbatch "$sample_name" "$threads" "$fastq_input" "$reference" | awk '{print $4}')
+                predict_resources 1 "$fastq_input"
+                submit_step 1 --output="logs/step1_align_%j.out" \
+                    sbatch/step1_align.sbatch "$sample_name" "$STEP_CPUS" "$fastq_input" "$reference"
+                jobid_align=$STEP_JOBID
+                step_jobs[1]=$jobid_align
                
                 if [[ -n "$jobid_align" ]]; then
                     echo "Alignement soumis - Job ID : $jobid_align"
+                    record_job 1 "$jobid_align"
+                    record_step_manifest 1 "$jobid_align" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission de l'alignement"
                     return 1
@@ -148,16 +504,13 @@ function execute_steps_with_dependencies() {
             2) # SNPs
                 echo " Étape 2 - Détection de SNPs"
                
-                # Déterminer les dépendances
-                local dep_opt=""
-                if [[ -n "$jobid_align" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_align"
+                if [[ -n "$dep_opt" ]]; then
                     echo "  Dépend de l'alignement (Job $jobid_align)"
                 fi
                
                 # Vérifier/demander le BAM si nécessaire
                 local bam_to_use="${bam_file:-results/${sample_name}/mapping/${sample_name}.bam}"
-                if [[ -z "$jobid_align" && ! -f "$bam_to_use" ]]; then
+                if [[ -z "$dep_opt" && ! -f "$bam_to_use" ]]; then
                     read -p "Chemin du fichier BAM pour les SNPs : " bam_to_use
                     if [[ ! -f "$bam_to_use" ]]; then
                         echo "Fichier BAM introuvable : $bam_to_use"
@@ -166,7 +519,7 @@ function execute_steps_with_dependencies() {
                 fi
                
                 # Demander BED et phasage si pas déjà définis
-                if [[ "$non_interactive" != "true" && -z "$bed_file" ]]; then
+                if [[ "$non_interactive" != "true" && -z "${bed_file+x}" ]]; then
                 read -p 'Fichier BED (optionnel, Entrée pour ignorer) : ' bed_file
                 fi
                 if [[ -z "$do_phasing" ]]; then
@@ -178,12 +531,28 @@ function execute_steps_with_dependencies() {
                     fi
                 fi
                
-                jobid_snps=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-                    --output="logs/step2_snps_%j.out" \
-                    sbatch/step2_snps.sbatch "$sample_name" "$bam_to_use" "$reference" "$threads" "$bed_file" "$do_phasing" | awk '{print $4}')
+                # Mode ciblé : BAM restreint au BED, commun aux étapes 2, 3, 4 et 6
+                local source_bam=$bam_to_use
+                targeted_bam "$source_bam" "$bed_file" "$dep_opt"
+                bam_to_use=$TARGETED_BAM
+                dep_opt=$TARGETED_DEP
+
+                local manifest_args=(--input "bam=$bam_to_use" --input "reference=$reference" --input "bed=$bed_file"
+                    --param "phasing=$do_phasing" --param "clair3_shards=${clair3_shards:-24}")
+                if [[ -z "$dep_opt" ]] && step_up_to_date 2 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 2 à jour, non soumise"
+                    continue
+                fi
+
+                predict_resources 2 "$source_bam" "$bed_file"
+                submit_snps "$dep_opt" "$bam_to_use" "$bed_file" "$do_phasing"
+                jobid_snps=$SNPS_JOBID
+                step_jobs[2]=$jobid_snps
                
                 if [[ -n "$jobid_snps" ]]; then
                     echo "SNPs soumis - Job ID : $jobid_snps"
+                    record_job 2 "$jobid_snps"
+                    record_step_manifest 2 "$jobid_snps" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission des SNPs"
                 fi
@@ -192,29 +561,42 @@ function execute_steps_with_dependencies() {
            3) # SVs
                echo " Étape 3 - Détection de SVs"
                
-            #   Déterminer les dépendances
-                local dep_opt=""
-                if [[ -n "$jobid_align" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_align"
+                if [[ -n "$dep_opt" ]]; then
                     echo "    Dépend de l'alignement (Job $jobid_align)"
                 fi
                
                 # Vérifier/demander le BAM si nécessaire
                 local bam_to_use="results/${sample_name}/mapping/${sample_name}.bam"
-                if [[ -z "$jobid_align" && ! -f "$bam_to_use" ]]; then
+                if [[ -z "$dep_opt" && ! -f "$bam_to_use" ]]; then
                     read -p "Chemin du fichier BAM pour les SVs : " bam_to_use
                     if [[ ! -f "$bam_to_use" ]]; then
                         echo "Fichier BAM introuvable : $bam_to_use"
                         continue
                     fi
                 fi
+
+                # Mode ciblé : BAM restreint au BED, commun aux étapes 2, 3, 4 et 6
+                local source_bam=$bam_to_use
+                targeted_bam "$source_bam" "$bed_file" "$dep_opt"
+                bam_to_use=$TARGETED_BAM
+                dep_opt=$TARGETED_DEP
+
+                local manifest_args=(--input "bam=$bam_to_use" --input "reference=$reference" --input "bed=$bed_file")
+                if [[ -z "$dep_opt" ]] && step_up_to_date 3 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 3 à jour, non soumise"
+                    continue
+                fi
                
-                jobid_svs=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-                    --output="logs/step3_svs_%j.out" \
-                    sbatch/step3_svs.sbatch "$sample_name" "$bam_to_use" "$reference" "$threads" "$bed_file" | awk '{print $4}')
+                predict_resources 3 "$source_bam" "$bed_file"
+                submit_step 3 $dep_opt --output="logs/step3_svs_%j.out" \
+                    sbatch/step3_svs.sbatch "$sample_name" "$bam_to_use" "$reference" "$STEP_CPUS" "$bed_file"
+                jobid_svs=$STEP_JOBID
+                step_jobs[3]=$jobid_svs
                
                 if [[ -n "$jobid_svs" ]]; then
                     echo "SVs soumis - Job ID : $jobid_svs"
+                    record_job 3 "$jobid_svs"
+                    record_step_manifest 3 "$jobid_svs" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission des SVs"
                 fi
@@ -224,32 +606,42 @@ function execute_steps_with_dependencies() {
             4) # CNVkit
                 echo " Étape 4 - Détection de CNVs"
                
-                # Déterminer les dépendances (peut dépendre de l'alignement ou des SVs)
-                local dep_opt=""
-                if [[ -n "$jobid_svs" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_svs"
-                    echo "   Dépend des SVs (Job $jobid_svs)"
-                elif [[ -n "$jobid_align" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_align"
+                if [[ -n "$dep_opt" ]]; then
                     echo "   Dépend de l'alignement (Job $jobid_align)"
                 fi
                
                 # Vérifier/demander le BAM si nécessaire
                 local bam_to_use="results/${sample_name}/mapping/${sample_name}.bam"
-                if [[ -z "$jobid_align" && ! -f "$bam_to_use" ]]; then
+                if [[ -z "$dep_opt" && ! -f "$bam_to_use" ]]; then
                     read -p "Chemin du fichier BAM pour CNVkit : " bam_to_use
                     if [[ ! -f "$bam_to_use" ]]; then
                         echo "Fichier BAM introuvable : $bam_to_use"
                         continue
                     fi
                 fi
+
+                # Mode ciblé : BAM restreint au BED, commun aux étapes 2, 3, 4 et 6
+                local source_bam=$bam_to_use
+                targeted_bam "$source_bam" "$bed_file" "$dep_opt"
+                bam_to_use=$TARGETED_BAM
+                dep_opt=$TARGETED_DEP
+
+                local manifest_args=(--input "bam=$bam_to_use" --input "reference=$reference" --input "bed=$bed_file")
+                if [[ -z "$dep_opt" ]] && step_up_to_date 4 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 4 à jour, non soumise"
+                    continue
+                fi
                
-                jobid_cnv=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-                    --output="logs/step4_cnvkit_%j.out" \
-                    sbatch/step4_cnvkit.sbatch "$sample_name" "$reference" "$threads" "$bed_file" "$bam_to_use" | awk '{print $4}')
+                predict_resources 4 "$source_bam" "$bed_file"
+                submit_step 4 $dep_opt --output="logs/step4_cnvkit_%j.out" \
+                    sbatch/step4_cnvkit.sbatch "$sample_name" "$reference" "$STEP_CPUS" "$bed_file" "$bam_to_use"
+                jobid_cnv=$STEP_JOBID
+                step_jobs[4]=$jobid_cnv
                
                 if [[ -n "$jobid_cnv" ]]; then
                     echo "CNVkit soumis - Job ID : $jobid_cnv"
+                    record_job 4 "$jobid_cnv"
+                    record_step_manifest 4 "$jobid_cnv" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission de CNVkit"
                 fi
@@ -258,20 +650,10 @@ function execute_steps_with_dependencies() {
             5) # Méthylation
                 echo " Étape 5 - Méthylation"
                
-                # Déterminer les dépendances
-                local dep_opt=""
-                if [[ -n "$jobid_align" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_align"
-                    echo "  Dépend de l'alignement (Job $jobid_align)"
-                fi
-               
-                # Demander les fichiers spécifiques pour la méthylation
-                if [[ -z "$modified_bam" ]]; then
-                    read -p "Chemin du fichier BAM modifié (annoté avec modkit) : " modified_bam
-                    if [[ ! -f "$modified_bam" ]]; then
-                        echo "Fichier BAM modifié introuvable : $modified_bam"
-                        continue
-                    fi
+                # BAM modifié demandé avant le plan ; absent seulement s'il sort de l'alignement
+                if [[ ! -f "$modified_bam" && ! ( -n "$dep_opt" && "$modified_bam" == "results/${sample_name}/mapping/"* ) ]]; then
+                    echo "Fichier BAM modifié introuvable : $modified_bam"
+                    continue
                 fi
                
                 if [[ -z "$region_file" ]]; then
@@ -281,13 +663,33 @@ function execute_steps_with_dependencies() {
                         continue
                     fi
                 fi
-               
-                jobid_methylation=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-                    --output="logs/step5_methylation_%j.out" \
-                    sbatch/step5_methylation.sbatch "$sample_name" "$reference" "$threads" "$region_file" "$modified_bam" | awk '{print $4}')
+
+                # Le BAM modifié n'attend l'alignement que s'il en est la sortie (graphe des étapes)
+                if [[ -n "$dep_opt" ]]; then
+                    echo "  Dépend de l'alignement (Job $jobid_align)"
+                fi
+                # Mode ciblé : BAM modifié restreint au fichier de régions
+                targeted_bam "$modified_bam" "$region_file" "$dep_opt" methylation
+                local methyl_bam=$TARGETED_BAM
+                dep_opt=$TARGETED_DEP
+
+                local manifest_args=(--input "modified_bam=$methyl_bam" --input "reference=$reference"
+                    --input "regions=$region_file")
+                if [[ -z "$dep_opt" ]] && step_up_to_date 5 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 5 à jour, non soumise"
+                    continue
+                fi
+
+                predict_resources 5 "$modified_bam"
+                submit_step 5 $dep_opt --output="logs/step5_methylation_%j.out" \
+                    sbatch/step5_methylation.sbatch "$sample_name" "$reference" "$STEP_CPUS" "$region_file" "$methyl_bam"
+                jobid_methylation=$STEP_JOBID
+                step_jobs[5]=$jobid_methylation
                
                 if [[ -n "$jobid_methylation" ]]; then
                     echo "Méthylation soumise - Job ID : $jobid_methylation"
+                    record_job 5 "$jobid_methylation"
+                    record_step_manifest 5 "$jobid_methylation" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission de la méthylation"
                 fi
@@ -296,29 +698,43 @@ function execute_steps_with_dependencies() {
             6) # QC
                 echo " Étape 6 - Contrôle qualité"
                
-                # Déterminer les dépendances
-                local dep_opt=""
-                if [[ -n "$jobid_align" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_align"
+                if [[ -n "$dep_opt" ]]; then
                     echo "   Dépend de l'alignement (Job $jobid_align)"
                 fi
                
                 # Vérifier/demander le BAM si nécessaire
                 local bam_to_use="results/${sample_name}/mapping/${sample_name}.bam"
-                if [[ -z "$jobid_align" && ! -f "$bam_to_use" ]]; then
+                if [[ -z "$dep_opt" && ! -f "$bam_to_use" ]]; then
                     read -p "Chemin du fichier BAM pour le QC : " bam_to_use
                     if [[ ! -f "$bam_to_use" ]]; then
                         echo "Fichier BAM introuvable : $bam_to_use"
                         continue
                     fi
                 fi
+
+                # Mode ciblé : BAM restreint au BED, commun aux étapes 2, 3, 4 et 6
+                local source_bam=$bam_to_use
+                targeted_bam "$source_bam" "$bed_file" "$dep_opt"
+                bam_to_use=$TARGETED_BAM
+                dep_opt=$TARGETED_DEP
+
+                local manifest_args=(--input "bam=$bam_to_use" --input "reference=$reference" --input "bed=$bed_file"
+                    --param "coverage_bin_size=${COVERAGE_BIN_SIZE:-1000}")
+                if [[ -z "$dep_opt" ]] && step_up_to_date 6 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 6 à jour, non soumise"
+                    continue
+                fi
                
-                jobid_qc=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-                    --output="logs/step6_qc_%j.out" \
-                    sbatch/step6_qc.sbatch "$sample_name" "$bam_to_use" "$threads" "$reference" "$bed_file" | awk '{print $4}')
+                predict_resources 6 "$source_bam" "$bed_file"
+                submit_step 6 $dep_opt --output="logs/step6_qc_%j.out" \
+                    sbatch/step6_qc.sbatch "$sample_name" "$bam_to_use" "$STEP_CPUS" "$reference" "$bed_file"
+                jobid_qc=$STEP_JOBID
+                step_jobs[6]=$jobid_qc
                
                 if [[ -n "$jobid_qc" ]]; then
                     echo "QC soumis - Job ID : $jobid_qc"
+                    record_job 6 "$jobid_qc"
+                    record_step_manifest 6 "$jobid_qc" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission du QC"
                 fi
@@ -327,29 +743,36 @@ function execute_steps_with_dependencies() {
             7) # Annotation
                 echo " Étape 7 - Annotation"
                
-                # Déterminer les dépendances
-                local dep_opt=""
-                if [[ -n "$jobid_snps" ]]; then
-                    dep_opt="--dependency=afterok:$jobid_snps"
+                if [[ -n "$dep_opt" ]]; then
                     echo "   Dépend des SNPs (Job $jobid_snps)"
                 fi
                
                 # Vérifier/demander le VCF si nécessaire
                 local vcf_to_use="results/${sample_name}/snps_clair3/merge_output.vcf.gz"
-                if [[ -z "$jobid_snps" && ! -f "$vcf_to_use" ]]; then
+                if [[ -z "$dep_opt" && ! -f "$vcf_to_use" ]]; then
                     read -p "Chemin du fichier VCF pour l'annotation : " vcf_to_use
                     if [[ ! -f "$vcf_to_use" ]]; then
                         echo "Fichier VCF introuvable : $vcf_to_use"
                         continue
                     fi
                 fi
+
+                local manifest_args=(--input "vcf=$vcf_to_use" --input "reference=$reference")
+                if [[ -z "$dep_opt" ]] && step_up_to_date 7 "${manifest_args[@]}"; then
+                    echo "   ➤ Étape 7 à jour, non soumise"
+                    continue
+                fi
                
-                jobid_annotation=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-                    --output="logs/step7_annotation_%j.out" \
-                    sbatch/step7_annotation.sbatch "$sample_name" "$vcf_to_use" "$threads" "$reference" | awk '{print $4}')
+                predict_resources 7 "$vcf_to_use"
+                submit_step 7 $dep_opt --output="logs/step7_annotation_%j.out" \
+                    sbatch/step7_annotation.sbatch "$sample_name" "$vcf_to_use" "$STEP_CPUS" "$reference"
+                jobid_annotation=$STEP_JOBID
+                step_jobs[7]=$jobid_annotation
                
                 if [[ -n "$jobid_annotation" ]]; then
                     echo "Annotation soumise - Job ID : $jobid_annotation"
+                    record_job 7 "$jobid_annotation"
+                    record_step_manifest 7 "$jobid_annotation" "${manifest_args[@]}"
                 else
                     echo "Erreur lors de la soumission de l'annotation"
                 fi
@@ -370,6 +793,10 @@ function execute_steps_with_dependencies() {
     [[ -n "$jobid_methylation" ]] && echo "   ➤ Méthylation    : $jobid_methylation"
     [[ -n "$jobid_qc" ]] && echo "   ➤ QC             : $jobid_qc"
     [[ -n "$jobid_annotation" ]] && echo "   ➤ Annotation     : $jobid_annotation"
+    local out
+    for out in "${!TARGETED_JOBS[@]}"; do
+        [[ -n "${TARGETED_JOBS[$out]}" ]] && echo "   ➤ BAM ciblé      : ${TARGETED_JOBS[$out]} ($out)"
+    done
     echo ""
 }
 
@@ -389,10 +816,33 @@ non_interactive=true
             --option) menu_choice="$2"; shift 2 ;;
             --step) selected_steps+=("$2"); shift 2 ;;
             --bam_input) bam_file="$2"; shift 2 ;;
+            --force) force_steps=true; shift ;;
+            --sample_sheet) sample_sheet="$2"; shift 2 ;;
+            --array_limit) array_limit="$2"; shift 2 ;;
+            --executor) executor="$2"; shift 2 ;;
+            --no-targeted) targeted="no"; shift ;;
+            --target_padding) target_padding="$2"; shift 2 ;;
             *) shift ;;
         esac
     done
 
+  if [[ -n "$sample_sheet" ]]; then
+    echo "📋 Lot multi-échantillons : $sample_sheet"
+    if [[ ! -f "$sample_sheet" || -z "$reference" ]]; then
+        echo "[ERREUR] --sample_sheet introuvable ou --reference manquant"
+        exit 1
+    fi
+    partition="${partition:-bigmem-amd,bigmem}"
+    threads="${threads:-16}"
+    if [[ ${#selected_steps[@]} -eq 0 ]]; then
+        selected_steps=(1 2 3 4 6 7)
+    fi
+    echo "✅ Étapes à exécuter : ${selected_steps[*]}"
+    execute_sample_sheet "$sample_sheet" "${selected_steps[@]}" || exit 1
+    echo "✅ Tous les jobs ont été soumis."
+    exit 0
+  fi
+
   if [[ "$menu_choice" == "1" ]]; then
     echo "🧪 Pipeline complet sélectionné (--option 1)"
     
@@ -478,7 +928,7 @@ function choose_steps() {
     echo ""
     echo " Les dépendances seront automatiquement gérées :"
     echo "   • SNPs, SVs, CNV, QC dépendent de l'Alignement"
-    echo "   • CNVkit peut dépendre des SVs si les deux sont sélectionnés"
+    echo "   • Méthylation ne dépend que du BAM modifié fourni"
     echo "   • Annotation dépend des SNPs"
     echo ""
 
@@ -591,7 +1041,7 @@ function run_alignment() {
 
 
        echo " Soumission SLURM pour l'alignement..."
-    sbatch --export=ALL --partition="$partition" --cpus-per-task="$threads" --mem=128G \
+    submit_job --export=ALL --partition="$partition" --cpus-per-task="$threads" --mem=128G \
         --output="logs/step1_align_%j.out" \
         sbatch/step1_align.sbatch "$sample_name" "$threads" "$fastq_input" "$reference"
 
@@ -696,9 +1146,9 @@ function run_snps() {
     
     mkdir -p logs
     
-    jobid=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-        --output="logs/step2_snps_%j.out" \
-        sbatch/step2_snps.sbatch "$sample_name" "$bam_file" "$reference" "$threads" "$bed_file" "$do_phasing" | awk '{print $4}')
+    predict_resources 2 "$bam_file" "$bed_file"
+    submit_snps "$dep_opt" "$bam_file" "$bed_file" "$do_phasing"
+    jobid=$SNPS_JOBID
     
     if [[ -n "$jobid" ]]; then
         echo "Job SLURM soumis avec succès"
@@ -754,7 +1204,7 @@ function run_annotation() {
     mkdir -p logs
     
     echo " Soumission SLURM de l'étape Annotation..."
-    sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
+    submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
     --output="logs/step7_annotation_%j.out" \
     sbatch/step7_annotation.sbatch "$sample_name" "$vcf_file" "$threads" "$reference"
 
@@ -809,7 +1259,7 @@ function run_svs() {
     echo " Étape 3 - Détection des SVs (Sniffles2 + CuteSV + SURVIVOR)"
     mkdir -p logs
 
-    sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
+    submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
         --output="logs/step3_svs_%j.out" \
         sbatch/step3_svs.sbatch "$sample_name" "$bam_file" "$reference" "$threads" "$bed_file"  | awk '{print $4}'
 }
@@ -1068,7 +1518,7 @@ function run_cnvkit() {
 
     mkdir -p logs
 
-   jobid=$(sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
+   jobid=$(submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
         --output="logs/step4_cnvkit_%j.out" \
         sbatch/step4_cnvkit.sbatch "$sample_name" "$reference" "$threads" "$bed_file" "$cnv_bam" | awk '{print $4}')
     
@@ -1113,7 +1563,7 @@ function run_methylation() {
     mkdir -p logs
     echo " Soumission SLURM pour l'étape Méthylation..."
 
-    sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
+    submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
         --output="logs/step5_methylation_%j.out" \
         sbatch/step5_methylation.sbatch "$sample_name" "$reference" "$threads" "$region_file" "$modified_bam"
 }
@@ -1163,7 +1613,7 @@ function run_qc() {
 
 
     echo " Soumission SLURM de l'étape QC..."
-    sbatch --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
+    submit_job --export=ALL $dep_opt --partition="$partition" --cpus-per-task="$threads" --mem=256G \
         --output="logs/step6_qc_%j.out" \
         sbatch/step6_qc.sbatch "$sample_name" "$bam_file" "$threads" "$reference" "$bed_file"
 }
@@ -1251,6 +1701,7 @@ while true; do
             else
                 echo "fastq_files=${fastq_files_list[*]}" >> "$CONFIG_FILE"
             fi
+            sample_registry import --config "$CONFIG_FILE" > /dev/null
 
             echo ""
             echo "📋 Résumé de la configuration :"
@@ -1265,77 +1716,8 @@ while true; do
             echo ""
             
         
-            # Étape 1 : alignement
-                       echo "Soumission de l'étape Alignement..."
-            jobid_align=$(sbatch --export=ALL --partition="$partition" --cpus-per-task="$threads" --mem=128G \
-                --output="logs/step1_align_%j.out" \
-                sbatch/step1_align.sbatch "$sample_name" "$threads" "$fastq_input" "$reference" | awk '{print $4}')
-        
-            if [[ -z "$jobid_align" ]]; then
-                echo "Erreur lors de la soumission de l'alignement"
-                continue
-            fi
-            echo "Alignement soumis - Job ID : $jobid_align"
-            echo " BAM attendu : $expected_bam"
-        
-        
-            # # On suppose que le script écrit bam_file=... dans le config
-            # sleep 2
-            # if [[ -f "$CONFIG_FILE" ]]; then
-            #     source "$CONFIG_FILE"
-            # fi
-        
-        
-            # if [[ ! -f "$bam_file" ]]; then
-            #     echo "[  ATTENTION] Le fichier BAM n'existe pas encore : $bam_file"
-            #     echo "Les étapes suivantes dépendent de la complétion du job SLURM précédent."
-            # fi
-
-            # Étape 2 : SNPs
-            echo "Soumission de l'étape SNPs (dépend de l'alignement)..."
-            jobid_snps=$(sbatch --export=ALL --dependency=afterok:$jobid_align --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-            --output="logs/step2_snps_%j.out" \
-            sbatch/step2_snps.sbatch "$sample_name" "$expected_bam" "$reference" "$threads" "$bed_file" "$do_phasing" | awk '{print $4}')
-
-            # Étape 3 : SVs
-            echo "Soumission de l'étape SVs (dépend de l'alignement)..."
-            jobid_svs=$(sbatch --export=ALL --dependency=afterok:$jobid_align --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-            --output="logs/step3_svs_%j.out" \
-            sbatch/step3_svs.sbatch "$sample_name" "$expected_bam" "$reference" "$threads" "$bed_file" | awk '{print $4}')
-
-            # Étape 4 : CNVkit (dépend de SVs)
-            echo "Soumission de l'étape CNVkit (dépend de SVs)..."
-            jobid_cnv=$(sbatch --export=ALL --dependency=afterok:$jobid_svs --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-            --output="logs/step4_cnvkit_%j.out" \
-            sbatch/step4_cnvkit.sbatch "$sample_name" "$reference" "$threads" "$bed_file" "$expected_bam" | awk '{print $4}')
-
-            # # Étape 5 : Méthylation (interactif)
-            # echo "Étape Méthylation (après CNV)..."
-            # run_methylation
-
-            # Étape 6 : Q_score
-            echo "Soumission de l'étape QC (dépend de l'alignement)..."
-            jobid_qc=$(sbatch --export=ALL --dependency=afterok:$jobid_align --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-            --output="logs/step6_qc_%j.out" \
-            sbatch/step6_qc.sbatch "$sample_name" "$expected_bam" "$threads" "$reference" "$bed_file" | awk '{print $4}')
-
-            # Étape 7 : Annotation (VEP + Annovar)
-            echo "Soumission de l'étape Annotation (dépend de SNPs)..."
-            expected_vcf="results/${sample_name}/snps_clair3/merge_output.vcf.gz"
-            jobid_annotation=$(sbatch --export=ALL --dependency=afterok:$jobid_snps --partition="$partition" --cpus-per-task="$threads" --mem=256G \
-            --output="logs/step6_annotation_%j.out" \
-            sbatch/step7_annotation.sbatch "$sample_name" "$expected_vcf" "$threads" "$reference" | awk '{print $4}')
-
-            echo ""
-            echo " Pipeline complet soumis avec dépendances."
-            echo " Résumé des jobs :"
-            echo "   ➤ Alignement : $jobid_align"
-            echo "   ➤ SNPs       : $jobid_snps (dépend de $jobid_align)"
-            echo "   ➤ SVs        : $jobid_svs (dépend de $jobid_align)"
-            echo "   ➤ CNVkit     : $jobid_cnv (dépend de $jobid_align)"
-            echo "   ➤ QC         : $jobid_qc (dépend de $jobid_align)"
-            echo "   ➤ Annotation : $jobid_annotation (dépend de $jobid_snps)"
-            echo ""
+            # Étapes 1 à 7 (sauf méthylation) soumises selon le graphe de dépendances
+            execute_steps_with_dependencies 1 2 3 4 6 7 || continue
             echo " Note : L'étape Méthylation nécessite une intervention manuelle"
             echo "   Utilisez l'option 2 pour la lancer après que l'alignement soit terminé"
             ;;
@@ -0,0 +1 @@
+"""Modules Python partagés par l'interface Streamlit et les scripts SLURM du pipeline."""
@@ -0,0 +1,169 @@
+#!/bin/bash
+# Activation en cache des environnements conda des étapes.
+#
+# `conda activate` (source conda.sh, résolution du préfixe, scripts
+# activate.d, puis `conda info --envs`) coûte plusieurs dizaines de secondes
+# par job sur un système de fichiers partagé chargé. L'activation est donc
+# capturée une fois : les variables qu'elle modifie (PATH préfixé,
+# CONDA_PREFIX, variables des scripts activate.d...) sont écrites dans
+# $PIPELINE_CACHE_DIR/envs/<clé>.sh, qu'il suffit ensuite de sourcer.
+#
+# La clé dépend des environnements (dans l'ordre d'empilement), de conda.sh et
+# de la taille / date de conda-meta/history de chaque environnement : une
+# installation ou mise à jour de paquet invalide le cache, reconstruit au job
+# suivant. setup.sh construit le cache de toutes les étapes à l'installation.
+#
+# Usage :
+#   source "$PIPELINE_DIR/scripts/activate_env.sh"
+#   activate_env "$PIPELINE_DIR/.conda_envs/sv_env" "$PIPELINE_DIR/.conda_envs/sv_sniff"   # empilés
+#   activate_step_envs 3                                   # environnements de l'étape 3
+#
+#   bash scripts/activate_env.sh build [étapes...]         # construit le cache (setup.sh)
+#
+# En cas d'échec de la capture, activate_env revient à `conda activate`
+# directement dans le shell du job (comportement d'origine).
+
+ENV_CACHE_DIR="${PIPELINE_CACHE_DIR:-${PIPELINE_DIR:-.}/.cache}/envs"
+CONDA_ENVS_DIR="${PIPELINE_DIR:-.}/.conda_envs"
+if [[ -z "$CONDA_SH" ]]; then
+    CONDA_SH="$HOME/local/bin/miniconda/etc/profile.d/conda.sh"
+    [[ ! -f "$CONDA_SH" && -f "$HOME/miniconda3/etc/profile.d/conda.sh" ]] && CONDA_SH="$HOME/miniconda3/etc/profile.d/conda.sh"
+fi
+
+# Environnements de chaque étape, empilés dans l'ordre (nom = env de la base conda ;
+# 0 = préparation de la référence des lots)
+declare -A STEP_ENVS=(
+    [0]="$CONDA_ENVS_DIR/sv_env"
+    [1]="$CONDA_ENVS_DIR/sv_env"
+    [2]="$CONDA_ENVS_DIR/sv_env"
+    [3]="$CONDA_ENVS_DIR/sv_env $CONDA_ENVS_DIR/sv_sniff"
+    [4]="$CONDA_ENVS_DIR/cnvkit_env"
+    [5]="$CONDA_ENVS_DIR/sv_env"
+    [6]="$CONDA_ENVS_DIR/sv_env"
+    [7]="sv_env"
+)
+
+# Préfixe d'un environnement donné par chemin ou par nom
+function _env_prefix() {
+    local env=$1
+    if [[ "$env" == */* ]]; then
+        echo "$env"
+    else
+        echo "$(dirname "$(dirname "$(dirname "$CONDA_SH")")")/envs/$env"
+    fi
+}
+
+function _env_cache_file() {
+    local key="$CONDA_SH" env
+    for env in "$@"; do
+        key+="|$env|$(stat -c '%s:%Y' "$(_env_prefix "$env")/conda-meta/history" 2>/dev/null)"
+    done
+    echo "$ENV_CACHE_DIR/$(echo -n "$key" | sha1sum | cut -c1-16).sh"
+}
+
+# Active les environnements dans un sous-shell et affiche les variables modifiées.
+# Les environnements déjà actifs dans le shell appelant sont d'abord désactivés :
+# sinon conda réécrit PATH au lieu de le préfixer et le cache figerait le PATH
+# et les CONDA_PREFIX_<n> de l'utilisateur qui l'a construit.
+function _env_capture() {
+    (
+        set +eu
+        source "$CONDA_SH" || exit 1
+        while [[ ${CONDA_SHLVL:-0} -gt 0 ]]; do
+            conda deactivate >&2 || exit 1
+        done
+        local -A before=()
+        local line name value env
+        while IFS= read -r -d '' line; do
+            before[${line%%=*}]=${line#*=}
+        done < <(env -0)
+        # Messages éventuels des scripts activate.d hors du script capturé
+        conda activate "$1" >&2 || exit 1
+        shift
+        for env in "$@"; do
+            conda activate --stack "$env" >&2 || exit 1
+        done
+        while IFS= read -r -d '' line; do
+            name=${line%%=*}
+            value=${line#*=}
+            [[ "$name" =~ ^(_|SHLVL|PWD|OLDPWD)$ || "$name" == BASH_FUNC_* ]] && continue
+            [[ -v before[$name] && "${before[$name]}" == "$value" ]] && continue
+            if [[ "$name" == "PATH" ]]; then
+                # Seuls les dossiers ajoutés par conda sont figés ; le PATH du job est conservé.
+                # PATH réécrit (pas un simple préfixe) : pas de cache
+                if [[ -z "${before[PATH]}" || "$value" != *":${before[PATH]}" ]]; then
+                    echo "PATH modifié autrement que par un préfixe, activation non mise en cache" >&2
+                    exit 1
+                fi
+                printf 'export PATH=%q${PATH:+:$PATH}\n' "${value%":${before[PATH]}"}"
+            else
+                printf 'export %s=%q\n' "$name" "$value"
+            fi
+        done < <(env -0)
+    )
+}
+
+# Construit (si besoin) le script d'activation des environnements ; affiche son chemin
+function build_env_cache() {
+    local cache_file
+    cache_file=$(_env_cache_file "$@")
+    if [[ ! -s "$cache_file" ]]; then
+        mkdir -p "$ENV_CACHE_DIR" || return 1
+        # Fichier temporaire unique (dossier partagé entre nœuds, tâches d'array simultanées)
+        local tmp_file
+        tmp_file=$(mktemp "$ENV_CACHE_DIR/.$(basename "$cache_file").XXXXXX") || return 1
+        {
+            echo "# Activation en cache : $*"
+            _env_capture "$@"
+        } > "$tmp_file" && grep -q '^export CONDA_PREFIX=' "$tmp_file" && chmod 644 "$tmp_file" \
+            && mv -f "$tmp_file" "$cache_file" || {
+            rm -f "$tmp_file"
+            return 1
+        }
+    fi
+    echo "$cache_file"
+}
+
+# Active un ou plusieurs environnements empilés (cache, sinon conda activate)
+function activate_env() {
+    local start_ns cache_file env
+    start_ns=$(date +%s%N)
+    if cache_file=$(build_env_cache "$@") && source "$cache_file"; then
+        echo "Environnement(s) activé(s) en $(( ($(date +%s%N) - start_ns) / 1000000 )) ms : $*"
+        return 0
+    fi
+
+    echo "⚠️ Cache d'activation indisponible, activation conda directe : $*"
+    source "$CONDA_SH" || return 1
+    conda activate "$1" || return 1
+    shift
+    for env in "$@"; do
+        conda activate --stack "$env" || return 1
+    done
+}
+
+function activate_step_envs() {
+    local step=$1
+    activate_env ${STEP_ENVS[$step]}
+}
+
+# Exécuté directement : construction du cache des étapes demandées (toutes par défaut)
+if [[ "${BASH_SOURCE[0]}" == "$0" ]]; then
+    if [[ "$1" != "build" ]]; then
+        echo "Usage : bash $0 build [étapes...]"
+        exit 1
+    fi
+    shift
+    steps=("$@")
+    [[ ${#steps[@]} -eq 0 ]] && steps=(1 2 3 4 5 6 7)
+    status=0
+    for step in "${steps[@]}"; do
+            if cache_file=$(build_env_cache ${STEP_ENVS[$step]}); then
+            echo "Étape $step : $cache_file"
+        else
+            echo "Étape $step : échec de la capture (${STEP_ENVS[$step]})"
+            status=1
+        fi
+    done
+    exit $status
+fi
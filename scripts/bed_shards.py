@@ -0,0 +1,170 @@
+"""Découpage du génome en shards de taille équilibrée pour Clair3 (étape 2).
+
+Les intervalles sans gap de hg38.bed sont éventuellement restreints au BED
+utilisateur (intersection), puis répartis dans l'ordre du génome en N shards
+contigus d'environ le même nombre de bases. Chaque shard est écrit dans
+<outdir>/shard_NNNN.bed et sert de --bed_fn à une tâche du job array.
+
+Usage :
+    python3 scripts/bed_shards.py --genome hg38.bed [--bed user.bed] [--fai ref.fa.fai] \\
+        --shards 24 --outdir results/S/snps_clair3/shards
+
+Affiche le nombre de shards écrits.
+"""
+import argparse
+import glob
+import os
+import sys
+
+# Taille minimale d'un shard (bases)
+MIN_SHARD_BASES = 5_000_000
+
+
+def read_bed(path):
+    """Intervalles (chrom, début, fin) ; lignes vides, d'en-tête ou mal formées ignorées."""
+    intervals = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.split("\t") if "\t" in line else line.split()
+            try:
+                intervals.append((fields[0], int(fields[1]), int(fields[2])))
+            except (IndexError, ValueError):
+                continue
+    return intervals
+
+
+def read_fai(path):
+    """Contigs (nom, longueur) d'un .fai ; lignes mal formées ignorées (fichier tronqué,
+    pointeur git-lfs non résolu...)."""
+    contigs = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split("\t")
+            try:
+                contigs.append((fields[0], int(fields[1])))
+            except (IndexError, ValueError):
+                continue
+    return contigs
+
+
+def merge_intervals(intervals):
+    """Fusionne les intervalles chevauchants ; retourne {chrom: [(start, end), ...]} trié."""
+    by_chrom = {}
+    for chrom, start, end in intervals:
+        by_chrom.setdefault(chrom, []).append((start, end))
+    for chrom, items in by_chrom.items():
+        items.sort()
+        merged = [list(items[0])]
+        for start, end in items[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        by_chrom[chrom] = [tuple(i) for i in merged]
+    return by_chrom
+
+
+def intersect(a, b):
+    """Intersection de deux listes d'intervalles triées et disjointes."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def target_regions(genome_bed, user_bed=None, fai=None):
+    """Régions à appeler, dans l'ordre des contigs de la référence (ou du BED génome)."""
+    genome = merge_intervals(read_bed(genome_bed))
+    order = list(genome)
+
+    contigs = read_fai(fai) if fai else []
+    if fai and not contigs:
+        print(f"⚠️ Index {fai} illisible ou vide : ordre des contigs de {genome_bed}", file=sys.stderr)
+    if contigs:
+        known = [name for name, _ in contigs if name in genome]
+        if known:
+            order = known
+        else:
+            # Nommage des contigs différent de hg38.bed : contigs entiers de la référence
+            genome = {name: [(0, length)] for name, length in contigs}
+            order = [name for name, _ in contigs]
+
+    regions = {chrom: genome[chrom] for chrom in order}
+    if user_bed:
+        user = merge_intervals(read_bed(user_bed))
+        regions = {chrom: intersect(items, user.get(chrom, [])) for chrom, items in regions.items()}
+
+    return [(chrom, start, end) for chrom in order for start, end in regions[chrom]]
+
+
+def make_shards(regions, n_shards, min_bases=MIN_SHARD_BASES):
+    """Répartit les régions (ordonnées) en au plus n_shards groupes contigus de taille équilibrée."""
+    total = sum(end - start for _, start, end in regions)
+    if total == 0:
+        return []
+    # Un petit panel ne justifie pas autant de tâches (démarrage Clair3 coûteux) :
+    # chaque shard fait au moins min_bases (le dernier reçoit le reste), sauf si
+    # le total est lui-même plus petit
+    n_shards = max(1, min(n_shards, total // min_bases))
+    target = total // n_shards
+
+    shards = [[]]
+    filled = 0
+    for chrom, start, end in regions:
+        while start < end:
+            if filled >= target and len(shards) < n_shards:
+                shards.append([])
+                filled = 0
+            take = min(end - start, target - filled) if len(shards) < n_shards else end - start
+            shards[-1].append((chrom, start, start + take))
+            filled += take
+            start += take
+    return [s for s in shards if s]
+
+
+def write_shards(shards, outdir):
+    os.makedirs(outdir, exist_ok=True)
+    for old in glob.glob(os.path.join(outdir, "shard_*.bed")):
+        os.remove(old)
+    with open(os.path.join(outdir, "shards.tsv"), "w") as summary:
+        summary.write("shard\tbases\tintervals\n")
+        for i, shard in enumerate(shards, 1):
+            name = f"shard_{i:04d}"
+            with open(os.path.join(outdir, f"{name}.bed"), "w") as f:
+                for chrom, start, end in shard:
+                    f.write(f"{chrom}\t{start}\t{end}\n")
+            summary.write(f"{name}\t{sum(e - s for _, s, e in shard)}\t{len(shard)}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Découpage du génome en shards pour Clair3")
+    parser.add_argument("--genome", required=True, help="BED des régions sans gap (hg38.bed)")
+    parser.add_argument("--bed", help="BED utilisateur à intersecter")
+    parser.add_argument("--fai", help="Index .fai de la référence (ordre et noms des contigs)")
+    parser.add_argument("--shards", type=int, default=24)
+    parser.add_argument("--min-bases", type=int, default=MIN_SHARD_BASES)
+    parser.add_argument("--outdir", required=True)
+    args = parser.parse_args(argv)
+
+    fai = args.fai if args.fai and os.path.exists(args.fai) else None
+    shards = make_shards(target_regions(args.genome, args.bed or None, fai), args.shards, args.min_bases)
+    if not shards:
+        print("Aucune région à appeler après intersection", file=sys.stderr)
+        return 1
+    write_shards(shards, args.outdir)
+    print(len(shards))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
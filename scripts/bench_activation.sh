@@ -0,0 +1,59 @@
+#!/bin/bash
+# Temps de démarrage des environnements par étape : activation conda d'origine
+# (source conda.sh, conda activate, conda info --envs) contre activation en
+# cache (scripts/activate_env.sh). Chaque mesure lance un bash neuf, comme un job.
+#
+# Usage :
+#   bash scripts/bench_activation.sh [-n répétitions] [étapes...]
+#
+# À lancer sur un nœud de calcul (ou via sbatch --wrap) pour mesurer le coût
+# réel du système de fichiers partagé ; le premier passage en cache inclut la
+# construction du cache si elle n'a pas été faite par setup.sh.
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+export PIPELINE_DIR="${PIPELINE_DIR:-$(dirname "$SCRIPT_DIR")}"
+source "$SCRIPT_DIR/activate_env.sh"
+
+repeats=3
+if [[ "$1" == "-n" ]]; then
+    repeats=$2
+    shift 2
+fi
+steps=("$@")
+[[ ${#steps[@]} -eq 0 ]] && steps=(1 2 3 4 5 6 7)
+
+# Médiane (s) des durées de `bash -c "$1"`, "échec" si une exécution échoue
+function time_command() {
+    local cmd=$1
+    local samples=() i start_ns
+    for ((i = 0; i < repeats; i++)); do
+        start_ns=$(date +%s%N)
+        bash -c "$cmd" > /dev/null 2>&1 || { echo "échec"; return; }
+        samples+=($(( $(date +%s%N) - start_ns )))
+    done
+    printf '%s\n' "${samples[@]}" | sort -n | awk '{v[NR] = $1} END {printf "%.3f", v[int((NR + 1) / 2)] / 1e9}'
+}
+
+printf '%-6s %-40s %10s %10s %8s\n' "Étape" "Environnements" "conda (s)" "cache (s)" "Gain"
+for step in "${steps[@]}"; do
+    envs=(${STEP_ENVS[$step]})
+    if [[ ${#envs[@]} -eq 0 ]]; then
+        echo "Étape $step inconnue"
+        continue
+    fi
+    legacy="source $(printf '%q' "$CONDA_SH") && conda activate $(printf '%q' "${envs[0]}")"
+    for env in "${envs[@]:1}"; do
+        legacy+=" && conda activate --stack $(printf '%q' "$env")"
+    done
+    legacy+=" && conda info --envs"
+    cached="source $(printf '%q' "$SCRIPT_DIR/activate_env.sh") && activate_env $(printf '%q ' "${envs[@]}")"
+
+    t_legacy=$(time_command "$legacy")
+    t_cached=$(time_command "$cached")
+    gain="-"
+    if [[ "$t_legacy" != "échec" && "$t_cached" != "échec" ]]; then
+        gain=$(awk -v a="$t_legacy" -v b="$t_cached" 'BEGIN {printf "x%.0f", (b > 0 ? a / b : 0)}')
+    fi
+    names=$(for env in "${envs[@]}"; do basename "$env"; done | paste -sd+)
+    printf '%-6s %-40s %10s %10s %8s\n' "$step" "$names" "$t_legacy" "$t_cached" "$gain"
+done
@@ -0,0 +1,187 @@
+"""Latence des reruns de l'interface : parcours d'origine contre caches partagés.
+
+Un dossier temporaire reproduit results/ (N échantillons avec config, sorties
+d'étapes et fichiers temporaires de Clair3), un fastq_pass/ MinKNOW, des logs et
+un lot. On chronomètre ensuite le travail « données » d'un rerun :
+
+- origine : les quatre onglets à chaque clic (listdir + config par échantillon,
+  inventaire FASTQ, glob de la vue d'ensemble, index des résultats, SQLite...) ;
+- après : barre latérale + onglet actif seulement, via scripts.ui_cache
+  (cache froid au premier rerun, puis chaud) ; un clic dans un fragment
+  (compteur de threads, couverture...) ne refait aucun de ces parcours.
+
+Le rendu Streamlit n'est pas mesuré (streamlit n'est pas requis).
+
+Usage :
+    python3 -m scripts.bench_ui_rerun [--samples 150] [--repeats 5]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Équivalent du steps_info de l'onglet Résultats (dossier, motifs)
+STEPS_INFO = {
+    "1": {"path": "mapping", "files": ["{sample}.bam", "{sample}.bam.bai"]},
+    "2": {"path": "snps_clair3", "files": ["merge_output.vcf.gz", "merge_output.vcf.gz.tbi"]},
+    "3": {"path": "svs", "files": ["*.vcf", "*.vcf.gz", "*.sv", "*.bed"]},
+    "4": {"path": "cnvkit", "files": ["{sample}.cns", "{sample}.cnr"]},
+    "6": {"path": "qc", "files": ["multiqc_report.html", "multiqc_data"]},
+    "7": {"path": "annotation", "files": ["*_annotation_vep.tsv", "*_annovar_pileup.hg38_multianno.txt"]},
+}
+FILE_TYPES = ("*.vcf*", "*.bam", "*.html", "*.pdf", "*.cns", "*.png")
+FASTQ_EXTENSIONS = (".fastq", ".fastq.gz")
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w"):
+        pass
+
+
+def build_tree(root, nb_samples, nb_barcodes=12, fastq_per_barcode=20, tmp_files=40):
+    """Arborescence factice ; un échantillon sur trois n'a pas fini toutes ses étapes."""
+    for i in range(nb_samples):
+        sample = f"S{i:04d}"
+        base = os.path.join(root, "results", sample)
+        _touch(os.path.join(base, f"config_{sample}.txt"))
+        os.makedirs(os.path.join(base, "bed_files"), exist_ok=True)
+        _touch(os.path.join(base, "mapping", f"{sample}.bam"))
+        _touch(os.path.join(base, "mapping", f"{sample}.bam.bai"))
+        for j in range(tmp_files):
+            _touch(os.path.join(base, "snps_clair3", "tmp", "pileup_output", f"chunk_{j}.vcf"))
+        if i % 3:
+            _touch(os.path.join(base, "snps_clair3", "merge_output.vcf.gz"))
+            _touch(os.path.join(base, "svs", "final_SVs.vcf"))
+            _touch(os.path.join(base, "cnvkit", f"{sample}.cns"))
+            _touch(os.path.join(base, "qc", "multiqc_report.html"))
+            _touch(os.path.join(base, "annotation", "fusion", f"{sample}_annotation_final.tsv"))
+    for b in range(1, nb_barcodes + 1):
+        for j in range(fastq_per_barcode):
+            _touch(os.path.join(root, "fastq_pass", f"barcode{b:02d}", f"reads_{j}.fastq.gz"))
+    for j in range(200):
+        _touch(os.path.join(root, "logs", f"job_{j}.out"))
+    _touch(os.path.join(root, "results", "batches", "lot1", "samples.tsv"))
+
+
+def _steps_info(sample):
+    return {
+        step: {"path": info["path"], "files": [p.format(sample=sample) for p in info["files"]]}
+        for step, info in STEPS_INFO.items()
+    }
+
+
+def rerun_origine(sample, fastq_dir):
+    """Travail d'un rerun avant restructuration : les quatre onglets, sans cache partagé."""
+    from scripts.results_index import load_index, step_status, find_files
+    from scripts.fastq_inventory import load_inventory, list_fastq
+    from scripts.sample_sheet import list_batches, output_matrix
+    from scripts import executor, telemetry
+
+    # Barre latérale : échantillons existants
+    [item for item in os.listdir("results")
+     if os.path.isdir(os.path.join("results", item))
+     and os.path.exists(os.path.join("results", item, f"config_{item}.txt"))]
+    # Pipeline complet : FASTQ et BED
+    list_fastq(load_inventory(fastq_dir), list(FASTQ_EXTENSIONS))
+    bed_folder = os.path.join("results", sample, "bed_files")
+    [f for f in os.listdir(bed_folder) if f.endswith(".bed")]
+    # Monitoring : pool local, lots, télémétrie
+    executor.queue_rows(include_done_since=time.time() - 3600)
+    list_batches()
+    conn = telemetry.connect()
+    telemetry.efficiency_rows(conn, sample)
+    conn.close()
+    # Résultats : liste, vue d'ensemble, index de l'échantillon
+    [d for d in os.listdir("results") if os.path.isdir(os.path.join("results", d)) and d != "batches"]
+    all_samples = sorted(
+        d for d in os.listdir("results")
+        if os.path.isdir(os.path.join("results", d)) and os.path.exists(os.path.join("results", d, f"config_{d}.txt"))
+    )
+    output_matrix(all_samples)
+    index = load_index(os.path.join("results", sample))
+    step_status(index, _steps_info(sample))
+    for pattern in FILE_TYPES:
+        find_files(index, pattern)
+
+
+def rerun_onglet(tab, sample, fastq_dir):
+    """Travail d'un rerun restructuré : barre latérale + onglet actif, via ui_cache."""
+    from scripts.results_index import load_index, step_status, find_files
+    from scripts import ui_cache
+
+    ui_cache.list_samples("results")
+    if tab == "pipeline":
+        ui_cache.fastq_files(fastq_dir, FASTQ_EXTENSIONS)
+        ui_cache.bed_files(os.path.join("results", sample, "bed_files"))
+    elif tab == "monitoring":
+        ui_cache.local_jobs(3600)
+        ui_cache.batches("results")
+        ui_cache.telemetry_rows(sample)
+    elif tab == "resultats":
+        ui_cache.list_samples("results", False)
+        ui_cache.sample_overview("results")
+        index = load_index(os.path.join("results", sample))
+        step_status(index, _steps_info(sample))
+        for pattern in FILE_TYPES:
+            find_files(index, pattern)
+
+
+def _median_ms(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latence des reruns de l'interface (travail sur les données)")
+    parser.add_argument("--samples", type=int, default=150, help="Nombre d'échantillons dans results/")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Conserver le dossier temporaire")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="bench_ui_")
+    cwd = os.getcwd()
+    try:
+        build_tree(root, args.samples)
+        # Chemins relatifs de l'interface (results/, logs/) et caches isolés du vrai pipeline
+        os.chdir(root)
+        os.environ["PIPELINE_CACHE_DIR"] = os.path.join(root, ".cache")
+        os.environ["PIPELINE_TELEMETRY_DB"] = os.path.join(root, "results", "telemetry.sqlite")
+        sys.path.insert(0, cwd)
+        from scripts import ui_cache
+
+        sample = "S0001"
+        fastq_dir = os.path.join(root, "fastq_pass")
+        # Premier passage hors mesure : caches disque (index, inventaire) et bases SQLite créés
+        rerun_origine(sample, fastq_dir)
+
+        print(f"{args.samples} échantillons, médiane sur {args.repeats} reruns (ms)")
+        print(f"{'Rerun':<45} {'ms':>10}")
+        origine = _median_ms(lambda: rerun_origine(sample, fastq_dir), args.repeats)
+        print(f"{'origine (4 onglets, chaque clic)':<45} {origine:>10.2f}")
+        for tab, label in (("pipeline", "Pipeline Complet"), ("monitoring", "Monitoring"),
+                           ("resultats", "Résultats et Suivi")):
+            ui_cache.clear_all()
+            cold = _median_ms(lambda: rerun_onglet(tab, sample, fastq_dir), 1)
+            warm = _median_ms(lambda: rerun_onglet(tab, sample, fastq_dir), args.repeats)
+            print(f"{'onglet ' + label + ' (cache froid)':<45} {cold:>10.2f}")
+            print(f"{'onglet ' + label + ' (cache chaud)':<45} {warm:>10.2f}   x{origine / warm if warm else 0:.0f}")
+        print(f"{'clic dans un fragment (threads, couverture...)':<45} {'aucun parcours':>10}")
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Arborescence conservée : {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""Stockage compact de la couverture par bins (remplace qc/depth.tsv).
+
+`samtools depth -aa` écrivait une ligne par base du génome (~3,1 milliards de
+lignes pour hg38). Le store garde, pour chaque contig, la profondeur moyenne
+par bin de taille fixe (float32) et l'histogramme des profondeurs par base,
+dans un seul fichier binaire lu par memmap :
+
+    [en-tête 64 octets][bins contig 1][hist contig 1]...[index JSON]
+
+L'en-tête contient le magic, la version, la taille des bins et la position de
+l'index JSON (nom, longueur, position des bins et de l'histogramme de chaque
+contig). Une requête ne lit que les bins de l'intervalle demandé.
+
+Les moyennes par région sont exactes à l'échelle du bin (bins partiellement
+recouverts pondérés par le recouvrement). Les fractions >= N× par contig
+viennent de l'histogramme (exactes) ; par région, elles sont estimées à partir
+des bins dont la moyenne atteint N.
+
+Usage :
+    python3 -m scripts.coverage_store summary results/S/qc/coverage.cov [--thresholds 1,10,20,30]
+    python3 -m scripts.coverage_store query results/S/qc/coverage.cov chr1:1000000-2000000
+    python3 -m scripts.coverage_store regions results/S/qc/coverage.cov cibles.bed
+    python3 -m scripts.coverage_store build-mosdepth --prefix results/S/qc/S_bins \\
+        --out results/S/qc/coverage.cov --sample S
+"""
+import argparse
+import gzip
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"HMCOVST\0"
+STORE_VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sIIQQ")
+
+DEFAULT_THRESHOLDS = (1, 10, 20, 30)
+
+
+def _align(f, boundary=8):
+    pad = -f.tell() % boundary
+    if pad:
+        f.write(b"\0" * pad)
+
+
+class CoverageStoreWriter:
+    """Écrit un store contig par contig (fichier temporaire puis renommage atomique)."""
+
+    def __init__(self, path, bin_size, sample=None, exact_hist=True):
+        self.path = path
+        self.bin_size = bin_size
+        self.index = {"sample": sample, "bin_size": bin_size, "exact_hist": exact_hist, "contigs": []}
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.f = open(self.tmp_path, "wb")
+        self.f.write(b"\0" * HEADER_SIZE)
+
+    def add_contig(self, name, length, bins, hist):
+        bins = np.ascontiguousarray(bins, dtype="<f4")
+        hist = np.trim_zeros(np.ascontiguousarray(hist, dtype="<u8"), "b")
+        _align(self.f)
+        bins_offset = self.f.tell()
+        self.f.write(bins.tobytes())
+        _align(self.f)
+        hist_offset = self.f.tell()
+        self.f.write(hist.tobytes())
+        self.index["contigs"].append({
+            "name": name, "length": int(length), "nbins": len(bins),
+            "bins_offset": bins_offset, "hist_offset": hist_offset, "hist_len": len(hist),
+        })
+
+    def close(self):
+        index = json.dumps(self.index).encode("utf-8")
+        index_offset = self.f.tell()
+        self.f.write(index)
+        self.f.seek(0)
+        self.f.write(_HEADER.pack(MAGIC, STORE_VERSION, self.bin_size, index_offset, len(index)))
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CoverageStore:
+    """Lecture d'un store : les bins ne sont chargés que sur l'intervalle demandé."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(f"{path} n'est pas un fichier de couverture (en-tête tronqué)")
+            magic, version, bin_size, index_offset, index_length = _HEADER.unpack_from(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} n'est pas un fichier de couverture")
+            if version != STORE_VERSION:
+                raise ValueError(f"{path} : version {version} non supportée")
+            f.seek(index_offset)
+            self.index = json.loads(f.read(index_length))
+        self.bin_size = bin_size
+        self.sample = self.index.get("sample")
+        self.exact_hist = self.index.get("exact_hist", True)
+        self._contigs = {c["name"]: c for c in self.index["contigs"]}
+        self._bins = {}
+
+    @property
+    def contigs(self):
+        return [c["name"] for c in self.index["contigs"]]
+
+    def length(self, contig):
+        return self._contig(contig)["length"]
+
+    def _contig(self, contig):
+        try:
+            return self._contigs[contig]
+        except KeyError:
+            raise KeyError(f"Contig absent du fichier de couverture : {contig}") from None
+
+    def bins(self, contig):
+        """Moyennes par bin du contig (memmap, rien n'est lu avant l'accès)."""
+        if contig not in self._bins:
+            info = self._contig(contig)
+            if info["nbins"]:
+                self._bins[contig] = np.memmap(self.path, dtype="<f4", mode="r",
+                                               offset=info["bins_offset"], shape=(info["nbins"],))
+            else:
+                self._bins[contig] = np.zeros(0, dtype="<f4")
+        return self._bins[contig]
+
+    def histogram(self, contig):
+        info = self._contig(contig)
+        if not info["hist_len"]:
+            return np.zeros(1, dtype=np.uint64)
+        with open(self.path, "rb") as f:
+            f.seek(info["hist_offset"])
+            return np.frombuffer(f.read(info["hist_len"] * 8), dtype="<u8")
+
+    def _bin_widths(self, length, first, last):
+        starts = np.arange(first, last, dtype=np.int64) * self.bin_size
+        return np.minimum(starts + self.bin_size, length) - starts
+
+    def _clip(self, contig, start, end):
+        length = self.length(contig)
+        start = max(0, int(start or 0))
+        end = length if end is None else min(int(end), length)
+        return length, start, end
+
+    def mean(self, contig, start=0, end=None):
+        """Profondeur moyenne sur [start, end), bins de bord pondérés par leur recouvrement."""
+        length, start, end = self._clip(contig, start, end)
+        if start >= end:
+            return 0.0
+        first = start // self.bin_size
+        last = (end - 1) // self.bin_size + 1
+        values = np.asarray(self.bins(contig)[first:last], dtype=np.float64)
+        bin_starts = np.arange(first, last, dtype=np.int64) * self.bin_size
+        overlap = np.minimum(bin_starts + self.bin_size, end) - np.maximum(bin_starts, start)
+        return float((values * overlap).sum() / (end - start))
+
+    def profile(self, contig, start=0, end=None, max_points=2000):
+        """Courbe (positions, moyennes) sur l'intervalle, regroupée en au plus max_points points."""
+        length, start, end = self._clip(contig, start, end)
+        if start >= end:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        first = start // self.bin_size
+        last = (end - 1) // self.bin_size + 1
+        values = np.asarray(self.bins(contig)[first:last], dtype=np.float64)
+        widths = self._bin_widths(length, first, last)
+        group = max(1, -(-len(values) // max_points))
+        n_groups = -(-len(values) // group)
+        pad = n_groups * group - len(values)
+        sums = np.pad(values * widths, (0, pad)).reshape(n_groups, group).sum(axis=1)
+        bases = np.pad(widths, (0, pad)).reshape(n_groups, group).sum(axis=1)
+        positions = (first + np.arange(n_groups) * group) * self.bin_size
+        return positions, np.divide(sums, bases, out=np.zeros(n_groups), where=bases > 0)
+
+    def summary(self, thresholds=DEFAULT_THRESHOLDS):
+        """Par contig puis total : longueur, moyenne et fraction des bases >= N×."""
+        rows = []
+        total_hist = np.zeros(1, dtype=np.float64)
+        total_length = 0
+        for contig in self.contigs:
+            length = self.length(contig)
+            hist = self.histogram(contig).astype(np.float64)
+            rows.append(self._summary_row(contig, length, hist, thresholds))
+            if len(hist) > len(total_hist):
+                total_hist = np.pad(total_hist, (0, len(hist) - len(total_hist)))
+            total_hist[:len(hist)] += hist
+            total_length += length
+        rows.append(self._summary_row("total", total_length, total_hist, thresholds))
+        return rows
+
+    @staticmethod
+    def _summary_row(contig, length, hist, thresholds):
+        depth_sum = float((np.arange(len(hist)) * hist).sum())
+        row = {"contig": contig, "length": length, "mean": depth_sum / length if length else 0.0}
+        for n in thresholds:
+            row[f"pct_{n}x"] = 100.0 * float(hist[n:].sum()) / length if length else 0.0
+        return row
+
+    def interval_stats(self, regions, thresholds=DEFAULT_THRESHOLDS):
+        """Moyenne et % estimé de bases >= N× pour chaque intervalle (contig, début, fin, ...).
+
+        Calcul vectorisé par contig à partir des sommes cumulées des bins.
+        """
+        results = [None] * len(regions)
+        by_contig = {}
+        for i, region in enumerate(regions):
+            by_contig.setdefault(region[0], []).append(i)
+
+        for contig, indices in by_contig.items():
+            starts = np.array([regions[i][1] for i in indices], dtype=np.int64)
+            ends = np.array([regions[i][2] for i in indices], dtype=np.int64)
+            if contig not in self._contigs:
+                columns = {"mean": np.full(len(indices), np.nan)}
+                columns.update({n: np.full(len(indices), np.nan) for n in thresholds})
+            else:
+                length = self.length(contig)
+                starts = np.clip(starts, 0, length)
+                ends = np.clip(ends, starts, length)
+                values = np.asarray(self.bins(contig), dtype=np.float64)
+                widths = self._bin_widths(length, 0, len(values))
+                span = np.maximum(ends - starts, 1)
+                columns = {"mean": self._integrate(values, widths, starts, ends) / span}
+                for n in thresholds:
+                    covered = self._integrate((values >= n).astype(np.float64), widths, starts, ends)
+                    columns[n] = 100.0 * covered / span
+            for j, i in enumerate(indices):
+                row = {"contig": contig, "start": int(regions[i][1]), "end": int(regions[i][2]),
+                       "mean": float(columns["mean"][j])}
+                for n in thresholds:
+                    row[f"pct_{n}x"] = float(columns[n][j])
+                results[i] = row
+        return results
+
+    def _integrate(self, values, widths, starts, ends):
+        """Somme de `values` (constantes par bin) sur chaque [start, end)."""
+        cumulative = np.concatenate([[0.0], np.cumsum(values * widths), [0.0]])
+        padded = np.concatenate([values, [0.0]])
+
+        def at(pos):
+            idx = pos // self.bin_size
+            return cumulative[idx] + padded[idx] * (pos - idx * self.bin_size)
+
+        return at(ends) - at(starts)
+
+
+def build_from_mosdepth(prefix, out_path, sample=None):
+    """Construit un store à partir de `mosdepth --by BIN` (repli si qc_engine échoue).
+
+    Les histogrammes sont reconstitués à partir des moyennes par bin (approximatifs).
+    """
+    contigs = []
+    current = None
+    with gzip.open(f"{prefix}.regions.bed.gz", "rt") as f:
+        for line in f:
+            chrom, start, end, mean = line.split("\t")[:4]
+            if current is None or current[0] != chrom:
+                current = [chrom, 0, [], []]
+                contigs.append(current)
+            current[1] = int(end)
+            current[2].append(int(end) - int(start))
+            current[3].append(float(mean))
+
+    bin_size = max((max(c[2]) for c in contigs), default=1)
+    with CoverageStoreWriter(out_path, bin_size, sample, exact_hist=False) as writer:
+        for chrom, length, widths, means in contigs:
+            means = np.array(means, dtype=np.float32)
+            hist = np.bincount(np.rint(means).astype(np.int64), weights=widths).astype(np.uint64)
+            writer.add_contig(chrom, length, means, hist)
+
+
+def _read_bed(path):
+    regions = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            regions.append((fields[0], int(fields[1]), int(fields[2])))
+    return regions
+
+
+def _parse_region(text):
+    contig, _, span = text.partition(":")
+    if not span:
+        return contig, 0, None
+    start, _, end = span.replace(",", "").partition("-")
+    return contig, int(start) - 1, int(end) if end else None
+
+
+def _print_rows(rows, columns):
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join(f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c]) for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fichier de couverture par bins (qc/coverage.cov)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_summary = sub.add_parser("summary", help="Moyenne et %% >= N× par contig")
+    p_summary.add_argument("store")
+    p_summary.add_argument("--thresholds", default="1,10,20,30")
+
+    p_query = sub.add_parser("query", help="Profondeur moyenne d'une région (chr:début-fin, 1-based)")
+    p_query.add_argument("store")
+    p_query.add_argument("region")
+
+    p_regions = sub.add_parser("regions", help="Statistiques par intervalle d'un BED")
+    p_regions.add_argument("store")
+    p_regions.add_argument("bed")
+    p_regions.add_argument("--thresholds", default="1,10,20,30")
+
+    p_build = sub.add_parser("build-mosdepth", help="Conversion de la sortie mosdepth --by")
+    p_build.add_argument("--prefix", required=True)
+    p_build.add_argument("--out", required=True)
+    p_build.add_argument("--sample")
+    args = parser.parse_args(argv)
+
+    if args.command == "build-mosdepth":
+        build_from_mosdepth(args.prefix, args.out, args.sample)
+        return 0
+
+    store = CoverageStore(args.store)
+    if args.command == "query":
+        contig, start, end = _parse_region(args.region)
+        print(f"{store.mean(contig, start, end):.2f}")
+        return 0
+
+    thresholds = [int(t) for t in args.thresholds.split(",") if t]
+    columns = [f"pct_{n}x" for n in thresholds]
+    if args.command == "summary":
+        _print_rows(store.summary(thresholds), ["contig", "length", "mean"] + columns)
+    else:
+        _print_rows(store.interval_stats(_read_bed(args.bed), thresholds),
+                    ["contig", "start", "end", "mean"] + columns)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
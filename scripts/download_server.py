@@ -0,0 +1,173 @@
+"""Téléchargement en flux des fichiers de résultats (BAM, VCF, PDF, logs).
+
+st.download_button charge tout le fichier en mémoire dans le serveur
+Streamlit. Ce module démarre à la place un petit serveur HTTP à côté de
+l'interface : un fichier n'est exposé qu'après enregistrement explicite
+(jeton aléatoire à durée limitée) puis envoyé par blocs avec sendfile,
+avec une mémoire bornée quelle que soit sa taille. Les requêtes Range sont
+acceptées, ce qui permet de reprendre un téléchargement interrompu.
+
+Le serveur n'écoute que sur la boucle locale (127.0.0.1), sur un port libre :
+les résultats (BAM, VCF de patients) ne sont jamais servis en HTTP sur toutes
+les interfaces du nœud, hors de l'authentification de l'interface. Pour un
+accès distant, un proxy authentifié (ex. Open OnDemand) relaie un port fixe et
+son URL est donnée par PIPELINE_DOWNLOAD_URL. L'interface ne sert des liens
+qu'avec cette URL (le navigateur ne joint pas le 127.0.0.1 du nœud) et garde
+sinon st.download_button ; un lien est réémis après TOKEN_TTL.
+
+Variables d'environnement :
+    PIPELINE_DOWNLOAD_PORT : port d'écoute (défaut 0 = port libre)
+    PIPELINE_DOWNLOAD_URL  : URL publique du serveur derrière un proxy
+"""
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_SIZE = 1024 * 1024
+TOKEN_TTL = 6 * 3600
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class _DownloadHandler(BaseHTTPRequestHandler):
+    server_version = "PipelineDownload/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        parts = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "dl":
+            self.send_error(404)
+            return
+        path = self.server.registry.resolve(parts[1])
+        if path is None:
+            self.send_error(404, "Lien expiré ou inconnu")
+            return
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            status = 200
+            range_header = self.headers.get("Range")
+            if range_header:
+                match = _RANGE_RE.match(range_header.strip())
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        if match.group(2):
+                            end = min(int(match.group(2)), size - 1)
+                    else:
+                        start = max(0, size - int(match.group(2)))
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.end_headers()
+                        return
+                    status = 206
+
+            length = end - start + 1 if size else 0
+            filename = os.path.basename(path)
+            self.send_response(status)
+            self.send_header("Content-Type", mimetypes.guess_type(filename)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header(
+                "Content-Disposition",
+                f"attachment; filename*=UTF-8''{urllib.parse.quote(filename)}",
+            )
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            if send_body and length:
+                self.wfile.flush()
+                self._send_range(f, start, length)
+
+    def _send_range(self, f, start, length):
+        """Envoie `length` octets depuis `start` par blocs (sendfile si disponible)."""
+        try:
+            self.connection.sendfile(f, offset=start, count=length)
+        except (AttributeError, OSError, ValueError):
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class _Registry:
+    """Jetons de téléchargement -> (chemin, expiration)."""
+
+    def __init__(self, allowed_roots):
+        self.allowed_roots = [os.path.realpath(root) for root in allowed_roots]
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def register(self, path, ttl=TOKEN_TTL):
+        real_path = os.path.realpath(path)
+        if not any(real_path == root or real_path.startswith(root + os.sep) for root in self.allowed_roots):
+            raise ValueError(f"Fichier hors des dossiers autorisés : {path}")
+        if not os.path.isfile(real_path):
+            raise FileNotFoundError(path)
+        token = secrets.token_urlsafe(24)
+        now = time.time()
+        with self._lock:
+            self._tokens = {t: v for t, v in self._tokens.items() if v[1] > now}
+            self._tokens[token] = (real_path, now + ttl)
+        return token
+
+    def resolve(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+
+class DownloadServer:
+    """Serveur HTTP en tâche de fond, partagé par toutes les sessions de l'interface."""
+
+    def __init__(self, allowed_roots=("results", "logs"), host="127.0.0.1", port=None, public_url=None):
+        if port is None:
+            port = int(os.environ.get("PIPELINE_DOWNLOAD_PORT", "0"))
+        self.registry = _Registry(allowed_roots)
+        self.httpd = ThreadingHTTPServer((host, port), _DownloadHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = self.registry
+        self.port = self.httpd.server_address[1]
+        # URL externe seulement si elle est configurée explicitement (proxy)
+        self.public_url = (public_url or os.environ.get("PIPELINE_DOWNLOAD_URL")
+                           or f"http://{host}:{self.port}").rstrip("/")
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="pipeline-download")
+        self._thread.start()
+
+    def link_for(self, path, ttl=TOKEN_TTL):
+        """Enregistre `path` et retourne l'URL de téléchargement en flux."""
+        token = self.registry.register(path, ttl)
+        filename = urllib.parse.quote(os.path.basename(path))
+        return f"{self.public_url}/dl/{token}/{filename}"
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
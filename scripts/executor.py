@@ -0,0 +1,602 @@
+"""Exécution des scripts sbatch/ par un pool de processus local, à la place de SLURM.
+
+run_pipeline.sh --executor local remplace chaque appel à sbatch par
+`python3 -m scripts.executor submit` : mêmes options (lignes #SBATCH du script
+puis ligne de commande), même sortie "Submitted batch job N", mêmes journaux
+(--output avec %j, %A, %a). Les jobs sont enregistrés dans une base SQLite
+(.cache/executor/jobs.sqlite) et lancés par un démon local, démarré à la
+première soumission et arrêté après IDLE_EXIT_S sans job :
+
+- budgets : un job ne démarre que si ses CPUs (--cpus-per-task) et sa mémoire
+  (--mem) tiennent dans ce qui reste du budget de la machine
+  (PIPELINE_LOCAL_CPUS, PIPELINE_LOCAL_MEM_GB ; par défaut tous les CPUs et
+  90 % de la mémoire). Une demande plus grande que le budget est ramenée au
+  budget. Au-delà de --mem (RSS cumulée des processus du job) le job est tué
+  en OUT_OF_MEMORY, au-delà de --time en TIMEOUT ;
+- dépendances : afterok, afternotok, afterany, after et aftercorr, séparées
+  par "," (toutes) ou "?" (une seule), --kill-on-invalid-dep ;
+- job arrays : --array=1-N%K, SLURM_ARRAY_TASK_ID et SLURM_ARRAY_JOB_ID.
+
+Les identifiants locaux commencent à LOCAL_ID_BASE, au-delà du plus grand
+identifiant SLURM possible : telemetry.py et sample_sheet.py lisent l'état et la
+consommation des jobs locaux avec `sacct_rows` au lieu de sacct.
+
+Usage :
+    python3 -m scripts.executor submit [options sbatch] script.sbatch args...
+    python3 -m scripts.executor queue            # jobs en attente / en cours (comme squeue)
+    python3 -m scripts.executor sacct 100000001  # JobID|State|ExitCode|Elapsed|... (comme sacct -P)
+    python3 -m scripts.executor cancel 100000001
+    python3 -m scripts.executor info             # budgets CPU / mémoire
+"""
+import argparse
+import fcntl
+import json
+import os
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+from scripts.resource_model import format_time, parse_time
+
+EXECUTOR_DIR = os.path.join(os.environ.get("PIPELINE_CACHE_DIR", ".cache"), "executor")
+DB_PATH = os.path.join(EXECUTOR_DIR, "jobs.sqlite")
+
+# MaxJobId SLURM <= 67 043 328 : pas de collision avec les jobs du cluster
+LOCAL_ID_BASE = 100_000_000
+
+POLL_S = 2
+IDLE_EXIT_S = 300
+KILL_GRACE_S = 30
+
+TERMINAL_STATES = {"COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    array_job_id INTEGER,
+    array_task_id INTEGER,
+    array_limit INTEGER,
+    name TEXT,
+    workdir TEXT,
+    command TEXT,
+    env TEXT,
+    output TEXT,
+    error TEXT,
+    cpus INTEGER,
+    mem_mb INTEGER,
+    time_s INTEGER,
+    dependency TEXT,
+    kill_on_invalid INTEGER,
+    state TEXT,
+    reason TEXT,
+    exit_code TEXT,
+    pid INTEGER,
+    submitted_at REAL,
+    started_at REAL,
+    ended_at REAL,
+    cpu_s REAL,
+    max_rss_kb INTEGER
+)
+"""
+
+# Options sbatch comprises (les autres, --partition, --export..., sont sans objet en local)
+_SHORT_OPTIONS = {"-c": "cpus-per-task", "-o": "output", "-e": "error", "-J": "job-name",
+                  "-t": "time", "-d": "dependency", "-a": "array", "-p": "partition"}
+_VALUE_OPTIONS = {"cpus-per-task", "mem", "time", "output", "error", "job-name", "dependency",
+                  "array", "partition", "export", "wrap", "kill-on-invalid-dep", "nodes", "ntasks"}
+
+
+class SubmitError(ValueError):
+    pass
+
+
+def connect(db_path=DB_PATH):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    conn.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'jobs', ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'jobs')",
+        (LOCAL_ID_BASE,),
+    )
+    conn.commit()
+    return conn
+
+
+def is_local_job(job_id):
+    """Vrai pour un identifiant du pool local ("N", "N_i" ou "N_[...]")."""
+    match = re.match(r"^(\d+)", str(job_id))
+    return bool(match) and int(match.group(1)) > LOCAL_ID_BASE
+
+
+def budget():
+    """(CPUs, mémoire en Mo) disponibles pour le pool local."""
+    cpus = int(os.environ.get("PIPELINE_LOCAL_CPUS") or os.cpu_count() or 1)
+    if os.environ.get("PIPELINE_LOCAL_MEM_GB"):
+        return cpus, int(float(os.environ["PIPELINE_LOCAL_MEM_GB"]) * 1024)
+    mem_kb = 0
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    mem_kb = int(line.split()[1])
+    except OSError:
+        pass
+    return cpus, int(mem_kb * 0.9 / 1024) or 4096
+
+
+# --- Soumission ----------------------------------------------------------------
+
+def parse_mem(value):
+    """Mémoire sbatch (4000, 500M, 64G, 1T) -> Mo."""
+    match = re.match(r"^(\d+(?:\.\d+)?)([KMGT]?)B?$", value.strip().upper())
+    if not match:
+        raise SubmitError(f"--mem invalide : {value}")
+    factor = {"K": 1 / 1024, "M": 1, "": 1, "G": 1024, "T": 1024 ** 2}[match.group(2)]
+    return max(1, int(float(match.group(1)) * factor))
+
+
+def parse_array(spec):
+    """"1-4%2" -> ([1, 2, 3, 4], 2) ; "1,3,5" -> ([1, 3, 5], None)."""
+    spec, _, limit = spec.partition("%")
+    indices = []
+    for part in spec.split(","):
+        start, _, end = part.partition("-")
+        indices.extend(range(int(start), int(end or start) + 1))
+    return indices, int(limit) if limit else None
+
+
+def parse_options(args):
+    """Sépare les options sbatch ({nom: valeur}) du script et de ses arguments."""
+    options = {}
+    i = 0
+    while i < len(args) and args[i].startswith("-"):
+        arg = args[i]
+        if arg.startswith("--"):
+            name, sep, value = arg[2:].partition("=")
+            if not sep and name in _VALUE_OPTIONS and name != "kill-on-invalid-dep":
+                i += 1
+                value = args[i] if i < len(args) else ""
+        elif arg[:2] in _SHORT_OPTIONS:
+            name, value = _SHORT_OPTIONS[arg[:2]], arg[2:]
+            if not value:
+                i += 1
+                value = args[i] if i < len(args) else ""
+        else:
+            raise SubmitError(f"option sbatch non reconnue : {arg}")
+        options[name] = value or "yes"
+        i += 1
+    return options, args[i:]
+
+
+def script_directives(path):
+    """Options des lignes #SBATCH en tête du script."""
+    directives = []
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("#SBATCH"):
+                    directives.extend(line[len("#SBATCH"):].split())
+                elif line and not line.startswith("#"):
+                    break
+    except OSError:
+        pass
+    return parse_options(directives)[0]
+
+
+def _dependency_ids(spec):
+    return {job for cond in re.split(r"[,?]", spec) for job in cond.split(":")[1:] if job}
+
+
+def _known_job(conn, job):
+    base, _, index = job.partition("_")
+    if index:
+        query, params = "SELECT 1 FROM jobs WHERE array_job_id = ? AND array_task_id = ?", (base, index)
+    else:
+        query, params = "SELECT 1 FROM jobs WHERE job_id = ? OR array_job_id = ?", (base, base)
+    return conn.execute(query, params).fetchone() is not None
+
+
+def submit(args, env=None, workdir=None):
+    """Enregistre un job (ou un job array) et retourne son identifiant."""
+    env = dict(os.environ if env is None else env)
+    workdir = workdir or os.getcwd()
+    options, command = parse_options(args)
+    if "wrap" in options:
+        command = ["bash", "-c", options["wrap"]]
+        name = options.get("job-name", "wrap")
+    else:
+        if not command:
+            raise SubmitError("aucun script à exécuter")
+        options = {**script_directives(os.path.join(workdir, command[0])), **options}
+        command = ["bash", *command]
+        name = options.get("job-name", os.path.basename(command[1]))
+
+    cpus = int(options.get("cpus-per-task", 1))
+    mem_mb = parse_mem(options["mem"]) if "mem" in options else 4096
+    time_s = parse_time(options["time"]) if options.get("time", "UNLIMITED") != "UNLIMITED" else None
+    dependency = options.get("dependency", "")
+    indices, limit = parse_array(options["array"]) if "array" in options else ([None], None)
+
+    with closing(connect()) as conn:
+        unknown = [job for job in _dependency_ids(dependency) if not _known_job(conn, job)]
+        if unknown:
+            raise SubmitError(f"Job dependency problem (jobs inconnus du pool local : {', '.join(unknown)})")
+        array_id = None
+        for index in indices:
+            cursor = conn.execute(
+                "INSERT INTO jobs (array_job_id, array_task_id, array_limit, name, workdir, command, env, output, "
+                "error, cpus, mem_mb, time_s, dependency, kill_on_invalid, state, reason, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'PENDING', 'None', ?)",
+                (array_id, index, limit, name, workdir, json.dumps(command), json.dumps(env),
+                 options.get("output", "slurm-%A_%a.out" if index is not None else "slurm-%j.out"),
+                 options.get("error"), cpus, mem_mb, time_s, dependency,
+                 int(options.get("kill-on-invalid-dep", "no") == "yes"), time.time()),
+            )
+            if index is not None and array_id is None:
+                array_id = cursor.lastrowid
+                conn.execute("UPDATE jobs SET array_job_id = ? WHERE job_id = ?", (array_id, array_id))
+            job_id = array_id or cursor.lastrowid
+        conn.commit()
+    ensure_daemon()
+    return job_id
+
+
+def ensure_daemon():
+    """Lance le démon en arrière-plan (il s'arrête aussitôt si un autre tourne déjà)."""
+    os.makedirs(EXECUTOR_DIR, exist_ok=True)
+    pipeline_dir = os.environ.get("PIPELINE_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": pipeline_dir, "PIPELINE_CACHE_DIR": os.path.dirname(EXECUTOR_DIR)}
+    with open(os.path.join(EXECUTOR_DIR, "daemon.log"), "a") as log:
+        subprocess.Popen([sys.executable, "-m", "scripts.executor", "daemon"], env=env,
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+
+
+def cancel(job_ids):
+    """Annule des jobs (tous les éléments d'un array pour un identifiant d'array)."""
+    with closing(connect()) as conn:
+        for job in job_ids:
+            base, _, index = job.partition("_")
+            if index:
+                rows = conn.execute("SELECT * FROM jobs WHERE array_job_id = ? AND array_task_id = ?", (base, index))
+            else:
+                rows = conn.execute("SELECT * FROM jobs WHERE job_id = ? OR array_job_id = ?", (base, base))
+            for row in rows.fetchall():
+                if row["state"] in TERMINAL_STATES:
+                    continue
+                if row["state"] == "RUNNING" and row["pid"]:
+                    _kill(row["pid"], signal.SIGTERM)
+                conn.execute("UPDATE jobs SET state = 'CANCELLED', reason = 'None', ended_at = ? WHERE job_id = ?",
+                             (time.time(), row["job_id"]))
+        conn.commit()
+
+
+# --- Ordonnancement ----------------------------------------------------------------
+
+def _targets(conn, job, row, correlated):
+    base, _, index = job.partition("_")
+    if index:
+        return conn.execute("SELECT state FROM jobs WHERE array_job_id = ? AND array_task_id = ?",
+                            (base, index)).fetchall()
+    if correlated and row["array_task_id"] is not None:
+        tasks = conn.execute("SELECT state FROM jobs WHERE array_job_id = ? AND array_task_id = ?",
+                             (base, row["array_task_id"])).fetchall()
+        if tasks:
+            return tasks
+    return conn.execute("SELECT state FROM jobs WHERE job_id = ? OR array_job_id = ?", (base, base)).fetchall()
+
+
+def _condition_status(conn, row, condition):
+    kind, *jobs = condition.split(":")
+    states = [t["state"] for job in jobs for t in _targets(conn, job, row, kind == "aftercorr")]
+    done = all(s in TERMINAL_STATES for s in states)
+    if kind in ("afterok", "aftercorr"):
+        if any(s in TERMINAL_STATES and s != "COMPLETED" for s in states):
+            return "never"
+        return "ok" if done else "wait"
+    if kind == "afternotok":
+        if not done:
+            return "wait"
+        return "ok" if any(s != "COMPLETED" for s in states) else "never"
+    if kind == "afterany":
+        return "ok" if done else "wait"
+    if kind == "after":
+        return "ok" if all(s != "PENDING" for s in states) else "wait"
+    return "ok"
+
+
+def dependency_status(conn, row):
+    """"ok", "wait" ou "never" pour les dépendances d'un job en attente."""
+    spec = row["dependency"]
+    if not spec:
+        return "ok"
+    if "?" in spec:
+        verdicts = [_condition_status(conn, row, c) for c in spec.split("?")]
+        if "ok" in verdicts:
+            return "ok"
+        return "never" if all(v == "never" for v in verdicts) else "wait"
+    verdicts = [_condition_status(conn, row, c) for c in spec.split(",")]
+    if "never" in verdicts:
+        return "never"
+    return "ok" if all(v == "ok" for v in verdicts) else "wait"
+
+
+def _output_path(pattern, row):
+    array_id = row["array_job_id"] or row["job_id"]
+    path = (pattern.replace("%A", str(array_id)).replace("%a", str(row["array_task_id"] or 0))
+            .replace("%j", str(row["job_id"])).replace("%x", row["name"]).replace("%u", os.environ.get("USER", "")))
+    return os.path.join(row["workdir"], path)
+
+
+def _start(conn, row, cpus, mem_mb):
+    env = json.loads(row["env"])
+    env.update({
+        "SLURM_JOB_ID": str(row["job_id"]), "SLURM_JOBID": str(row["job_id"]),
+        "SLURM_JOB_NAME": row["name"], "SLURM_SUBMIT_DIR": row["workdir"],
+        "SLURM_CPUS_PER_TASK": str(cpus), "SLURM_CPUS_ON_NODE": str(cpus),
+        "SLURM_MEM_PER_NODE": str(mem_mb),
+    })
+    if row["array_task_id"] is not None:
+        env["SLURM_ARRAY_JOB_ID"] = str(row["array_job_id"])
+        env["SLURM_ARRAY_TASK_ID"] = str(row["array_task_id"])
+    try:
+        stdout = open(_output_path(row["output"], row), "a")
+        stderr = open(_output_path(row["error"], row), "a") if row["error"] else subprocess.STDOUT
+        process = subprocess.Popen(json.loads(row["command"]), cwd=row["workdir"], env=env,
+                                   stdin=subprocess.DEVNULL, stdout=stdout, stderr=stderr,
+                                   start_new_session=True)
+    except OSError as e:
+        conn.execute("UPDATE jobs SET state = 'FAILED', reason = ?, exit_code = '1:0', started_at = ?, ended_at = ? "
+                     "WHERE job_id = ?", (str(e), time.time(), time.time(), row["job_id"]))
+        return None
+    conn.execute("UPDATE jobs SET state = 'RUNNING', reason = 'None', pid = ?, cpus = ?, mem_mb = ?, started_at = ? "
+                 "WHERE job_id = ?", (process.pid, cpus, mem_mb, time.time(), row["job_id"]))
+    return process
+
+
+def _kill(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except OSError:
+        pass
+
+
+def session_rss_kb():
+    """{session: RSS cumulée en Ko} d'après /proc (un job = une session)."""
+    page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    totals = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                session = int(f.read().rsplit(")", 1)[1].split()[3])
+            with open(f"/proc/{entry}/statm") as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        totals[session] = totals.get(session, 0) + rss_pages * page_kb
+    return totals
+
+
+def schedule(conn, running):
+    """Un passage : relève les jobs finis, applique les limites, démarre ce qui tient dans le budget."""
+    now = time.time()
+    rss = session_rss_kb()
+    for job_id, job in list(running.items()):
+        job["peak_kb"] = max(job["peak_kb"], rss.get(job["process"].pid, 0))
+        pid, status, usage = os.wait4(job["process"].pid, os.WNOHANG)
+        if pid == 0:
+            limit = None
+            if job["peak_kb"] > job["mem_mb"] * 1024:
+                limit = "OUT_OF_MEMORY"
+            elif job["time_s"] and now - job["started"] > job["time_s"]:
+                limit = "TIMEOUT"
+            if limit and not job["killed"]:
+                job["killed"] = (limit, now)
+                _kill(job["process"].pid, signal.SIGTERM)
+            elif job["killed"] and now - job["killed"][1] > KILL_GRACE_S:
+                _kill(job["process"].pid, signal.SIGKILL)
+            continue
+        job["process"].returncode = status
+        code = os.waitstatus_to_exitcode(status)
+        state = conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()["state"]
+        if state != "CANCELLED":
+            state = job["killed"][0] if job["killed"] else ("COMPLETED" if code == 0 else "FAILED")
+        exit_code = f"{code}:0" if code >= 0 else f"0:{-code}"
+        conn.execute("UPDATE jobs SET state = ?, exit_code = ?, ended_at = ?, cpu_s = ?, max_rss_kb = ? "
+                     "WHERE job_id = ?",
+                     (state, exit_code, now, usage.ru_utime + usage.ru_stime,
+                      max(job["peak_kb"], usage.ru_maxrss), job_id))
+        del running[job_id]
+
+    total_cpus, total_mem = budget()
+    free_cpus = total_cpus - sum(j["cpus"] for j in running.values())
+    free_mem = total_mem - sum(j["mem_mb"] for j in running.values())
+    active_tasks = {}
+    for row in conn.execute("SELECT array_job_id FROM jobs WHERE state = 'RUNNING' AND array_job_id IS NOT NULL"):
+        active_tasks[row["array_job_id"]] = active_tasks.get(row["array_job_id"], 0) + 1
+
+    for row in conn.execute("SELECT * FROM jobs WHERE state = 'PENDING' ORDER BY job_id").fetchall():
+        verdict = dependency_status(conn, row)
+        if verdict == "never":
+            if row["kill_on_invalid"]:
+                conn.execute("UPDATE jobs SET state = 'CANCELLED', reason = 'DependencyNeverSatisfied', ended_at = ? "
+                             "WHERE job_id = ?", (now, row["job_id"]))
+            else:
+                conn.execute("UPDATE jobs SET reason = 'DependencyNeverSatisfied' WHERE job_id = ?", (row["job_id"],))
+            continue
+        if verdict == "wait":
+            conn.execute("UPDATE jobs SET reason = 'Dependency' WHERE job_id = ?", (row["job_id"],))
+            continue
+        if row["array_limit"] and active_tasks.get(row["array_job_id"], 0) >= row["array_limit"]:
+            conn.execute("UPDATE jobs SET reason = 'JobArrayTaskLimit' WHERE job_id = ?", (row["job_id"],))
+            continue
+        cpus, mem_mb = min(row["cpus"], total_cpus), min(row["mem_mb"], total_mem)
+        if cpus > free_cpus or mem_mb > free_mem:
+            conn.execute("UPDATE jobs SET reason = 'Resources' WHERE job_id = ?", (row["job_id"],))
+            continue
+        process = _start(conn, row, cpus, mem_mb)
+        if process is None:
+            continue
+        running[row["job_id"]] = {"process": process, "cpus": cpus, "mem_mb": mem_mb, "time_s": row["time_s"],
+                                  "started": now, "peak_kb": 0, "killed": None}
+        free_cpus -= cpus
+        free_mem -= mem_mb
+        if row["array_job_id"] is not None:
+            active_tasks[row["array_job_id"]] = active_tasks.get(row["array_job_id"], 0) + 1
+    conn.commit()
+
+
+def serve():
+    """Boucle du démon ; un seul démon par dossier (verrou sur daemon.lock)."""
+    os.makedirs(EXECUTOR_DIR, exist_ok=True)
+    lock = open(os.path.join(EXECUTOR_DIR, "daemon.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return 0
+    running = {}
+    with closing(connect()) as conn:
+        # Jobs orphelins d'un démon précédent (arrêté pendant leur exécution)
+        for row in conn.execute("SELECT job_id, pid FROM jobs WHERE state = 'RUNNING'").fetchall():
+            _kill(row["pid"], signal.SIGKILL)
+            conn.execute("UPDATE jobs SET state = 'NODE_FAIL', ended_at = ? WHERE job_id = ?", (time.time(), row[0]))
+        conn.commit()
+        idle_since = time.time()
+        while True:
+            schedule(conn, running)
+            active = conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('PENDING', 'RUNNING')").fetchone()[0]
+            if active:
+                idle_since = time.time()
+            elif time.time() - idle_since > IDLE_EXIT_S:
+                return 0
+            time.sleep(POLL_S)
+
+
+# --- Suivi (équivalents squeue / sacct) ----------------------------------------------
+
+def display_id(row):
+    if row["array_task_id"] is not None:
+        return f"{row['array_job_id']}_{row['array_task_id']}"
+    return str(row["job_id"])
+
+
+def queue_rows(include_done_since=None):
+    """Jobs en attente ou en cours (et terminés depuis include_done_since), pour l'interface."""
+    if not os.path.exists(DB_PATH):
+        return []
+    query = "SELECT * FROM jobs WHERE state IN ('PENDING', 'RUNNING')"
+    params = []
+    if include_done_since is not None:
+        query += " OR ended_at >= ?"
+        params.append(include_done_since)
+    now = time.time()
+    with closing(connect()) as conn:
+        rows = conn.execute(query + " ORDER BY job_id", params).fetchall()
+    return [{
+        "job_id": display_id(row),
+        "name": row["name"],
+        "state": row["state"],
+        "time": format_time((row["ended_at"] or now) - row["started_at"]) if row["started_at"] else "0-00:00:00",
+        "cpus": row["cpus"],
+        "mem": f"{row['mem_mb'] / 1024:.0f}G" if row["mem_mb"] >= 1024 else f"{row['mem_mb']}M",
+        "reason": row["reason"] if row["state"] == "PENDING" else "",
+    } for row in rows]
+
+
+def _sacct_duration(seconds):
+    if seconds is None:
+        return ""
+    days, rest = divmod(int(seconds), 86400)
+    hms = f"{rest // 3600:02d}:{rest % 3600 // 60:02d}:{rest % 60:02d}"
+    return f"{days}-{hms}" if days else hms
+
+
+def _sacct_date(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp)) if timestamp else "Unknown"
+
+
+def sacct_rows(job_ids):
+    """Lignes au format de `sacct -P --noconvert` (champs de telemetry.SACCT_FIELDS) des jobs locaux."""
+    if not job_ids or not os.path.exists(DB_PATH):
+        return []
+    now = time.time()
+    rows = []
+    with closing(connect()) as conn:
+        for job in job_ids:
+            base = re.match(r"^(\d+)", job).group(1)
+            for row in conn.execute("SELECT * FROM jobs WHERE job_id = ? OR array_job_id = ? ORDER BY job_id",
+                                    (base, base)).fetchall():
+                end = row["ended_at"] or (now if row["started_at"] else None)
+                rows.append({
+                    "JobID": display_id(row),
+                    "State": row["state"],
+                    "ExitCode": row["exit_code"] or "0:0",
+                    "Elapsed": _sacct_duration(end - row["started_at"] if row["started_at"] else 0),
+                    "TotalCPU": _sacct_duration(row["cpu_s"] or 0),
+                    "MaxRSS": f"{row['max_rss_kb']}K" if row["max_rss_kb"] else "",
+                    "AllocCPUS": str(row["cpus"] if row["started_at"] else 0),
+                    "ReqMem": f"{row['mem_mb']}M",
+                    "Timelimit": _sacct_duration(row["time_s"]) if row["time_s"] else "UNLIMITED",
+                    "Start": _sacct_date(row["started_at"]),
+                    "End": _sacct_date(row["ended_at"]),
+                })
+    return rows
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Les options sbatch (--mem=..., --array=...) sont passées telles quelles, hors argparse
+    if argv[:1] == ["submit"] and argv[1:2] not in (["-h"], ["--help"]):
+        try:
+            job_id = submit(argv[1:])
+        except (OSError, ValueError) as e:
+            print(f"sbatch: error: Batch job submission failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Submitted batch job {job_id}")
+        return 0
+
+    parser = argparse.ArgumentParser(description="Exécution locale des scripts sbatch du pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_submit = sub.add_parser("submit", help="Soumet un job (options sbatch) ; affiche son identifiant")
+    p_submit.add_argument("sbatch_args", nargs="*", metavar="[options sbatch] script args")
+    sub.add_parser("queue", help="Jobs en attente ou en cours")
+    p_sacct = sub.add_parser("sacct", help="État et consommation de jobs (format sacct -P)")
+    p_sacct.add_argument("job_ids", nargs="+")
+    p_cancel = sub.add_parser("cancel", help="Annule des jobs")
+    p_cancel.add_argument("job_ids", nargs="+")
+    sub.add_parser("info", help="Budgets CPU / mémoire du pool local")
+    sub.add_parser("daemon", help="Boucle d'ordonnancement (lancée par submit)")
+    args = parser.parse_args(argv)
+
+    if args.command == "queue":
+        print(f"{'JOBID':>14} {'NAME':<20} {'STATE':<10} {'TIME':>12} {'CPUS':>5} {'MEM':>6}  REASON")
+        for row in queue_rows():
+            print(f"{row['job_id']:>14} {row['name'][:20]:<20} {row['state']:<10} {row['time']:>12} "
+                  f"{row['cpus']:>5} {row['mem']:>6}  {row['reason']}")
+        return 0
+    if args.command == "sacct":
+        job_ids = [j for arg in args.job_ids for j in arg.split(",") if j]
+        for row in sacct_rows(job_ids):
+            print("|".join(row.values()))
+        return 0
+    if args.command == "cancel":
+        cancel(args.job_ids)
+        return 0
+    if args.command == "info":
+        cpus, mem_mb = budget()
+        print(f"{cpus} CPUs, {mem_mb / 1024:.0f} Go")
+        return 0
+    return serve()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
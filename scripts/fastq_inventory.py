@@ -0,0 +1,192 @@
+"""Inventaire en cache des FASTQ d'entrée (arborescence MinKNOW fastq_pass).
+
+L'arborescence est parcourue avec results_index.scan_tree : seuls les dossiers
+dont le mtime a changé sont relistés. Chaque FASTQ est décrit par sa taille,
+sa compression et son groupe de barcode. Le nombre de lectures et de bases
+n'est calculé qu'à la demande, puis conservé tant que le fichier ne change pas.
+"""
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+from scripts.results_index import CACHE_DIR, scan_tree
+
+INVENTORY_VERSION = 1
+
+FASTQ_EXTENSIONS = (".fastq", ".fq", ".fastq.gz", ".fq.gz")
+
+# Délai minimal entre deux parcours d'un même dossier (secondes)
+MIN_REFRESH_INTERVAL = 10.0
+
+_BARCODE_RE = re.compile(r"^(barcode\d+|unclassified)$", re.IGNORECASE)
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+def _cache_path(base_path, kind):
+    key = hashlib.sha1(os.path.abspath(base_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "fastq_inventory", f"{key}.{kind}.json")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") == INVENTORY_VERSION:
+            return data
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def compression_of(name):
+    return "gzip" if name.endswith(".gz") else "aucune"
+
+
+def barcode_of(rel_path):
+    """Groupe de barcode déduit du chemin (dossier barcodeNN/unclassified, sinon nom de fichier)."""
+    parts = rel_path.split(os.sep)
+    for part in reversed(parts[:-1]):
+        if _BARCODE_RE.match(part):
+            return part.lower()
+    match = re.search(r"(barcode\d+|unclassified)", parts[-1], re.IGNORECASE)
+    return match.group(1).lower() if match else "-"
+
+
+def _build_files(tree):
+    files = {}
+    for rel, entry in tree.items():
+        for name, (size, mtime) in entry["files"].items():
+            if not name.endswith(FASTQ_EXTENSIONS):
+                continue
+            rel_path = os.path.join(rel, name) if rel else name
+            files[rel_path] = {
+                "size": size,
+                "mtime": mtime,
+                "compression": compression_of(name),
+                "barcode": barcode_of(rel_path),
+            }
+    return files
+
+
+def load_inventory(base_path, force=False):
+    """Retourne l'inventaire à jour de `base_path` (mémoire, puis disque, puis scan incrémental)."""
+    base_path = str(base_path)
+    with _lock:
+        cached = _memory_cache.get(base_path)
+        if (not force and cached is not None
+                and time.time() - cached["refreshed_at"] < MIN_REFRESH_INTERVAL):
+            return cached
+
+        tree_path = _cache_path(base_path, "tree")
+        if cached is None and not force:
+            cached = _read_json(tree_path)
+        previous = None if force or cached is None else cached["tree"]
+
+        tree, rescanned = scan_tree(base_path, previous)
+        inventory = {
+            "version": INVENTORY_VERSION,
+            "root": base_path,
+            "refreshed_at": time.time(),
+            "tree": tree,
+            "files": _build_files(tree),
+        }
+        if rescanned or cached is None:
+            try:
+                _write_json(tree_path, {k: v for k, v in inventory.items() if k != "files"})
+            except OSError:
+                pass
+        _memory_cache[base_path] = inventory
+        return inventory
+
+
+def list_fastq(inventory, extensions=None):
+    """Chemins relatifs des FASTQ inventoriés (filtrés par extension si demandé)."""
+    return sorted(
+        rel_path for rel_path in inventory["files"]
+        if not extensions or rel_path.endswith(tuple(extensions))
+    )
+
+
+def count_reads(path):
+    """Compte lectures et bases d'un FASTQ (gzip ou non) en une lecture séquentielle."""
+    opener = gzip.open if path.endswith(".gz") else open
+    reads = 0
+    bases = 0
+    with opener(path, "rb") as f:
+        for seq in itertools.islice(f, 1, None, 4):
+            reads += 1
+            bases += len(seq.rstrip(b"\r\n"))
+    return reads, bases
+
+
+def _load_counts(base_path):
+    data = _read_json(_cache_path(base_path, "counts"))
+    return data["counts"] if data else {}
+
+
+def file_counts(inventory, compute=False, rel_paths=None):
+    """Lectures/bases par fichier, depuis le cache ; compute=True calcule les manquants.
+
+    Retourne {chemin relatif: (lectures, bases) ou None si inconnu}.
+    """
+    base_path = inventory["root"]
+    counts = _load_counts(base_path)
+    result = {}
+    changed = False
+    for rel_path in rel_paths or inventory["files"]:
+        info = inventory["files"].get(rel_path)
+        if info is None:
+            continue
+        cached = counts.get(rel_path)
+        if cached and cached["size"] == info["size"] and cached["mtime"] == info["mtime"]:
+            result[rel_path] = (cached["reads"], cached["bases"])
+        elif compute:
+            try:
+                reads, bases = count_reads(os.path.join(base_path, rel_path))
+            except (OSError, EOFError):
+                result[rel_path] = None
+                continue
+            counts[rel_path] = {"size": info["size"], "mtime": info["mtime"], "reads": reads, "bases": bases}
+            result[rel_path] = (reads, bases)
+            changed = True
+        else:
+            result[rel_path] = None
+    if changed:
+        try:
+            _write_json(_cache_path(base_path, "counts"), {"version": INVENTORY_VERSION, "counts": counts})
+        except OSError:
+            pass
+    return result
+
+
+def barcode_summary(inventory, compute_counts=False):
+    """Volume d'entrée par barcode : fichiers, octets, et lectures/bases si connues."""
+    counts = file_counts(inventory, compute=compute_counts)
+    summary = {}
+    for rel_path, info in inventory["files"].items():
+        row = summary.setdefault(info["barcode"], {
+            "barcode": info["barcode"], "files": 0, "bytes": 0,
+            "reads": 0, "bases": 0, "counted": 0,
+        })
+        row["files"] += 1
+        row["bytes"] += info["size"]
+        if counts.get(rel_path):
+            row["reads"] += counts[rel_path][0]
+            row["bases"] += counts[rel_path][1]
+            row["counted"] += 1
+    return [summary[barcode] for barcode in sorted(summary)]
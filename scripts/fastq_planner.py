@@ -0,0 +1,122 @@
+"""Planification des alignements minimap2 de l'étape 1 selon la taille des FASTQ.
+
+Les fichiers sont lancés du plus gros au plus petit et chaque fichier prend le
+premier slot libre (ordonnancement LPT). Le nombre de jobs parallèles et les
+threads par job sont choisis en simulant ce placement pour chaque valeur
+possible et en retenant le makespan estimé le plus court.
+
+Modèle de coût : un job traitant `b` octets (équivalent non compressé) avec
+`t` threads dure b / (RATE * t / (1 + SERIAL * (t - 1))). SERIAL représente la
+part non parallélisable (lecture, samtools sort, écriture du BAM).
+
+Usage (depuis step1_align.sbatch) :
+    python3 scripts/fastq_planner.py --threads 20 [--mem-gb 120] [--dry-run] FASTQ...
+
+Sortie : une ligne "# parallel=P threads=T makespan_s=S" puis une ligne
+"<threads>\\t<fichier>" par FASTQ, dans l'ordre de lancement.
+"""
+import argparse
+import os
+import sys
+
+# Débit d'alignement par thread (octets non compressés / s), ajustable par --rate
+RATE = 4 * 1024 * 1024
+# Part non parallélisable d'un job minimap2 | samtools sort
+SERIAL = 0.08
+# Ratio de compression moyen d'un FASTQ gzip
+GZIP_RATIO = 3.0
+# Mémoire par job : index minimap2 (-I 8G) + samtools sort -m 2G par thread
+INDEX_MEM_GB = 10
+SORT_MEM_GB_PER_THREAD = 2
+MIN_THREADS_PER_JOB = 2
+
+
+def effective_bytes(path):
+    size = os.path.getsize(path)
+    return size * GZIP_RATIO if path.endswith(".gz") else float(size)
+
+
+def job_seconds(nbytes, threads, rate=RATE):
+    speedup = threads / (1 + SERIAL * (threads - 1))
+    return nbytes / (rate * speedup)
+
+
+def simulate(sizes, parallel, threads, rate=RATE):
+    """Makespan de `sizes`, lancées dans cet ordre sur le premier des `parallel` slots libre."""
+    slots = [0.0] * parallel
+    for nbytes in sizes:
+        i = slots.index(min(slots))
+        slots[i] += job_seconds(nbytes, threads, rate)
+    return max(slots) if slots else 0.0
+
+
+def max_parallel_for_memory(mem_gb, threads):
+    if not mem_gb:
+        return None
+    return int(mem_gb // (INDEX_MEM_GB + SORT_MEM_GB_PER_THREAD * threads))
+
+
+def plan(files, total_threads, mem_gb=None, max_parallel=None, rate=RATE):
+    """Retourne (ordre des fichiers, parallélisme, threads par job, makespan estimé)."""
+    sized = sorted(((effective_bytes(f), f) for f in files), reverse=True)
+    sizes = [s for s, _ in sized]
+    upper = max(1, min(len(files), total_threads // MIN_THREADS_PER_JOB))
+    if max_parallel:
+        upper = min(upper, max_parallel)
+
+    best = None
+    for parallel in range(1, upper + 1):
+        threads = max(MIN_THREADS_PER_JOB, total_threads // parallel)
+        mem_cap = max_parallel_for_memory(mem_gb, threads)
+        if mem_cap is not None and parallel > max(1, mem_cap):
+            continue
+        makespan = simulate(sizes, parallel, threads, rate)
+        # À makespan égal, on préfère moins de jobs (moins de mémoire)
+        if best is None or makespan < best[2] * 0.99:
+            best = (parallel, threads, makespan)
+
+    parallel, threads, makespan = best
+    return [f for _, f in sized], parallel, threads, makespan
+
+
+def _fmt_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h{rest // 60:02d}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan d'alignement des FASTQ (étape 1)")
+    parser.add_argument("--threads", type=int, required=True, help="Threads disponibles pour le job")
+    parser.add_argument("--mem-gb", type=float, default=None, help="Mémoire disponible (Go)")
+    parser.add_argument("--max-parallel", type=int, default=None)
+    parser.add_argument("--rate", type=float, default=RATE, help="Débit par thread (octets/s)")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche le plan lisible sans rien lancer")
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+
+    order, parallel, threads, makespan = plan(
+        args.files, args.threads, args.mem_gb, args.max_parallel, args.rate
+    )
+
+    if args.dry_run:
+        baseline = simulate(
+            [effective_bytes(f) for f in args.files],
+            min(5, len(args.files)), max(2, args.threads // 5), args.rate,
+        )
+        print(f"Plan : {parallel} job(s) en parallèle x {threads} threads "
+              f"({len(order)} fichiers)")
+        print(f"Makespan estimé : {_fmt_duration(makespan)} "
+              f"(ordre du glob, 5 jobs : {_fmt_duration(baseline)})")
+        for f in order:
+            size_gb = os.path.getsize(f) / 1024 ** 3
+            print(f"  {size_gb:8.2f} GB  ~{_fmt_duration(job_seconds(effective_bytes(f), threads, args.rate))}  {f}")
+        return 0
+
+    print(f"# parallel={parallel} threads={threads} makespan_s={makespan:.0f}")
+    for f in order:
+        print(f"{threads}\t{f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
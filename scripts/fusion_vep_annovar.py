@@ -0,0 +1,322 @@
+"""Fusion des annotations VEP (--tab) et ANNOVAR (hg38_multianno.txt) de l'étape 7.
+
+Jointure par tri-fusion en flux sur une clé de variant normalisée :
+chaque table est triée par blocs de taille bornée (fichiers temporaires
+fusionnés avec heapq.merge), puis les deux flux triés sont parcourus en
+parallèle. La mémoire reste bornée par --chunk-rows quelle que soit la taille
+du callset.
+
+Clé normalisée (chrom, pos, ref, alt) : préfixe "chr" retiré, M -> MT, bases
+communes en tête puis en queue retirées (pos avancée d'autant), allèle vide
+noté "-". Les deux représentations se rejoignent ainsi :
+- VEP : Location "1:1001-1003" + allèle "-" (délétion) ou "1:1000-1001"
+  + allèle inséré (insertion après la base 1000) ;
+- ANNOVAR : Start = première base supprimée (délétion) ou base d'ancrage
+  (insertion, Ref "-").
+
+Sortie : CHROM POS REF ALT, colonnes VEP, colonnes ANNOVAR ; une ligne par
+couple (ligne VEP, ligne ANNOVAR) de même clé, jointure externe (variants
+présents d'un seul côté conservés). Ordre génomique 1..22, X, Y, MT, autres.
+
+Usage :
+    python3 scripts/fusion_vep_annovar.py -v S_annotation_vep.tsv \\
+        -a S_annovar_pileup.hg38_multianno.txt -o fusion/S_annotation_final.tsv
+"""
+import argparse
+import heapq
+import itertools
+import os
+import re
+import sys
+import tempfile
+import time
+
+# Lignes triées en mémoire avant écriture d'un bloc temporaire
+CHUNK_ROWS = 500_000
+
+_UPLOADED_RE = re.compile(r"^(.+)_(\d+)_([A-Za-z*-]+)/([A-Za-z*/-]+)$")
+_CHROM_RANK = {str(i): i for i in range(1, 23)}
+_CHROM_RANK.update({"X": 23, "Y": 24, "MT": 25})
+
+
+def normalize_chrom(chrom):
+    chrom = chrom[3:] if chrom.lower().startswith("chr") else chrom
+    return "MT" if chrom == "M" else chrom
+
+
+def normalize_key(chrom, pos, ref, alt):
+    """Clé canonique : allèles réduits à la partie qui diffère, '-' pour un allèle vide."""
+    ref = "" if ref == "-" else ref.upper()
+    alt = "" if alt == "-" else alt.upper()
+    while ref and alt and ref[0] == alt[0]:
+        ref, alt = ref[1:], alt[1:]
+        pos += 1
+    while ref and alt and ref[-1] == alt[-1]:
+        ref, alt = ref[:-1], alt[:-1]
+    return normalize_chrom(chrom), pos, ref or "-", alt or "-"
+
+
+def sort_token(key):
+    """Représentation texte dont l'ordre lexicographique est l'ordre génomique."""
+    chrom, pos, ref, alt = key
+    rank = _CHROM_RANK.get(chrom, 99)
+    return f"{rank:02d}\x1f{chrom}\x1f{pos:010d}\x1f{ref}\x1f{alt}"
+
+
+def vep_key(fields, columns):
+    """Clé d'une ligne VEP --tab (REF_ALLELE si --show_ref_allele, sinon Uploaded_variation)."""
+    allele = fields[columns["Allele"]]
+    location = fields[columns["Location"]]
+    chrom, _, span = location.rpartition(":")
+    start = int(span.split("-")[0])
+
+    ref = fields[columns["REF_ALLELE"]] if "REF_ALLELE" in columns else None
+    if ref is None:
+        match = _UPLOADED_RE.match(fields[columns["Uploaded_variation"]])
+        if match:
+            ref = match.group(3)
+            # Nom VEP "chr_début_REF/ALT" : début déjà au format VEP
+            start = int(match.group(2)) - (1 if ref == "-" else 0)
+    if ref is None:
+        raise ValueError(
+            f"Impossible de déterminer l'allèle de référence pour {location} "
+            "(relancer VEP avec --show_ref_allele)"
+        )
+    # Insertion : Location "1:1000-1001" désigne l'intervalle entre 1000 et 1001
+    pos = start + 1 if ref == "-" else start
+    return normalize_key(chrom, pos, ref, allele)
+
+
+def annovar_key(fields, columns):
+    chrom = fields[columns["Chr"]]
+    start = int(fields[columns["Start"]])
+    ref = fields[columns["Ref"]]
+    alt = fields[columns["Alt"]]
+    # Insertion ANNOVAR : Start = base d'ancrage
+    pos = start + 1 if ref == "-" else start
+    return normalize_key(chrom, pos, ref, alt)
+
+
+def read_vep(path):
+    """(colonnes, itérateur de (clé, champs)) d'une sortie VEP --tab."""
+    f = open(path)
+    header = None
+    for line in f:
+        if line.startswith("##"):
+            continue
+        if line.startswith("#"):
+            header = line[1:].rstrip("\n").split("\t")
+        break
+    if header is None:
+        f.close()
+        raise ValueError(f"En-tête VEP (#Uploaded_variation...) introuvable dans {path}")
+    columns = {name: i for i, name in enumerate(header)}
+
+    def rows():
+        with f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                yield vep_key(fields, columns), fields
+
+    return header, rows()
+
+
+def read_annovar(path):
+    """(colonnes, itérateur de (clé, champs)) d'une table hg38_multianno.txt."""
+    f = open(path)
+    header = f.readline().rstrip("\n").split("\t")
+    if "Chr" not in header:
+        f.close()
+        raise ValueError(f"En-tête ANNOVAR (Chr Start End Ref Alt...) introuvable dans {path}")
+    columns = {name: i for i, name in enumerate(header)}
+
+    def rows():
+        with f:
+            for line in f:
+                if not line.strip():
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                # Anciennes versions : une seule colonne "Otherinfo" pour plusieurs champs
+                while len(fields) > len(header):
+                    header.append(f"Otherinfo_col{len(header) + 1}")
+                yield annovar_key(fields, columns), fields
+
+    return header, rows()
+
+
+def _token(item):
+    return item[0]
+
+
+def _write_run(rows, tmpdir):
+    # Tri stable sur la clé seule : l'ordre d'origine (transcrits VEP) est conservé
+    rows.sort(key=_token)
+    fd, path = tempfile.mkstemp(prefix="fusion_run_", suffix=".tsv", dir=tmpdir)
+    with os.fdopen(fd, "w") as f:
+        for token, line in rows:
+            f.write(f"{token}\t{line}\n")
+    return path
+
+
+def _read_run(path):
+    with open(path) as f:
+        for line in f:
+            token, _, rest = line.rstrip("\n").partition("\t")
+            yield token, rest
+
+
+def external_sort(records, tmpdir, chunk_rows=CHUNK_ROWS, stats=None):
+    """Trie (clé, champs) par clé génomique avec au plus chunk_rows lignes en mémoire.
+
+    Retourne un itérateur de (token de tri, clé, champs).
+    """
+    runs = []
+    chunk = []
+    count = 0
+    for key, fields in records:
+        chunk.append((sort_token(key), "\t".join(fields)))
+        count += 1
+        if len(chunk) >= chunk_rows:
+            runs.append(_write_run(chunk, tmpdir))
+            chunk = []
+    if runs and chunk:
+        runs.append(_write_run(chunk, tmpdir))
+    if stats is not None:
+        stats["rows"] = count
+        stats["runs"] = len(runs)
+
+    if runs:
+        merged = heapq.merge(*(_read_run(p) for p in runs), key=_token)
+    else:
+        chunk.sort(key=_token)
+        merged = iter(chunk)
+
+    for token, line in merged:
+        chrom, pos, ref, alt = token.split("\x1f")[1:]
+        yield token, (chrom, int(pos), ref, alt), line.split("\t")
+
+
+def _grouped(stream):
+    for token, group in itertools.groupby(stream, key=lambda item: item[0]):
+        group = list(group)
+        yield token, group[0][1], [fields for _, _, fields in group]
+
+
+def merge_join(vep_stream, annovar_stream, vep_width, annovar_width, write, stats):
+    """Jointure externe de deux flux triés et groupés par clé."""
+    vep_groups = _grouped(vep_stream)
+    annovar_groups = _grouped(annovar_stream)
+    vep_item = next(vep_groups, None)
+    annovar_item = next(annovar_groups, None)
+    empty_vep = [""] * vep_width
+    empty_annovar = [""] * annovar_width
+
+    while vep_item or annovar_item:
+        if annovar_item is None or (vep_item and vep_item[0] < annovar_item[0]):
+            _, key, vep_rows = vep_item
+            for row in vep_rows:
+                write(key, row, empty_annovar)
+            stats["vep_only"] += 1
+            vep_item = next(vep_groups, None)
+        elif vep_item is None or annovar_item[0] < vep_item[0]:
+            _, key, annovar_rows = annovar_item
+            for row in annovar_rows:
+                write(key, empty_vep, row)
+            stats["annovar_only"] += 1
+            annovar_item = next(annovar_groups, None)
+        else:
+            _, key, vep_rows = vep_item
+            for vep_row in vep_rows:
+                for annovar_row in annovar_item[2]:
+                    write(key, vep_row, annovar_row)
+            stats["matched"] += 1
+            vep_item = next(vep_groups, None)
+            annovar_item = next(annovar_groups, None)
+
+
+def fuse(vep_path, annovar_path, output, chunk_rows=CHUNK_ROWS, tmpdir=None):
+    started = time.time()
+    vep_header, vep_rows = read_vep(vep_path)
+    annovar_header, annovar_rows = read_annovar(annovar_path)
+    stats = {"matched": 0, "vep_only": 0, "annovar_only": 0, "written": 0}
+    vep_stats = {}
+    annovar_stats = {}
+
+    out_dir = os.path.dirname(os.path.abspath(output))
+    with tempfile.TemporaryDirectory(prefix="fusion_", dir=tmpdir or out_dir) as workdir:
+        vep_sorted = external_sort(vep_rows, workdir, chunk_rows, vep_stats)
+        annovar_sorted = external_sort(annovar_rows, workdir, chunk_rows, annovar_stats)
+
+        tmp_output = f"{output}.{os.getpid()}.tmp"
+        with open(tmp_output, "w") as out:
+            # Les en-têtes ANNOVAR "Otherinfo" peuvent s'allonger à la lecture : écrits après le tri
+            first_vep = next(vep_sorted, None)
+            first_annovar = next(annovar_sorted, None)
+            vep_width = len(vep_header)
+            annovar_width = len(annovar_header)
+            vep_names = set(vep_header)
+            # Nommage des contigs de la sortie calqué sur l'entrée (chr1 ou 1)
+            if first_annovar:
+                source_chrom = first_annovar[2][annovar_header.index("Chr")]
+            elif first_vep:
+                source_chrom = first_vep[2][vep_header.index("Location")]
+            else:
+                source_chrom = ""
+            prefixed = source_chrom.lower().startswith("chr")
+            out.write("\t".join(
+                ["CHROM", "POS", "REF", "ALT"] + vep_header
+                + [f"ANNOVAR_{name}" if name in vep_names else name for name in annovar_header]
+            ) + "\n")
+
+            def write(key, vep_fields, annovar_fields):
+                chrom, pos, ref, alt = key
+                if prefixed:
+                    chrom = "chrM" if chrom == "MT" else f"chr{chrom}"
+                vep_fields = vep_fields + [""] * (vep_width - len(vep_fields))
+                annovar_fields = annovar_fields + [""] * (annovar_width - len(annovar_fields))
+                out.write("\t".join([chrom, str(pos), ref, alt] + vep_fields + annovar_fields) + "\n")
+                stats["written"] += 1
+
+            merge_join(
+                itertools.chain([first_vep] if first_vep else [], vep_sorted),
+                itertools.chain([first_annovar] if first_annovar else [], annovar_sorted),
+                vep_width, annovar_width, write, stats,
+            )
+        os.replace(tmp_output, output)
+
+    stats["vep_rows"] = vep_stats.get("rows", 0)
+    stats["annovar_rows"] = annovar_stats.get("rows", 0)
+    stats["runs"] = vep_stats.get("runs", 0) + annovar_stats.get("runs", 0)
+    stats["seconds"] = time.time() - started
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fusion des annotations VEP et ANNOVAR")
+    parser.add_argument("-v", "--vep", required=True, help="Sortie VEP --tab")
+    parser.add_argument("-a", "--annovar", required=True, help="Table ANNOVAR hg38_multianno.txt")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help="Lignes triées en mémoire par bloc (borne la mémoire)")
+    parser.add_argument("--tmpdir", help="Dossier des blocs temporaires (défaut : dossier de sortie)")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = fuse(args.vep, args.annovar, args.output, args.chunk_rows, args.tmpdir)
+    except (OSError, ValueError) as e:
+        print(f"Erreur de fusion : {e}", file=sys.stderr)
+        return 1
+
+    rate = (stats["vep_rows"] + stats["annovar_rows"]) / stats["seconds"] if stats["seconds"] else 0
+    print(f"Lignes VEP : {stats['vep_rows']} | lignes ANNOVAR : {stats['annovar_rows']}")
+    print(f"Variants communs : {stats['matched']} | VEP seul : {stats['vep_only']} "
+          f"| ANNOVAR seul : {stats['annovar_only']}")
+    print(f"Lignes écrites : {stats['written']} en {stats['seconds']:.1f} s "
+          f"({rate:.0f} lignes lues/s, {stats['runs']} bloc(s) temporaire(s))")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+#!/bin/bash
+# Pool de processus en arrière-plan à nombre de slots borné.
+# L'attente est événementielle (wait -n) : un nouveau job démarre dès qu'un
+# autre se termine, sans boucle de sondage.
+#
+# Usage :
+#   source "$PIPELINE_DIR/scripts/job_pool.sh"
+#   pool_init 4
+#   pool_run ma_fonction arg1 arg2
+#   pool_wait || echo "$POOL_FAILED job(s) en échec"
+
+function pool_init() {
+    POOL_MAX=${1:-1}
+    [[ $POOL_MAX -lt 1 ]] && POOL_MAX=1
+    POOL_ACTIVE=0
+    POOL_FAILED=0
+}
+
+# Attend la fin d'un job du pool et met à jour les compteurs
+function _pool_reap() {
+    wait -n
+    local status=$?
+    # 127 : plus aucun enfant à attendre
+    if [[ $status -eq 127 ]]; then
+        POOL_ACTIVE=0
+        return
+    fi
+    POOL_ACTIVE=$((POOL_ACTIVE - 1))
+    [[ $status -ne 0 ]] && POOL_FAILED=$((POOL_FAILED + 1))
+}
+
+# Lance "$@" en arrière-plan dès qu'un slot est libre
+function pool_run() {
+    while [[ $POOL_ACTIVE -ge $POOL_MAX ]]; do
+        _pool_reap
+    done
+    "$@" &
+    POOL_ACTIVE=$((POOL_ACTIVE + 1))
+}
+
+# Attend tous les jobs restants ; code retour non nul si au moins un a échoué
+function pool_wait() {
+    while [[ $POOL_ACTIVE -gt 0 ]]; do
+        _pool_reap
+    done
+    [[ $POOL_FAILED -eq 0 ]]
+}
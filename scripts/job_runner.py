@@ -0,0 +1,175 @@
+"""Soumission non bloquante des commandes du pipeline (run_pipeline.sh).
+
+Chaque commande est exécutée dans un pool de threads ; stdout et stderr sont
+lus ligne par ligne pendant l'exécution et les identifiants de jobs SLURM sont
+extraits au fil de l'eau. L'interface récupère un handle immédiatement et
+affiche la progression sans bloquer la session. Les soumissions terminées
+sont libérées après FINISHED_TTL ou au-delà de MAX_FINISHED_SUBMISSIONS.
+"""
+import itertools
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Lignes émises par run_pipeline.sh / sbatch contenant un identifiant de job
+JOB_ID_PATTERNS = [
+    re.compile(r"^(?P<label>.*?)\s*-?\s*Job ID\s*:\s*(?P<job_id>\d+)"),
+    re.compile(r"^(?P<label>)Submitted batch job (?P<job_id>\d+)"),
+]
+
+# Nombre maximal de lignes conservées par soumission
+MAX_OUTPUT_LINES = 5000
+
+# Soumissions terminées gardées par le gestionnaire partagé (nombre, durée en s) :
+# au-delà, les plus anciennes et leur sortie sont libérées
+MAX_FINISHED_SUBMISSIONS = 50
+FINISHED_TTL = 24 * 3600
+
+
+class Submission:
+    """Handle d'une commande lancée en arrière-plan."""
+
+    def __init__(self, sub_id, command, label="", meta=None):
+        self.id = sub_id
+        self.command = command
+        self.label = label
+        self.meta = meta or {}
+        self.lines = []        # (flux, texte) dans l'ordre d'arrivée
+        self.job_ids = []      # (libellé, job_id)
+        self.returncode = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.process = None
+        self.future = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.returncode is not None
+
+    @property
+    def command_str(self):
+        return " ".join(self.command) if isinstance(self.command, list) else self.command
+
+    def _append(self, stream, text):
+        with self._lock:
+            self.lines.append((stream, text))
+            if len(self.lines) > MAX_OUTPUT_LINES:
+                del self.lines[:len(self.lines) - MAX_OUTPUT_LINES]
+            if stream == "stdout":
+                for pattern in JOB_ID_PATTERNS:
+                    match = pattern.search(text.strip())
+                    if match and all(j != match.group("job_id") for _, j in self.job_ids):
+                        self.job_ids.append((match.group("label").strip(" -:➤"), match.group("job_id")))
+                        break
+
+    def output(self, stream):
+        """Texte accumulé pour un flux ("stdout" ou "stderr")."""
+        with self._lock:
+            return "\n".join(text for s, text in self.lines if s == stream)
+
+    def elapsed(self):
+        end = self.finished_at or time.time()
+        return end - self.started_at
+
+    def cancel(self):
+        """Retire la commande du pool si elle attend encore, sinon l'interrompt si elle est en cours."""
+        with self._lock:
+            # Vu par _run avant Popen : une commande dont le thread démarre à l'instant n'est pas lancée
+            self.cancelled = True
+            process = self.process
+        if self.future is not None and self.future.cancel():
+            self._finish_cancelled()
+        elif process is not None and process.poll() is None:
+            process.terminate()
+
+    def _finish_cancelled(self):
+        self._append("stderr", "Soumission annulée avant son démarrage")
+        self.finished_at = time.time()
+        self.returncode = -1
+
+
+class SubmissionManager:
+    """Pool de soumissions partagé entre les sessions de l'interface."""
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline-submit")
+        self._submissions = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, command, label="", meta=None, cwd=None):
+        """Lance `command` en arrière-plan et retourne immédiatement son handle."""
+        with self._lock:
+            self._evict()
+            sub = Submission(next(self._counter), command, label, meta)
+            self._submissions[sub.id] = sub
+        sub.future = self._executor.submit(self._run, sub, cwd or os.getcwd())
+        return sub
+
+    def get(self, sub_id):
+        """Handle de la soumission, None si elle est inconnue ou libérée (_evict)."""
+        with self._lock:
+            self._evict()
+            return self._submissions.get(sub_id)
+
+    def _evict(self):
+        """Libère les soumissions terminées depuis plus de FINISHED_TTL et au-delà de MAX_FINISHED_SUBMISSIONS."""
+        now = time.time()
+        finished = sorted((s for s in self._submissions.values() if s.done),
+                          key=lambda s: s.finished_at or now, reverse=True)
+        for index, sub in enumerate(finished):
+            if index >= MAX_FINISHED_SUBMISSIONS or now - (sub.finished_at or now) > FINISHED_TTL:
+                del self._submissions[sub.id]
+
+    def _run(self, sub, cwd):
+        cmd_list = shlex.split(sub.command) if isinstance(sub.command, str) else sub.command
+        try:
+            with sub._lock:
+                if sub.cancelled:
+                    cancelled = True
+                else:
+                    cancelled = False
+                    sub.process = subprocess.Popen(
+                        cmd_list,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        text=True,
+                        bufsize=1,
+                        env=os.environ.copy(),
+                        cwd=cwd,
+                    )
+        except FileNotFoundError as e:
+            sub._append("stderr", f"Fichier ou commande introuvable: {str(e)}")
+            sub.finished_at = time.time()
+            sub.returncode = -1
+            return
+        except Exception as e:
+            sub._append("stderr", f"Erreur inconnue: {str(e)}")
+            sub.finished_at = time.time()
+            sub.returncode = -1
+            return
+        if cancelled:
+            sub._finish_cancelled()
+            return
+
+        stderr_reader = threading.Thread(
+            target=self._pump, args=(sub, sub.process.stderr, "stderr"), daemon=True
+        )
+        stderr_reader.start()
+        self._pump(sub, sub.process.stdout, "stdout")
+        stderr_reader.join()
+        returncode = sub.process.wait()
+        sub.finished_at = time.time()
+        sub.returncode = returncode
+
+    @staticmethod
+    def _pump(sub, stream, name):
+        for line in iter(stream.readline, ""):
+            sub._append(name, line.rstrip("\n"))
+        stream.close()
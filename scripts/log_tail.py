@@ -0,0 +1,134 @@
+"""Lecture incrémentale des logs SLURM (logs/step*_%j.out).
+
+LogTail mémorise l'offset déjà lu et ne lit que les octets ajoutés depuis le
+dernier appel ; seules les dernières lignes sont conservées (buffer circulaire).
+grep_log parcourt le log complet via mmap, sans le charger en mémoire.
+"""
+import mmap
+import os
+import re
+from collections import deque
+
+# Motif par défaut pour repérer les erreurs dans les logs des étapes
+ERROR_PATTERN = (
+    r"error|erreur|exception|traceback|fatal|killed|oom|out of memory"
+    r"|segmentation fault|cancelled|due to time limit"
+)
+
+# Taille des blocs utilisés pour compter les lignes entre deux résultats
+_COUNT_CHUNK = 16 * 1024 * 1024
+
+
+class LogTail:
+    """Suivi d'un fichier de log par offset, avec buffer circulaire des dernières lignes."""
+
+    def __init__(self, path, max_lines=2000, initial_bytes=1024 * 1024, max_read=8 * 1024 * 1024):
+        self.path = path
+        self.max_read = max_read
+        self.initial_bytes = initial_bytes
+        self.lines = deque(maxlen=max_lines)
+        self.offset = None
+        self.truncated = False
+        self._partial = b""
+        self._drop_first_line = False
+        self._inode = None
+
+    def _reset(self):
+        self.lines.clear()
+        self.offset = None
+        self.truncated = False
+        self._partial = b""
+        self._drop_first_line = False
+
+    def poll(self):
+        """Lit les octets ajoutés depuis le dernier appel ; retourne le nombre de lignes nouvelles."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return 0
+
+        # Fichier remplacé ou tronqué : on repart de zéro
+        if self._inode is not None and (st.st_ino != self._inode or st.st_size < (self.offset or 0)):
+            self._reset()
+        self._inode = st.st_ino
+
+        if self.offset is None:
+            # Premier appel : seule la fin du fichier est lue
+            self.offset = max(0, st.st_size - self.initial_bytes)
+            self.truncated = self.offset > 0
+            self._drop_first_line = self.truncated
+        elif st.st_size - self.offset > self.max_read:
+            # Trop de données depuis le dernier appel : on saute au dernier bloc
+            self.offset = st.st_size - self.max_read
+            self._partial = b""
+            self.truncated = True
+            self._drop_first_line = True
+
+        if st.st_size == self.offset:
+            return 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        self.offset += len(data)
+
+        data = self._partial + data
+        chunks = data.split(b"\n")
+        self._partial = chunks.pop()
+        # Après un saut, la première ligne est incomplète
+        if self._drop_first_line and chunks:
+            chunks.pop(0)
+            self._drop_first_line = False
+
+        for chunk in chunks:
+            self.lines.append(chunk.decode("utf-8", errors="replace"))
+        return len(chunks)
+
+    def text(self):
+        """Contenu du buffer circulaire (plus la ligne en cours d'écriture)."""
+        lines = list(self.lines)
+        if self._partial:
+            lines.append(self._partial.decode("utf-8", errors="replace"))
+        return "\n".join(lines)
+
+
+def _count_newlines(mm, start, end):
+    count = 0
+    for pos in range(start, end, _COUNT_CHUNK):
+        count += mm[pos:min(pos + _COUNT_CHUNK, end)].count(b"\n")
+    return count
+
+
+def grep_log(path, pattern=ERROR_PATTERN, max_hits=200, ignore_case=True):
+    """Recherche `pattern` dans tout le log via mmap.
+
+    Retourne (résultats, limite_atteinte) où chaque résultat est
+    (numéro de ligne, texte de la ligne).
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    regex = re.compile(pattern.encode("utf-8"), flags)
+    hits = []
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hits, False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                line_no = 1
+                counted_to = 0
+                last_line_start = -1
+                for match in regex.finditer(mm):
+                    line_start = mm.rfind(b"\n", 0, match.start()) + 1
+                    if line_start == last_line_start:
+                        continue
+                    line_end = mm.find(b"\n", match.end())
+                    if line_end == -1:
+                        line_end = len(mm)
+                    line_no += _count_newlines(mm, counted_to, line_start)
+                    counted_to = line_start
+                    last_line_start = line_start
+                    hits.append((line_no, mm[line_start:line_end].decode("utf-8", errors="replace")))
+                    if len(hits) >= max_hits:
+                        return hits, True
+    except OSError:
+        pass
+    return hits, False
@@ -0,0 +1,89 @@
+#!/bin/bash
+# Cache partagé des index minimap2 (.mmi), un par référence et par preset.
+#
+# L'index est rangé sous $PIPELINE_CACHE_DIR/mmi/<sha256 référence>_<preset>_I<taille>.mmi
+# et réutilisé par tous les jobs et tous les échantillons. Un fichier
+# .meta (taille, mtime, sha256) associé au chemin de la référence évite de
+# recalculer la somme de contrôle à chaque job : elle n'est recalculée que si
+# la taille ou le mtime de la référence a changé.
+#
+# Usage :
+#   source "$PIPELINE_DIR/scripts/mmi_cache.sh"
+#   MM2_TARGET=$(ensure_mmi_index "$REFERENCE" map-ont 8G "$THREADS")
+#   minimap2 -ax map-ont "$MM2_TARGET" reads.fastq
+#
+# En cas d'échec, ensure_mmi_index affiche la référence FASTA elle-même
+# (minimap2 construit alors l'index en mémoire comme avant).
+
+MMI_CACHE_DIR="${PIPELINE_CACHE_DIR:-${PIPELINE_DIR:-.}/.cache}/mmi"
+
+# sha256 de la référence, mémorisé tant que taille et mtime sont inchangés
+function reference_checksum() {
+    local reference=$1
+    local abs_ref meta_file size mtime cached_size cached_mtime cached_sha sha
+
+    abs_ref=$(readlink -f "$reference") || return 1
+    size=$(stat -c %s "$abs_ref") || return 1
+    mtime=$(stat -c %Y "$abs_ref") || return 1
+    meta_file="$MMI_CACHE_DIR/refs/$(echo -n "$abs_ref" | sha1sum | cut -c1-16).meta"
+
+    if [[ -f "$meta_file" ]]; then
+        read -r cached_size cached_mtime cached_sha < "$meta_file"
+        if [[ "$cached_size" == "$size" && "$cached_mtime" == "$mtime" && -n "$cached_sha" ]]; then
+            echo "$cached_sha"
+            return 0
+        fi
+    fi
+
+    echo "Calcul de la somme de contrôle de $abs_ref..." >&2
+    sha=$(sha256sum "$abs_ref" | cut -d' ' -f1) || return 1
+    mkdir -p "$MMI_CACHE_DIR/refs"
+    echo "$size $mtime $sha" > "$meta_file.$$" && mv -f "$meta_file.$$" "$meta_file"
+    echo "$sha"
+}
+
+# Affiche le chemin à passer à minimap2 : l'index en cache, construit si besoin
+function ensure_mmi_index() {
+    local reference=$1
+    local preset=${2:-map-ont}
+    local batch_size=${3:-8G}
+    local threads=${4:-4}
+    local sha mmi_file
+
+    if ! command -v flock >/dev/null 2>&1; then
+        echo "⚠️ flock indisponible : index minimap2 non mis en cache" >&2
+        echo "$reference"
+        return 0
+    fi
+
+    sha=$(reference_checksum "$reference")
+    if [[ -z "$sha" ]]; then
+        echo "⚠️ Référence illisible, index minimap2 non mis en cache" >&2
+        echo "$reference"
+        return 0
+    fi
+
+    mkdir -p "$MMI_CACHE_DIR"
+    mmi_file="$MMI_CACHE_DIR/${sha:0:16}_${preset}_I${batch_size}.mmi"
+
+    # Un seul job construit l'index ; les autres attendent puis le réutilisent
+    (
+        flock -x 9
+        if [[ ! -s "$mmi_file" ]]; then
+            echo "[$(date '+%H:%M:%S')] Construction de l'index minimap2 ($preset, -I $batch_size) : $mmi_file" >&2
+            if minimap2 -t "$threads" -x "$preset" -I "$batch_size" -d "$mmi_file.tmp" "$reference" >&2; then
+                mv -f "$mmi_file.tmp" "$mmi_file"
+                echo "$(basename "$reference") ${sha}" > "$mmi_file.source"
+            else
+                rm -f "$mmi_file.tmp"
+            fi
+        fi
+    ) 9> "$mmi_file.lock"
+
+    if [[ -s "$mmi_file" ]]; then
+        echo "$mmi_file"
+    else
+        echo "⚠️ Échec de construction de l'index, utilisation directe de $reference" >&2
+        echo "$reference"
+    fi
+}
@@ -0,0 +1,652 @@
+"""Moteur QC de l'étape 6 : un seul passage sur le BAM.
+
+Remplace samtools stats / flagstat / idxstats / bedcov / coverage, mosdepth et
+NanoStat, qui relisaient chacun tout le BAM. Le BAM trié est lu une fois
+(décompression multithread de pysam) et chaque lecture alimente :
+
+- les compteurs de flags (flagstat), les statistiques par contig (idxstats)
+  et les lignes SN de samtools stats ;
+- les distributions longueur / identité / Q-score par lecture (NanoStat) ;
+- la couverture, calculée par fenêtres avec un tableau de différences :
+  histogrammes de profondeur (mosdepth dist/summary), moyenne par bin
+  (qc/coverage.cov, voir coverage_store) et couverture des cibles du BED
+  (bedcov, regions.bed.gz).
+
+La couverture suit la convention de mosdepth --fast-mode : une lecture couvre
+tout l'intervalle [début, fin) de son alignement, et les lectures non alignées,
+secondaires, QC-fail et dupliquées sont ignorées (flag 1796, comme mosdepth
+et samtools depth).
+
+Les fichiers produits gardent les noms et formats lus par MultiQC.
+
+Usage :
+    python3 -m scripts.qc_engine --bam S.bam --outdir results/S/qc --sample S \\
+        [--threads 8] [--bed cibles.bed] [--bin-size 1000]
+"""
+import argparse
+import array
+import gzip
+import os
+import sys
+
+import numpy as np
+import pysam
+
+from scripts.coverage_store import CoverageStoreWriter
+
+# Lectures ignorées pour la couverture : non alignée, secondaire, QC-fail, duplicat
+COVERAGE_EXCLUDE = 0x4 | 0x100 | 0x200 | 0x400
+
+# Taille des fenêtres de calcul de la couverture (bases)
+WINDOW = 16_000_000
+BIN_SIZE = 1_000
+Q_THRESHOLDS = (5, 7, 10, 12, 15)
+
+# Probabilité d'erreur associée à chaque score Phred
+_ERROR_PROB = 10 ** (-np.arange(256) / 10)
+
+_FLAGSTAT_KEYS = [
+    "total", "primary", "secondary", "supplementary", "duplicates", "primary_duplicates",
+    "mapped", "primary_mapped", "paired", "read1", "read2", "proper", "both_mapped",
+    "singletons", "mate_diff_chr", "mate_diff_chr_q5",
+]
+
+
+def read_bed(path):
+    """Intervalles du BED : liste de (contig, début, fin, colonnes d'origine)."""
+    regions = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            regions.append((fields[0], int(fields[1]), int(fields[2]), fields))
+    return regions
+
+
+class ContigCoverage:
+    """Couverture d'un contig, calculée fenêtre par fenêtre à partir des débuts/fins de lectures."""
+
+    def __init__(self, name, length, bin_size, regions=()):
+        self.name = name
+        self.length = length
+        self.bin_size = bin_size
+        # Fenêtres alignées sur les bins
+        self.window = max(bin_size, WINDOW // bin_size * bin_size)
+        self.ws = 0
+        self.starts = array.array("q")
+        self.ends = array.array("q")
+        self.pending = np.zeros(0, dtype=np.int64)
+        self.hist = np.zeros(1, dtype=np.int64)
+        self.region_hist = np.zeros(1, dtype=np.int64)
+        self.bins = []
+        self.depth_sum = 0
+        self.covered = 0
+        self.min_depth = None
+        self.max_depth = 0
+        self.numreads = 0
+        self.mapq_sum = 0
+        self.baseq_sum = 0.0
+        self.baseq_bases = 0
+        self.regions = sorted(regions, key=lambda r: (r[1], r[2]))
+        self.region_starts = np.array([r[1] for r in self.regions], dtype=np.int64)
+        self.region_ends = np.array([r[2] for r in self.regions], dtype=np.int64)
+        self.region_sums = np.zeros(len(self.regions), dtype=np.int64)
+
+    def add(self, start, end):
+        if start >= self.ws + self.window:
+            self._flush(start)
+        self.starts.append(start)
+        self.ends.append(min(end, self.length))
+
+    def _flush(self, until):
+        """Calcule toutes les fenêtres qui se terminent avant `until`."""
+        while self.ws < self.length and self.ws + self.window <= until:
+            self._process_window()
+
+    def finish(self):
+        while self.ws < self.length:
+            self._process_window()
+
+    @staticmethod
+    def _accumulate(hist, values):
+        counts = np.bincount(values)
+        if len(counts) > len(hist):
+            counts[:len(hist)] += hist
+            return counts
+        hist[:len(counts)] += counts
+        return hist
+
+    def _process_window(self):
+        ws = self.ws
+        we = min(ws + self.window, self.length)
+        n = we - ws
+
+        starts = np.frombuffer(self.starts, dtype=np.int64) - ws
+        ends = np.concatenate([self.pending, np.frombuffer(self.ends, dtype=np.int64)])
+        carry = len(self.pending)
+        inside = ends < we
+        self.pending = ends[~inside]
+
+        diff = np.zeros(n + 1, dtype=np.int64)
+        if len(starts):
+            diff += np.bincount(starts, minlength=n + 1)[:n + 1]
+        if inside.any():
+            diff -= np.bincount(ends[inside] - ws, minlength=n + 1)[:n + 1]
+        depth = carry + np.cumsum(diff[:n])
+
+        self.starts = array.array("q")
+        self.ends = array.array("q")
+        self.ws = we
+
+        self.hist = self._accumulate(self.hist, depth)
+        self.depth_sum += int(depth.sum())
+        self.covered += int(np.count_nonzero(depth))
+        window_min = int(depth.min())
+        self.min_depth = window_min if self.min_depth is None else min(self.min_depth, window_min)
+        self.max_depth = max(self.max_depth, int(depth.max()))
+
+        # Moyenne par bin (le dernier bin du contig peut être incomplet)
+        full = n // self.bin_size
+        if full:
+            self.bins.append(depth[:full * self.bin_size].reshape(full, self.bin_size).mean(axis=1))
+        if n % self.bin_size:
+            self.bins.append(np.array([depth[full * self.bin_size:].mean()]))
+
+        if len(self.regions):
+            self._regions_window(depth, ws, we)
+
+    def _regions_window(self, depth, ws, we):
+        starts = np.clip(self.region_starts, ws, we) - ws
+        ends = np.clip(self.region_ends, ws, we) - ws
+        overlap = starts < ends
+        if not overlap.any():
+            return
+        cumulative = np.concatenate([[0], np.cumsum(depth)])
+        self.region_sums[overlap] += cumulative[ends[overlap]] - cumulative[starts[overlap]]
+
+        # Bases des cibles (chaque base comptée une fois même si les cibles se chevauchent)
+        marks = np.zeros(len(depth) + 1, dtype=np.int64)
+        np.add.at(marks, starts[overlap], 1)
+        np.add.at(marks, ends[overlap], -1)
+        in_target = np.cumsum(marks[:-1]) > 0
+        self.region_hist = self._accumulate(self.region_hist, depth[in_target])
+
+    def bin_means(self):
+        return np.concatenate(self.bins).astype(np.float32) if self.bins else np.zeros(0, dtype=np.float32)
+
+
+class QCEngine:
+    """Accumulateurs alimentés par un unique passage sur le BAM."""
+
+    def __init__(self, bam, bin_size=BIN_SIZE, bed_regions=None):
+        self.bin_size = bin_size
+        self.contigs = list(zip(bam.references, bam.lengths))
+        regions_by_contig = {}
+        for region in bed_regions or []:
+            regions_by_contig.setdefault(region[0], []).append(region)
+        self.bed_regions = bed_regions or []
+        self.coverage = [
+            ContigCoverage(name, length, bin_size, regions_by_contig.get(name, ()))
+            for name, length in self.contigs
+        ]
+        self.current_tid = -1
+        self.last_start = -1
+
+        self.flags = [dict.fromkeys(_FLAGSTAT_KEYS, 0), dict.fromkeys(_FLAGSTAT_KEYS, 0)]
+        self.idx_mapped = [0] * len(self.contigs)
+        self.idx_unmapped = [0] * len(self.contigs)
+        self.idx_unplaced = 0
+
+        self.sn = dict.fromkeys([
+            "raw", "first", "last", "mapped", "mapped_paired", "unmapped", "proper", "paired",
+            "duplicated", "mq0", "qcfail", "secondary", "supplementary", "total_length",
+            "first_length", "last_length", "bases_mapped", "bases_mapped_cigar",
+            "bases_duplicated", "mismatches", "max_length", "max_first_length",
+            "max_last_length", "qual_sum", "qual_bases",
+        ], 0)
+        self.read_lengths = array.array("q")
+        self.aligned_lengths = array.array("q")
+        self.mean_quals = array.array("f")
+        self.identities = array.array("f")
+
+    def _advance(self, tid, start):
+        """Termine les contigs précédents (y compris sans lecture) à l'arrivée sur `tid`."""
+        if tid != self.current_tid:
+            if tid < self.current_tid:
+                raise ValueError("BAM non trié par coordonnées")
+            for cov in self.coverage[max(self.current_tid, 0):tid]:
+                cov.finish()
+            self.current_tid = tid
+            self.last_start = -1
+        if start < self.last_start:
+            raise ValueError("BAM non trié par coordonnées")
+        self.last_start = start
+
+    def add(self, read):
+        flag = read.flag
+        fail = 1 if flag & 0x200 else 0
+        counts = self.flags[fail]
+        secondary = flag & 0x100
+        supplementary = flag & 0x800
+        primary = not (secondary or supplementary)
+        unmapped = flag & 0x4
+        paired = flag & 0x1
+
+        # === flagstat ===
+        counts["total"] += 1
+        if secondary:
+            counts["secondary"] += 1
+        elif supplementary:
+            counts["supplementary"] += 1
+        else:
+            counts["primary"] += 1
+        if flag & 0x400:
+            counts["duplicates"] += 1
+            if primary:
+                counts["primary_duplicates"] += 1
+        if not unmapped:
+            counts["mapped"] += 1
+            if primary:
+                counts["primary_mapped"] += 1
+        if paired and primary:
+            counts["paired"] += 1
+            if flag & 0x40:
+                counts["read1"] += 1
+            if flag & 0x80:
+                counts["read2"] += 1
+            if flag & 0x2 and not unmapped:
+                counts["proper"] += 1
+            if not unmapped:
+                if flag & 0x8:
+                    counts["singletons"] += 1
+                else:
+                    counts["both_mapped"] += 1
+                    if read.next_reference_id != read.reference_id:
+                        counts["mate_diff_chr"] += 1
+                        if read.mapping_quality >= 5:
+                            counts["mate_diff_chr_q5"] += 1
+
+        # === idxstats ===
+        tid = read.reference_id
+        if tid < 0:
+            self.idx_unplaced += 1
+        elif unmapped:
+            self.idx_unmapped[tid] += 1
+        else:
+            self.idx_mapped[tid] += 1
+
+        # === couverture ===
+        if not flag & COVERAGE_EXCLUDE and tid >= 0:
+            start = read.reference_start
+            self._advance(tid, start)
+            end = read.reference_end
+            cov = self.coverage[tid]
+            if end is not None and end > start:
+                cov.add(start, end)
+            cov.numreads += 1
+            cov.mapq_sum += read.mapping_quality
+
+        # === samtools stats (lectures primaires) et NanoStat ===
+        sn = self.sn
+        if secondary:
+            sn["secondary"] += 1
+            return
+
+        # Bases alignées (M, I, =, X) et NM : primaires et supplémentaires, comme samtools stats
+        matched = indels = nm = None
+        if not unmapped:
+            ops, _ = read.get_cigar_stats()
+            matched = int(ops[0]) + int(ops[7]) + int(ops[8])
+            indels = int(ops[1]) + int(ops[2])
+            sn["bases_mapped_cigar"] += matched + int(ops[1])
+            if read.has_tag("NM"):
+                nm = read.get_tag("NM")
+                sn["mismatches"] += nm
+
+        if supplementary:
+            sn["supplementary"] += 1
+            return
+
+        length = read.query_length
+        is_last = flag & 0x80
+        sn["raw"] += 1
+        sn["total_length"] += length
+        if is_last:
+            sn["last"] += 1
+            sn["last_length"] += length
+            sn["max_last_length"] = max(sn["max_last_length"], length)
+        else:
+            sn["first"] += 1
+            sn["first_length"] += length
+            sn["max_first_length"] = max(sn["max_first_length"], length)
+        sn["max_length"] = max(sn["max_length"], length)
+        if paired:
+            sn["paired"] += 1
+        if fail:
+            sn["qcfail"] += 1
+        if flag & 0x400:
+            sn["duplicated"] += 1
+            sn["bases_duplicated"] += length
+
+        quals = read.query_qualities
+        mean_qual = None
+        if quals is not None and len(quals):
+            q = np.frombuffer(quals, dtype=np.uint8)
+            sn["qual_sum"] += int(q.sum())
+            sn["qual_bases"] += len(q)
+            mean_qual = float(-10 * np.log10(_ERROR_PROB[q].mean()))
+
+        if unmapped:
+            sn["unmapped"] += 1
+            return
+
+        sn["mapped"] += 1
+        sn["bases_mapped"] += length
+        if paired and not flag & 0x8:
+            sn["mapped_paired"] += 1
+        if flag & 0x2:
+            sn["proper"] += 1
+        if read.mapping_quality == 0:
+            sn["mq0"] += 1
+
+        # Identité façon NanoStat : 1 - NM / (M + I + D)
+        if nm is not None and matched + indels:
+            self.identities.append(100.0 * (1 - nm / (matched + indels)))
+
+        if tid >= 0 and mean_qual is not None:
+            # meanbaseq de samtools coverage : moyenne arithmétique des qualités alignées
+            aligned_q = q[read.query_alignment_start:read.query_alignment_end]
+            cov = self.coverage[tid]
+            cov.baseq_sum += int(aligned_q.sum())
+            cov.baseq_bases += len(aligned_q)
+
+        self.read_lengths.append(length)
+        self.aligned_lengths.append(read.query_alignment_length)
+        self.mean_quals.append(mean_qual if mean_qual is not None else float("nan"))
+
+    def finish(self):
+        for cov in self.coverage[max(self.current_tid, 0):]:
+            cov.finish()
+
+
+# === Écriture des fichiers (formats lus par MultiQC) ===
+
+def _pct(part, whole):
+    return f"{100.0 * part / whole:.2f}%" if whole else "N/A"
+
+
+def write_flagstat(engine, path):
+    passed, failed = engine.flags
+    lines = [
+        ("total", "in total (QC-passed reads + QC-failed reads)"),
+        ("primary", "primary"),
+        ("secondary", "secondary"),
+        ("supplementary", "supplementary"),
+        ("duplicates", "duplicates"),
+        ("primary_duplicates", "primary duplicates"),
+        ("mapped", "mapped ({} : {})".format(_pct(passed["mapped"], passed["total"]),
+                                             _pct(failed["mapped"], failed["total"]))),
+        ("primary_mapped", "primary mapped ({} : {})".format(
+            _pct(passed["primary_mapped"], passed["primary"]),
+            _pct(failed["primary_mapped"], failed["primary"]))),
+        ("paired", "paired in sequencing"),
+        ("read1", "read1"),
+        ("read2", "read2"),
+        ("proper", "properly paired ({} : {})".format(_pct(passed["proper"], passed["paired"]),
+                                                     _pct(failed["proper"], failed["paired"]))),
+        ("both_mapped", "with itself and mate mapped"),
+        ("singletons", "singletons ({} : {})".format(_pct(passed["singletons"], passed["paired"]),
+                                                    _pct(failed["singletons"], failed["paired"]))),
+        ("mate_diff_chr", "with mate mapped to a different chr"),
+        ("mate_diff_chr_q5", "with mate mapped to a different chr (mapQ>=5)"),
+    ]
+    with open(path, "w") as f:
+        for key, label in lines:
+            f.write(f"{passed[key]} + {failed[key]} {label}\n")
+
+
+def write_idxstats(engine, path):
+    with open(path, "w") as f:
+        for i, (name, length) in enumerate(engine.contigs):
+            f.write(f"{name}\t{length}\t{engine.idx_mapped[i]}\t{engine.idx_unmapped[i]}\n")
+        f.write(f"*\t0\t0\t{engine.idx_unplaced}\n")
+
+
+def write_samtools_stats(engine, path, bam_path):
+    sn = engine.sn
+    sequences = sn["raw"]
+    lengths = np.frombuffer(engine.read_lengths, dtype=np.int64)
+    rows = [
+        ("raw total sequences", sequences, "excluding supplementary and secondary reads"),
+        ("filtered sequences", 0),
+        ("sequences", sequences),
+        ("is sorted", 1, "sorted by coordinate"),
+        ("1st fragments", sn["first"]),
+        ("last fragments", sn["last"]),
+        ("reads mapped", sn["mapped"]),
+        ("reads mapped and paired", sn["mapped_paired"], "paired-end technology bit set + both mates mapped"),
+        ("reads unmapped", sn["unmapped"]),
+        ("reads properly paired", sn["proper"], "proper-pair bit set"),
+        ("reads paired", sn["paired"], "paired-end technology bit set"),
+        ("reads duplicated", sn["duplicated"], "PCR or optical duplicate bit set"),
+        ("reads MQ0", sn["mq0"], "mapped and MQ=0"),
+        ("reads QC failed", sn["qcfail"]),
+        ("non-primary alignments", sn["secondary"]),
+        ("supplementary alignments", sn["supplementary"]),
+        ("total length", sn["total_length"], "ignores clipping"),
+        ("total first fragment length", sn["first_length"], "ignores clipping"),
+        ("total last fragment length", sn["last_length"], "ignores clipping"),
+        ("bases mapped", sn["bases_mapped"], "ignores clipping"),
+        ("bases mapped (cigar)", sn["bases_mapped_cigar"], "more accurate"),
+        ("bases trimmed", 0),
+        ("bases duplicated", sn["bases_duplicated"]),
+        ("mismatches", sn["mismatches"], "from NM fields"),
+        ("error rate", "{:e}".format(sn["mismatches"] / sn["bases_mapped_cigar"]) if sn["bases_mapped_cigar"] else 0,
+         "mismatches / bases mapped (cigar)"),
+        ("average length", sn["total_length"] // sequences if sequences else 0),
+        ("average first fragment length", sn["first_length"] // sn["first"] if sn["first"] else 0),
+        ("average last fragment length", sn["last_length"] // sn["last"] if sn["last"] else 0),
+        ("maximum length", sn["max_length"]),
+        ("maximum first fragment length", sn["max_first_length"]),
+        ("maximum last fragment length", sn["max_last_length"]),
+        ("average quality", round(sn["qual_sum"] / sn["qual_bases"], 1) if sn["qual_bases"] else 0),
+        ("insert size average", 0.0),
+        ("insert size standard deviation", 0.0),
+        ("inward oriented pairs", 0),
+        ("outward oriented pairs", 0),
+        ("pairs with other orientation", 0),
+        ("pairs on different chromosomes", 0),
+        ("percentage of properly paired reads (%)", round(100.0 * sn["proper"] / sequences, 1) if sequences else 0),
+    ]
+    with open(path, "w") as f:
+        f.write("# This file was produced by samtools stats (scripts/qc_engine.py, passage unique)\n")
+        f.write(f"# The command line was:  qc_engine.py {bam_path}\n")
+        f.write("# Summary Numbers. Use `grep ^SN | cut -f 2-` to extract this part.\n")
+        for key, value, *comment in rows:
+            f.write(f"SN\t{key}:\t{value}" + (f"\t# {comment[0]}" if comment else "") + "\n")
+        f.write("# Read lengths. Use `grep ^RL | cut -f 2-` to extract this part. "
+                "The columns are: read length, count\n")
+        if len(lengths):
+            values, counts = np.unique(lengths, return_counts=True)
+            for value, count in zip(values, counts):
+                f.write(f"RL\t{value}\t{count}\n")
+
+
+def _n50(lengths):
+    if not len(lengths):
+        return 0
+    ordered = np.sort(lengths)[::-1]
+    cumulative = np.cumsum(ordered)
+    return int(ordered[np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+def write_nanostat(engine, path):
+    lengths = np.frombuffer(engine.read_lengths, dtype=np.int64)
+    aligned = np.frombuffer(engine.aligned_lengths, dtype=np.int64)
+    all_quals = np.frombuffer(engine.mean_quals, dtype=np.float32)
+    quals = all_quals[np.isfinite(all_quals)]
+    identities = np.frombuffer(engine.identities, dtype=np.float32)
+    total_bases = int(lengths.sum())
+
+    def stat(values, func, fmt="{:.1f}"):
+        return fmt.format(func(values)) if len(values) else "0"
+
+    rows = [
+        ("number_of_reads", len(lengths)),
+        ("number_of_bases", f"{total_bases:.1f}"),
+        ("number_of_bases_aligned", f"{int(aligned.sum()):.1f}"),
+        ("fraction_bases_aligned", f"{aligned.sum() / total_bases:.1f}" if total_bases else "0"),
+        ("median_read_length", stat(lengths, np.median)),
+        ("mean_read_length", stat(lengths, np.mean)),
+        ("read_length_stdev", stat(lengths, np.std)),
+        ("n50", f"{_n50(lengths):.1f}"),
+        ("average_identity", stat(identities, np.mean)),
+        ("median_identity", stat(identities, np.median)),
+        ("mean_qual", stat(quals, np.mean)),
+        ("median_qual", stat(quals, np.median)),
+    ]
+    for threshold in Q_THRESHOLDS:
+        mask = all_quals > threshold
+        count = int(mask.sum())
+        mb = lengths[mask].sum() / 1e6
+        pct = 100.0 * count / len(lengths) if len(lengths) else 0.0
+        rows.append((f">Q{threshold}", f"{count} ({pct:.1f}%) {mb:.1f}Mb"))
+    with open(path, "w") as f:
+        f.write("Metrics\tdataset\n")
+        for key, value in rows:
+            f.write(f"{key}\t{value}\n")
+
+
+def _write_dist(f, label, hist):
+    """Lignes mosdepth « contig profondeur fraction_cumulée » (profondeur décroissante)."""
+    total = hist.sum()
+    if not total:
+        return
+    cumulative = np.cumsum(hist[::-1])[::-1] / total
+    for depth in range(len(hist) - 1, -1, -1):
+        if round(cumulative[depth], 2) > 0:
+            f.write(f"{label}\t{depth}\t{cumulative[depth]:.2f}\n")
+
+
+def _merge_hists(hists):
+    size = max((len(h) for h in hists), default=1)
+    total = np.zeros(size, dtype=np.int64)
+    for h in hists:
+        total[:len(h)] += h
+    return total
+
+
+def write_mosdepth(engine, prefix):
+    covs = engine.coverage
+    with open(f"{prefix}.mosdepth.global.dist.txt", "w") as f:
+        for cov in covs:
+            _write_dist(f, cov.name, cov.hist)
+        _write_dist(f, "total", _merge_hists([c.hist for c in covs]))
+
+    with open(f"{prefix}.mosdepth.summary.txt", "w") as f:
+        f.write("chrom\tlength\tbases\tmean\tmin\tmax\n")
+        total_len = total_bases = 0
+        for cov in covs:
+            mean = cov.depth_sum / cov.length if cov.length else 0
+            f.write(f"{cov.name}\t{cov.length}\t{cov.depth_sum}\t{mean:.2f}\t{cov.min_depth or 0}\t{cov.max_depth}\n")
+            if len(cov.regions):
+                region_len = int(cov.region_hist.sum())
+                region_bases = int((np.arange(len(cov.region_hist)) * cov.region_hist).sum())
+                region_mean = region_bases / region_len if region_len else 0
+                nonzero = np.nonzero(cov.region_hist)[0]
+                f.write(f"{cov.name}_region\t{region_len}\t{region_bases}\t{region_mean:.2f}\t"
+                        f"{nonzero.min() if len(nonzero) else 0}\t{nonzero.max() if len(nonzero) else 0}\n")
+            total_len += cov.length
+            total_bases += cov.depth_sum
+        f.write(f"total\t{total_len}\t{total_bases}\t{total_bases / total_len if total_len else 0:.2f}\t"
+                f"{min((c.min_depth or 0) for c in covs) if covs else 0}\t{max((c.max_depth for c in covs), default=0)}\n")
+
+    if engine.bed_regions:
+        with open(f"{prefix}.mosdepth.region.dist.txt", "w") as f:
+            for cov in covs:
+                if len(cov.regions):
+                    _write_dist(f, cov.name, cov.region_hist)
+            _write_dist(f, "total", _merge_hists([c.region_hist for c in covs if len(c.regions)]))
+
+        with gzip.open(f"{prefix}.regions.bed.gz", "wt") as f:
+            for contig, start, end, fields, total in _region_totals(engine):
+                name = f"\t{fields[3]}" if len(fields) > 3 else ""
+                f.write(f"{contig}\t{start}\t{end}{name}\t{total / (end - start) if end > start else 0:.2f}\n")
+
+
+def _region_totals(engine):
+    """Sommes de profondeur par intervalle du BED, dans l'ordre du fichier."""
+    sums = {}
+    for cov in engine.coverage:
+        for region, total in zip(cov.regions, cov.region_sums):
+            sums[id(region)] = int(total)
+    for region in engine.bed_regions:
+        contig, start, end, fields = region
+        yield contig, start, end, fields, sums.get(id(region), 0)
+
+
+def write_bedcov(engine, path):
+    with open(path, "w") as f:
+        for _, _, _, fields, total in _region_totals(engine):
+            f.write("\t".join(fields) + f"\t{total}\n")
+
+
+def write_coverage(engine, path):
+    """Tableau au format samtools coverage (une ligne par contig)."""
+    with open(path, "w") as f:
+        f.write("#rname\tstartpos\tendpos\tnumreads\tcovbases\tcoverage\tmeandepth\tmeanbaseq\tmeanmapq\n")
+        for cov in engine.coverage:
+            mean_depth = cov.depth_sum / cov.length if cov.length else 0
+            baseq = cov.baseq_sum / cov.baseq_bases if cov.baseq_bases else 0
+            mapq = cov.mapq_sum / cov.numreads if cov.numreads else 0
+            f.write(f"{cov.name}\t1\t{cov.length}\t{cov.numreads}\t{cov.covered}\t"
+                    f"{100.0 * cov.covered / cov.length if cov.length else 0:.4g}\t{mean_depth:.4g}\t"
+                    f"{baseq:.3g}\t{mapq:.3g}\n")
+
+
+def write_store(engine, path, sample):
+    """Couverture par bin et histogramme par contig (remplace depth.tsv, voir coverage_store)."""
+    with CoverageStoreWriter(path, engine.bin_size, sample) as store:
+        for cov in engine.coverage:
+            store.add_contig(cov.name, cov.length, cov.bin_means(), cov.hist)
+
+
+def run(bam_path, outdir, sample, threads=1, bed=None, bin_size=BIN_SIZE):
+    os.makedirs(outdir, exist_ok=True)
+    bed_regions = read_bed(bed) if bed else None
+    with pysam.AlignmentFile(bam_path, "rb", threads=max(1, threads)) as bam:
+        engine = QCEngine(bam, bin_size, bed_regions)
+        for read in bam.fetch(until_eof=True):
+            engine.add(read)
+    engine.finish()
+
+    write_samtools_stats(engine, os.path.join(outdir, "samtools_stats.tsv"), bam_path)
+    write_flagstat(engine, os.path.join(outdir, "flagstat.tsv"))
+    write_idxstats(engine, os.path.join(outdir, "idxstats.tsv"))
+    write_nanostat(engine, os.path.join(outdir, "nanostat_summary.tsv"))
+    write_coverage(engine, os.path.join(outdir, "coverage.tsv"))
+    write_mosdepth(engine, os.path.join(outdir, f"{sample}_mosdepth"))
+    write_store(engine, os.path.join(outdir, "coverage.cov"), sample)
+    if bed_regions:
+        write_bedcov(engine, os.path.join(outdir, "bedcov.tsv"))
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QC de l'étape 6 en un seul passage sur le BAM")
+    parser.add_argument("--bam", required=True)
+    parser.add_argument("--outdir", required=True)
+    parser.add_argument("--sample", required=True)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--bed")
+    parser.add_argument("--bin-size", type=int, default=BIN_SIZE)
+    args = parser.parse_args(argv)
+
+    engine = run(args.bam, args.outdir, args.sample, args.threads, args.bed, args.bin_size)
+    print(f"QC terminé : {engine.sn['raw']} lectures primaires, {engine.flags[0]['total'] + engine.flags[1]['total']} alignements")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,430 @@
+"""Ressources SLURM (mémoire, CPUs, durée) prédites par étape, et relance après OOM / TIMEOUT.
+
+Prédiction : un modèle par défaut (base + pente × taille d'entrée en Go) est
+corrigé par la médiane du rapport mesuré / prédit des jobs terminés de la même
+étape (base de télémétrie, scripts/telemetry.py), puis majoré d'une marge de
+sécurité. La taille d'entrée est celle du BAM (étapes 2 à 6), des FASTQ
+(étape 1) ou du VCF (étape 7) ; pour Clair3 et CNVkit, la part variable est
+réduite à la fraction du génome couverte par le BED. Le nombre de CPUs n'est
+réduit que si l'efficacité CPU mesurée est faible.
+
+Entrée absente (produite par une étape amont pas encore terminée, lancement
+complet) : sa taille est estimée depuis les FASTQ de l'échantillon
+(UPSTREAM_RATIO), sinon les ressources sont les maxima mesurés des jobs
+terminés de l'étape ; sans télémétrie, predict n'affiche rien et
+run_pipeline.sh garde la mémoire fixe et le --time du script sbatch.
+
+Relance : chaque job soumis par run_pipeline.sh est suivi d'une sentinelle
+(--dependency=afternotok). Si le job finit en OUT_OF_MEMORY ou TIMEOUT, la
+sentinelle le resoumet avec deux fois plus de mémoire ou de temps (au plus
+MAX_ATTEMPTS essais) et reporte sur le nouveau job les dépendances des jobs en
+attente (étapes aval, manifeste). Si le job réussit, la sentinelle est
+annulée par SLURM (--kill-on-invalid-dep).
+
+Usage (depuis run_pipeline.sh) :
+    python3 -m scripts.resource_model predict --step 3 --input S.bam --upstream fastq/ --bed panel.bed --threads 16
+    python3 -m scripts.resource_model arm --job 1234 --step 3 --sample S --input-bytes N -- <arguments sbatch>
+"""
+import argparse
+import glob
+import math
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+from scripts.telemetry import DB_PATH, connect, efficiency_rows
+
+GB = 1024 ** 3
+GENOME_SIZE = 3.1e9
+
+# Modèle par défaut : (mémoire de base Go, Go par Go d'entrée, durée de base h, h par Go d'entrée)
+DEFAULT_MODEL = {
+    "1": (100.0, 0.0, 2.0, 0.5),
+    "2": (32.0, 1.0, 0.5, 0.05),
+    "3": (16.0, 1.0, 0.5, 0.05),
+    "4": (8.0, 0.25, 0.25, 0.03),
+    "5": (16.0, 0.5, 0.5, 0.05),
+    "6": (4.0, 0.05, 0.25, 0.01),
+    "7": (16.0, 8.0, 0.5, 2.0),
+}
+
+# Taille d'une entrée pas encore produite, en fraction de la taille des FASTQ :
+# BAM aligné du même ordre que les FASTQ compressés, VCF de l'ordre du millième
+UPSTREAM_RATIO = {"2": 1.0, "3": 1.0, "4": 1.0, "5": 1.0, "6": 1.0, "7": 0.002}
+
+# Étapes dont le travail est restreint aux régions du BED
+BED_SCALED = {"2", "4"}
+
+MEM_MARGIN = 1.3
+TIME_MARGIN = 1.5
+MIN_MEM_GB = 2
+MAX_MEM_GB = int(os.environ.get("PIPELINE_MAX_MEM_GB", 1024))
+MIN_TIME_S = 30 * 60
+MAX_TIME_S = 7 * 86400
+MIN_CPUS = 2
+
+# Jobs récents utilisés pour corriger le modèle, minimum pour réduire les CPUs
+HISTORY_JOBS = 20
+MIN_JOBS_FOR_CPUS = 3
+
+RETRYABLE_STATES = {"OUT_OF_MEMORY", "TIMEOUT"}
+MAX_ATTEMPTS = 3
+
+_INPUTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_inputs (
+    job_id TEXT PRIMARY KEY,
+    step TEXT NOT NULL,
+    input_bytes REAL,
+    bed_fraction REAL,
+    attempt INTEGER
+)
+"""
+
+
+def open_db(db_path=DB_PATH):
+    conn = connect(db_path)
+    conn.execute(_INPUTS_SCHEMA)
+    return conn
+
+
+def input_bytes(path):
+    """Taille totale d'un fichier, d'un dossier (FASTQ) ou d'une liste "a,b" ; 0 si absent."""
+    if not path:
+        return 0
+    if "," in path and not os.path.exists(path):
+        return sum(input_bytes(p) for p in path.split(","))
+    if os.path.isdir(path):
+        return sum(os.path.getsize(p) for p in glob.glob(os.path.join(path, "**", "*.fastq*"), recursive=True))
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def bed_fraction(bed):
+    """Fraction du génome couverte par le BED (1.0 sans BED)."""
+    if not bed or not os.path.isfile(bed):
+        return 1.0
+    span = 0
+    with open(bed) as f:
+        for line in f:
+            fields = line.split("\t")
+            if len(fields) >= 3 and not line.startswith(("#", "track", "browser")):
+                try:
+                    span += int(fields[2]) - int(fields[1])
+                except ValueError:
+                    continue
+    return min(1.0, max(span / GENOME_SIZE, 0.0)) if span else 1.0
+
+
+def default_prediction(step, size_bytes, fraction):
+    """(mémoire Go, durée h) brutes du modèle par défaut, sans marge."""
+    mem_base, mem_slope, time_base, time_slope = DEFAULT_MODEL[step]
+    size_gb = size_bytes / GB
+    if step in BED_SCALED:
+        size_gb *= fraction
+    return mem_base + mem_slope * size_gb, time_base + time_slope * size_gb
+
+
+def history(conn, step):
+    """Jobs terminés (COMPLETED) de l'étape avec leur taille d'entrée, du plus récent au plus ancien."""
+    inputs = {row["job_id"]: row for row in conn.execute("SELECT * FROM job_inputs WHERE step = ?", (step,))}
+    rows = [r for r in efficiency_rows(conn) if r["step"] == step and r["state"] == "COMPLETED"]
+    rows.reverse()
+    return [(r, inputs.get(r["job_id"])) for r in rows[:HISTORY_JOBS]]
+
+
+def predict(step, size_bytes, fraction, threads, conn=None):
+    """{mem_gb, cpus, time_s, source} pour une entrée de size_bytes octets."""
+    mem_gb, time_h = default_prediction(step, size_bytes, fraction)
+    cpus = threads
+    source = "défaut"
+    if conn is not None:
+        past = history(conn, step)
+        mem_ratios, time_ratios = [], []
+        for row, inp in past:
+            if not inp or not inp["input_bytes"]:
+                continue
+            ref_mem, ref_time = default_prediction(step, inp["input_bytes"], inp["bed_fraction"] or 1.0)
+            if row["max_rss_gb"]:
+                mem_ratios.append(row["max_rss_gb"] / ref_mem)
+            if row["elapsed_h"]:
+                time_ratios.append(row["elapsed_h"] / ref_time)
+        if mem_ratios:
+            mem_gb *= statistics.median(mem_ratios)
+            source = f"mesuré ({len(mem_ratios)} jobs)"
+        if time_ratios:
+            time_h *= statistics.median(time_ratios)
+        efficiencies = [row["cpu_eff"] for row, _ in past if row["cpu_eff"]]
+        if len(efficiencies) >= MIN_JOBS_FOR_CPUS:
+            cpus = math.ceil(threads * min(1.0, statistics.median(efficiencies) * 1.25))
+    return {
+        "mem_gb": int(min(MAX_MEM_GB, max(MIN_MEM_GB, math.ceil(mem_gb * MEM_MARGIN)))),
+        "cpus": max(min(MIN_CPUS, threads), min(cpus, threads)),
+        "time_s": int(min(MAX_TIME_S, max(MIN_TIME_S, math.ceil(time_h * TIME_MARGIN * 60) * 60))),
+        "source": source,
+    }
+
+
+def measured_usage(step, threads, conn):
+    """Ressources d'après les maxima mesurés des jobs terminés de l'étape (sans taille d'entrée) ; None sans historique."""
+    past = [row for row, _ in history(conn, step)]
+    mem = [row["max_rss_gb"] for row in past if row["max_rss_gb"]]
+    elapsed = [row["elapsed_h"] for row in past if row["elapsed_h"]]
+    if not mem or not elapsed:
+        return None
+    return {
+        "mem_gb": int(min(MAX_MEM_GB, max(MIN_MEM_GB, math.ceil(max(mem) * MEM_MARGIN)))),
+        "cpus": threads,
+        "time_s": int(min(MAX_TIME_S, max(MIN_TIME_S, math.ceil(max(elapsed) * TIME_MARGIN * 60) * 60))),
+        "source": f"entrée absente, maxima mesurés ({len(mem)} jobs)",
+    }
+
+
+def predict_input(step, path, upstream, bed, threads):
+    """(prédiction ou None, taille utilisée, taille mesurée) pour l'entrée `path` de l'étape.
+
+    Entrée absente : taille estimée depuis les FASTQ `upstream`, sinon maxima
+    mesurés de l'étape ; None sans aucune de ces informations."""
+    size = recorded = input_bytes(path)
+    fraction = bed_fraction(bed)
+    if not size and step in UPSTREAM_RATIO:
+        size = int(input_bytes(upstream) * UPSTREAM_RATIO[step])
+    try:
+        with closing(open_db()) as conn:
+            prediction = predict(step, size, fraction, threads, conn) if size else measured_usage(step, threads, conn)
+    except Exception as e:
+        print(f"⚠️ Télémétrie illisible ({e}), modèle par défaut", file=sys.stderr)
+        prediction = predict(step, size, fraction, threads) if size else None
+    if prediction is not None and size != recorded:
+        prediction["source"] += f", entrée estimée depuis {upstream}"
+    return prediction, size, recorded
+
+
+def format_time(seconds):
+    """Durée au format SLURM D-HH:MM:SS."""
+    seconds = int(seconds)
+    days, rest = divmod(seconds, 86400)
+    return f"{days}-{rest // 3600:02d}:{rest % 3600 // 60:02d}:{rest % 60:02d}"
+
+
+def parse_time(value):
+    """Durée SLURM (minutes, MM:SS, HH:MM:SS, D-HH[:MM[:SS]]) -> secondes."""
+    days = 0
+    if "-" in value:
+        day_part, value = value.split("-", 1)
+        days = int(day_part)
+        hours, minutes, seconds = ([int(p) for p in value.split(":")] + [0, 0])[:3]
+    else:
+        parts = [int(p) for p in value.split(":")]
+        if len(parts) == 1:
+            parts = [0, parts[0], 0]
+        hours, minutes, seconds = ([0] * (3 - len(parts)) + parts)
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def parse_mem_gb(value):
+    """Mémoire SLURM (nombre + K/M/G/T, mégaoctets sans unité) -> Go."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*", value.upper())
+    if not match:
+        raise ValueError(f"mémoire SLURM illisible : {value}")
+    scale = {"K": 1 / 1024 ** 2, "M": 1 / 1024, "": 1 / 1024, "G": 1, "T": 1024}[match.group(2)]
+    return float(match.group(1)) * scale
+
+
+def record_inputs(conn, job_id, step, size_bytes, fraction, attempt=1):
+    # Taille inconnue (entrée absente à la soumission) : le job ne corrige pas le modèle
+    if not size_bytes:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO job_inputs (job_id, step, input_bytes, bed_fraction, attempt) VALUES (?, ?, ?, ?, ?)",
+        (job_id, step, size_bytes, fraction, attempt),
+    )
+    conn.commit()
+
+
+def _option(args, name):
+    for arg in args:
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def _replace_option(args, name, value):
+    return [f"{name}={value}" if arg.startswith(f"{name}=") else arg for arg in args]
+
+
+def _set_option(args, name, value):
+    """Remplace l'option, ou l'ajoute avant le script si elle est absente."""
+    if _option(args, name) is not None:
+        return _replace_option(args, name, value)
+    script_index = next((i for i, arg in enumerate(args) if not arg.startswith("-")), len(args))
+    return args[:script_index] + [f"{name}={value}"] + args[script_index:]
+
+
+def _script_time(args):
+    """--time par défaut du script sbatch (#SBATCH --time=...), None si absent."""
+    script = next((arg for arg in args if not arg.startswith("-")), None)
+    try:
+        with open(script) as f:
+            for line in f:
+                match = re.match(r"#SBATCH\s+--time=(\S+)", line)
+                if match:
+                    return match.group(1)
+    except (OSError, TypeError):
+        pass
+    return None
+
+
+def _sbatch(args):
+    result = subprocess.run(["sbatch", *args], capture_output=True, text=True)
+    match = re.search(r"Submitted batch job (\d+)", result.stdout)
+    if not match:
+        raise RuntimeError(result.stderr.strip() or "sbatch n'a pas renvoyé d'identifiant")
+    return match.group(1)
+
+
+def arm(job_id, step, sample, sbatch_args, attempt=1, size_bytes=0, fraction=1.0):
+    """Enregistre la taille d'entrée du job et soumet sa sentinelle de relance."""
+    with closing(open_db()) as conn:
+        record_inputs(conn, job_id, step, size_bytes, fraction, attempt)
+    cmd = ["python3", "-m", "scripts.resource_model", "retry", "--job", job_id, "--step", step,
+           "--sample", sample, "--attempt", str(attempt), "--input-bytes", str(size_bytes),
+           "--bed-fraction", str(fraction), "--", *sbatch_args]
+    pipeline_dir = os.environ.get("PIPELINE_DIR", os.getcwd())
+    wrap = f"cd {shlex.quote(os.getcwd())} && PYTHONPATH={shlex.quote(pipeline_dir)} {shlex.join(cmd)}"
+    sentinel_args = [
+        "--export=ALL", f"--dependency=afternotok:{job_id}", "--kill-on-invalid-dep=yes",
+        "--cpus-per-task=1", "--mem=1G", "--time=00:15:00",
+        f"--job-name=retry_step{step}", f"--output=logs/retry_step{step}_%j.out", f"--wrap={wrap}",
+    ]
+    partition = _option(sbatch_args, "--partition")
+    if partition:
+        sentinel_args.insert(1, f"--partition={partition}")
+    return _sbatch(sentinel_args)
+
+
+def job_state(job_id):
+    result = subprocess.run(["sacct", "-n", "-P", "-X", "--format=State", "-j", job_id],
+                            capture_output=True, text=True)
+    states = [line.split()[0] for line in result.stdout.splitlines() if line.strip()]
+    return states[-1] if states else ""
+
+
+def pending_dependents(job_id):
+    """[(job, nom, dépendance)] des jobs en attente qui dépendent de job_id."""
+    result = subprocess.run(["squeue", "-h", "-u", os.environ.get("USER", ""), "-t", "PENDING", "-o", "%i|%j|%E"],
+                            capture_output=True, text=True)
+    dependents = []
+    for line in result.stdout.splitlines():
+        fields = line.split("|", 2)
+        if len(fields) == 3 and re.search(rf":{job_id}(?:\D|$)", fields[2]):
+            dependents.append(tuple(fields))
+    return dependents
+
+
+def retarget(old_id, new_id):
+    """Reporte sur new_id les dépendances des jobs en attente de old_id."""
+    for job, _, dependency in pending_dependents(old_id):
+        cleaned = re.sub(r"\([^)]*\)", "", dependency)
+        updated = re.sub(rf":{old_id}(?=\D|$)", f":{new_id}", cleaned)
+        subprocess.run(["scontrol", "update", f"JobId={job}", f"Dependency={updated}"])
+        print(f"Job {job} : dépendance {cleaned} -> {updated}")
+
+
+def give_up(job_id):
+    """Annule les manifestes en attente du job (l'étape n'a pas produit ses sorties)."""
+    for job, name, _ in pending_dependents(job_id):
+        if name.startswith("manifest_"):
+            subprocess.run(["scancel", job])
+
+
+def retry(job_id, step, sample, sbatch_args, attempt, size_bytes, fraction):
+    state = job_state(job_id)
+    if state not in RETRYABLE_STATES:
+        print(f"Job {job_id} (étape {step}) terminé en {state or 'état inconnu'} : pas de relance automatique")
+        give_up(job_id)
+        return 0
+    if attempt >= MAX_ATTEMPTS:
+        print(f"Job {job_id} (étape {step}) en {state} après {attempt} essais : abandon")
+        give_up(job_id)
+        return 1
+
+    args = [a for a in sbatch_args if not a.startswith("--dependency=")]
+    if state == "OUT_OF_MEMORY":
+        mem_gb = math.ceil(parse_mem_gb(_option(args, "--mem") or "64G"))
+        args = _set_option(args, "--mem", f"{min(MAX_MEM_GB, mem_gb * 2)}G")
+    else:
+        # Sans --time (repli de predict_resources), la limite est celle du script sbatch
+        time_s = parse_time(_option(args, "--time") or _script_time(args) or "04:00:00")
+        args = _set_option(args, "--time", format_time(min(MAX_TIME_S, time_s * 2)))
+
+    new_id = _sbatch(args)
+    print(f"Job {job_id} (étape {step}) en {state} : relance {attempt + 1}/{MAX_ATTEMPTS} - Job ID : {new_id} "
+          f"(--mem={_option(args, '--mem')} --time={_option(args, '--time')})")
+    os.makedirs(os.path.join("results", sample), exist_ok=True)
+    with open(os.path.join("results", sample, "jobs.tsv"), "a") as f:
+        f.write(f"{time.strftime('%Y-%m-%dT%H:%M:%S')}\t{step}\t{new_id}\n")
+    retarget(job_id, new_id)
+    arm(new_id, step, sample, args, attempt + 1, size_bytes, fraction)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ressources SLURM prédites et relance après OOM / TIMEOUT")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_predict = sub.add_parser("predict", help="Affiche MEM CPUS TIME OCTETS FRACTION_BED")
+    p_predict.add_argument("--step", required=True, choices=sorted(DEFAULT_MODEL))
+    p_predict.add_argument("--input", default="")
+    p_predict.add_argument("--upstream", default="", help="FASTQ de l'échantillon, si l'entrée n'existe pas encore")
+    p_predict.add_argument("--bed", default="")
+    p_predict.add_argument("--threads", type=int, default=16)
+
+    for name in ("arm", "retry"):
+        p = sub.add_parser(name)
+        p.add_argument("--job", required=True)
+        p.add_argument("--step", required=True)
+        p.add_argument("--sample", required=True)
+        p.add_argument("--attempt", type=int, default=1)
+        p.add_argument("--input-bytes", type=float, default=0)
+        p.add_argument("--bed-fraction", type=float, default=1.0)
+        p.add_argument("sbatch_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == "predict":
+        prediction, size, recorded = predict_input(args.step, args.input, args.upstream, args.bed, args.threads)
+        if prediction is None:
+            # Ni entrée, ni FASTQ, ni historique : le modèle à 0 octet sous-estimerait
+            print(f"   ➤ Ressources étape {args.step} : entrée absente, valeurs fixes", file=sys.stderr)
+            return 0
+        # Seule une taille mesurée est enregistrée (job_inputs) pour corriger le modèle
+        print(f"{prediction['mem_gb']}G {prediction['cpus']} {format_time(prediction['time_s'])} "
+              f"{recorded} {bed_fraction(args.bed):.6f}")
+        print(f"   ➤ Ressources étape {args.step} : {prediction['mem_gb']} Go, {prediction['cpus']} CPUs, "
+              f"{format_time(prediction['time_s'])} (entrée {size / GB:.1f} Go, {prediction['source']})",
+              file=sys.stderr)
+        return 0
+
+    sbatch_args = args.sbatch_args[1:] if args.sbatch_args[:1] == ["--"] else args.sbatch_args
+    try:
+        if args.command == "arm":
+            arm(args.job, args.step, args.sample, sbatch_args, args.attempt, args.input_bytes, args.bed_fraction)
+            return 0
+        return retry(args.job, args.step, args.sample, sbatch_args, args.attempt,
+                     args.input_bytes, args.bed_fraction)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"⚠️ Relance automatique indisponible pour le job {args.job} : {e}", file=sys.stderr)
+        if args.command == "retry":
+            # Sans relance, le manifeste en attente (soumis sans --kill-on-invalid-dep) resterait PENDING
+            try:
+                give_up(args.job)
+            except OSError:
+                pass
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
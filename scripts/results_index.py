@@ -0,0 +1,185 @@
+"""Index persistant et incrémental des fichiers de résultats d'un échantillon.
+
+L'arborescence results/<sample> est décrite dossier par dossier. Un dossier
+n'est relisté que si son mtime a changé : les milliers de fichiers temporaires
+de Clair3 ou cuteSV ne sont donc plus parcourus à chaque rerun de l'interface.
+"""
+import fnmatch
+import json
+import os
+import threading
+import time
+
+# Dossier de cache local (relatif au répertoire du pipeline, comme results/)
+CACHE_DIR = os.environ.get("PIPELINE_CACHE_DIR", ".cache")
+INDEX_VERSION = 1
+
+# Délai minimal entre deux rafraîchissements d'un même index (secondes)
+MIN_REFRESH_INTERVAL = 10.0
+
+# Les fichiers modifiés depuis moins de RECENT_WINDOW secondes sont re-stat
+# même si leur dossier n'a pas changé (BAM ou VCF en cours d'écriture)
+RECENT_WINDOW = 600
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+def _list_dir(path, skip_hidden=True):
+    """Liste un dossier avec scandir : sous-dossiers et fichiers (taille, mtime)."""
+    dirs = []
+    files = {}
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if skip_hidden and entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                    else:
+                        st = entry.stat()
+                        files[entry.name] = [st.st_size, st.st_mtime]
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return {"dirs": sorted(dirs), "files": files}
+
+
+def scan_tree(root, previous=None, skip_hidden=True):
+    """Parcourt `root` en ne relistant que les dossiers dont le mtime a changé.
+
+    Retourne (tree, nb_dossiers_relistés) où tree associe à chaque chemin de
+    dossier relatif ("" pour la racine) {"mtime", "dirs", "files"}.
+    """
+    previous = previous or {}
+    tree = {}
+    rescanned = 0
+    now = time.time()
+    stack = [""]
+
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(root, rel) if rel else root
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+
+        old = previous.get(rel)
+        if old is not None and old.get("mtime") == dir_mtime:
+            entry = old
+            # Rafraîchir uniquement les fichiers encore en cours d'écriture
+            for name, (size, mtime) in list(entry["files"].items()):
+                if now - mtime < RECENT_WINDOW:
+                    try:
+                        st = os.stat(os.path.join(path, name))
+                        entry["files"][name] = [st.st_size, st.st_mtime]
+                    except OSError:
+                        entry["files"].pop(name, None)
+        else:
+            # mtime lu avant le listing : une modification concurrente forcera un relisting
+            entry = _list_dir(path, skip_hidden)
+            entry["mtime"] = dir_mtime
+            rescanned += 1
+
+        tree[rel] = entry
+        for name in entry["dirs"]:
+            stack.append(os.path.join(rel, name) if rel else name)
+
+    return tree, rescanned
+
+
+def _index_path(sample_dir):
+    sample = os.path.basename(os.path.normpath(str(sample_dir)))
+    return os.path.join(CACHE_DIR, "results_index", f"{sample}.json")
+
+
+def _read_index(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            return data
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_index(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_index(sample_dir, force=False):
+    """Retourne l'index à jour de `sample_dir` (mémoire, puis disque, puis scan incrémental).
+
+    force=True ignore les caches et relance un parcours complet.
+    """
+    sample_dir = str(sample_dir)
+    with _lock:
+        cached = _memory_cache.get(sample_dir)
+        if (not force and cached is not None
+                and time.time() - cached["refreshed_at"] < MIN_REFRESH_INTERVAL):
+            return cached
+
+        index_path = _index_path(sample_dir)
+        if cached is None and not force:
+            cached = _read_index(index_path)
+        previous = None if force or cached is None else cached["tree"]
+
+        tree, rescanned = scan_tree(sample_dir, previous)
+        index = {
+            "version": INDEX_VERSION,
+            "root": sample_dir,
+            "refreshed_at": time.time(),
+            "rescanned": rescanned,
+            "tree": tree,
+        }
+        if rescanned or cached is None:
+            try:
+                _write_index(index_path, index)
+            except OSError:
+                pass
+        _memory_cache[sample_dir] = index
+        return index
+
+
+def list_dir(index, subdir):
+    """Retourne (sous-dossiers, fichiers) d'un dossier indexé, ou None s'il n'existe pas."""
+    entry = index["tree"].get(subdir)
+    if entry is None:
+        return None
+    return entry["dirs"], entry["files"]
+
+
+def step_status(index, steps_info):
+    """Fichiers trouvés pour chaque étape de steps_info (même logique que exists() + glob())."""
+    status = {}
+    for step_name, step_info in steps_info.items():
+        files_found = []
+        listing = list_dir(index, step_info["path"])
+        if listing is not None:
+            dirs, files = listing
+            names = list(files) + dirs
+            for file_pattern in step_info["files"]:
+                if file_pattern in files or file_pattern in dirs:
+                    files_found.append(file_pattern)
+                else:
+                    files_found.extend(sorted(fnmatch.filter(names, file_pattern)))
+        status[step_name] = files_found
+    return status
+
+
+def find_files(index, pattern):
+    """Équivalent de rglob(pattern) sur les fichiers : liste de (chemin relatif, taille, mtime)."""
+    matches = []
+    for rel, entry in index["tree"].items():
+        for name in fnmatch.filter(entry["files"], pattern):
+            size, mtime = entry["files"][name]
+            matches.append((os.path.join(rel, name) if rel else name, size, mtime))
+    return sorted(matches)
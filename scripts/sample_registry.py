@@ -0,0 +1,441 @@
+"""Registre des échantillons : une base SQLite transactionnelle (results/samples.sqlite).
+
+Chaque échantillon y a ses paramètres (ceux de config_<sample>.txt), les jobs
+soumis par étape, l'état de chaque étape et ses fichiers de sortie. La base est
+écrite par run_pipeline.sh (via la ligne de commande ci-dessous), par
+sample_sheet.py et par l'interface ; les écritures concurrentes sont
+sérialisées par SQLite (mode WAL, BEGIN IMMEDIATE).
+
+results/<sample>/config_<sample>.txt reste produit à chaque modification des
+paramètres (`export`), au format key=value sourcé par run_pipeline.sh et les
+scripts sbatch. Des scripts y ajoutent encore des clés directement (bam_file=
+de l'alignement, cnv_bam=, vcf_file=...) : le fichier étant toujours au moins
+aussi récent que le registre, ses clés sont relues et fusionnées avant chaque
+fusion de paramètres et à chaque lecture, pour ne pas les effacer au prochain
+export. Les configs et journaux jobs.tsv antérieurs au registre sont importés
+par `import`.
+
+États d'étape : SUBMITTED à la soumission, COMPLETED quand le manifeste de
+l'étape est enregistré, sinon l'état sacct du dernier job lu dans la base de
+télémétrie (`sync`).
+
+Usage :
+    python3 -m scripts.sample_registry set --sample S reference=hg38.fa threads=16
+    python3 -m scripts.sample_registry import [--config results/S/config_S.txt]
+    printf 'S\\t2\\t1234\\n' | python3 -m scripts.sample_registry record-jobs
+    python3 -m scripts.sample_registry step --sample S --step 2 --state COMPLETED --job 1234
+    python3 -m scripts.sample_registry sync
+    python3 -m scripts.sample_registry list [--status échec] [--reference hg38.fa] [--since 2024-01-01]
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing, contextmanager
+
+from scripts.step_manifest import STEP_OUTPUTS
+from scripts.telemetry import DB_PATH as TELEMETRY_DB, TERMINAL_STATES
+
+DB_PATH = os.environ.get("PIPELINE_SAMPLE_REGISTRY", os.path.join("results", "samples.sqlite"))
+
+# Statut global d'un échantillon, déduit des états de ses étapes
+SAMPLE_STATUSES = ("configuré", "en cours", "échec", "terminé")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    sample TEXT PRIMARY KEY,
+    reference TEXT,
+    partition TEXT,
+    threads INTEGER,
+    params TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_reference ON samples (reference);
+CREATE INDEX IF NOT EXISTS samples_updated_at ON samples (updated_at);
+CREATE TABLE IF NOT EXISTS jobs (
+    sample TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    step TEXT NOT NULL,
+    submitted_at TEXT NOT NULL,
+    PRIMARY KEY (sample, job_id)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    sample TEXT NOT NULL,
+    step TEXT NOT NULL,
+    state TEXT NOT NULL,
+    job_id TEXT,
+    outputs TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (sample, step)
+);
+CREATE INDEX IF NOT EXISTS steps_state ON steps (state);
+"""
+
+
+def connect(db_path=DB_PATH):
+    """Ouvre (et crée si besoin) le registre."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+@contextmanager
+def _transaction(conn):
+    # Verrou d'écriture pris dès le début : lecture puis écriture sans course avec un autre processus
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def config_path(sample, results_dir="results"):
+    return os.path.join(results_dir, sample, f"config_{sample}.txt")
+
+
+def read_config_file(path):
+    """Paramètres d'un config_<sample>.txt (key=value, dans l'ordre du fichier)."""
+    params = {}
+    with open(path) as f:
+        for line in f:
+            if "=" in line:
+                key, value = line.strip().split("=", 1)
+                params[key] = value
+    return params
+
+
+def write_config_file(sample, params, results_dir="results"):
+    """Écrit config_<sample>.txt (remplacement atomique) ; retourne son chemin."""
+    path = config_path(sample, results_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        for key, value in params.items():
+            f.write(f"{key}={value}\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _threads(params):
+    try:
+        return int(params.get("threads", ""))
+    except ValueError:
+        return None
+
+
+def _file_params(sample):
+    """Paramètres de config_<sample>.txt, {} s'il n'existe pas."""
+    try:
+        return read_config_file(config_path(sample))
+    except OSError:
+        return {}
+
+
+def _initial_params(sample):
+    """Paramètres d'un échantillon absent du registre : sa config antérieure si elle existe."""
+    return _file_params(sample) or {"sample_name": sample}
+
+
+def _ensure_sample(conn, sample, now):
+    if conn.execute("SELECT 1 FROM samples WHERE sample = ?", (sample,)).fetchone():
+        return
+    params = _initial_params(sample)
+    conn.execute(
+        "INSERT INTO samples (sample, reference, partition, threads, params, created_at, updated_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (sample, params.get("reference"), params.get("partition"), _threads(params),
+         json.dumps(params, ensure_ascii=False), now, now),
+    )
+
+
+def set_params(conn, sample, params, replace=False):
+    """Enregistre les paramètres (fusionnés avec les existants, sauf replace=True) ; retourne le résultat."""
+    now = _now()
+    with _transaction(conn):
+        row = conn.execute("SELECT params FROM samples WHERE sample = ?", (sample,)).fetchone()
+        if replace:
+            merged = {}
+        else:
+            # Clés ajoutées au fichier hors du registre (sed/echo des scripts) conservées
+            merged = json.loads(row["params"]) if row else {}
+            merged.update(_file_params(sample))
+        merged.setdefault("sample_name", sample)
+        merged.update({key: str(value) for key, value in params.items()})
+        conn.execute(
+            "INSERT INTO samples (sample, reference, partition, threads, params, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (sample) DO UPDATE SET reference = excluded.reference, partition = excluded.partition,"
+            " threads = excluded.threads, params = excluded.params, updated_at = excluded.updated_at",
+            (sample, merged.get("reference"), merged.get("partition"), _threads(merged),
+             json.dumps(merged, ensure_ascii=False), now, now),
+        )
+    return merged
+
+
+def get_params(conn, sample):
+    """Paramètres de l'échantillon (clés ajoutées au fichier comprises), None s'il n'est pas enregistré."""
+    row = conn.execute("SELECT params FROM samples WHERE sample = ?", (sample,)).fetchone()
+    if not row:
+        return None
+    params = json.loads(row["params"])
+    params.update(_file_params(sample))
+    return params
+
+
+def save_config(conn, sample, params, replace=False, results_dir="results"):
+    """Paramètres enregistrés puis exportés vers config_<sample>.txt."""
+    merged = set_params(conn, sample, params, replace)
+    write_config_file(sample, merged, results_dir)
+    return merged
+
+
+def import_config(conn, path):
+    """Importe un config_<sample>.txt (écrit par run_pipeline.sh ou une version antérieure)."""
+    params = read_config_file(path)
+    sample = params.get("sample_name") or os.path.basename(path)[len("config_"):-len(".txt")]
+    set_params(conn, sample, params, replace=True)
+    return sample
+
+
+def import_ledger(conn, sample, path):
+    """Jobs de results/<sample>/jobs.tsv absents du registre (date, étape, job)."""
+    rows = []
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) == 3:
+                    rows.append((sample, fields[1], fields[2], fields[0]))
+    except OSError:
+        return 0
+    return record_jobs(conn, rows)
+
+
+def import_legacy(conn, results_dir="results"):
+    """Importe les échantillons de results/ non encore enregistrés ; retourne leur nombre."""
+    known = {row["sample"] for row in conn.execute("SELECT sample FROM samples")}
+    imported = 0
+    for path in sorted(glob.glob(os.path.join(results_dir, "*", "config_*.txt"))):
+        sample = os.path.basename(os.path.dirname(path))
+        if sample in known or os.path.basename(path) != f"config_{sample}.txt":
+            continue
+        import_config(conn, path)
+        import_ledger(conn, sample, os.path.join(results_dir, sample, "jobs.tsv"))
+        imported += 1
+    return imported
+
+
+def record_jobs(conn, rows):
+    """Enregistre des soumissions [(sample, étape, job[, date])] ; l'étape passe à SUBMITTED."""
+    count = 0
+    with _transaction(conn):
+        for row in rows:
+            sample, step, job_id = row[:3]
+            submitted_at = row[3] if len(row) > 3 else _now()
+            _ensure_sample(conn, sample, submitted_at)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (sample, job_id, step, submitted_at) VALUES (?, ?, ?, ?)",
+                (sample, job_id, str(step), submitted_at),
+            )
+            if not cursor.rowcount:
+                continue
+            count += 1
+            # Seule la soumission la plus récente détermine l'état de l'étape
+            conn.execute(
+                "INSERT INTO steps (sample, step, state, job_id, updated_at) VALUES (?, ?, 'SUBMITTED', ?, ?)"
+                " ON CONFLICT (sample, step) DO UPDATE SET state = 'SUBMITTED', job_id = excluded.job_id,"
+                " outputs = NULL, updated_at = excluded.updated_at WHERE excluded.updated_at >= steps.updated_at",
+                (sample, str(step), job_id, submitted_at),
+            )
+    return count
+
+
+def step_outputs(sample, step, results_dir="results"):
+    """Fichiers de sortie présents de l'étape (motifs de step_manifest.STEP_OUTPUTS)."""
+    base = os.path.join(results_dir, sample)
+    outputs = []
+    for pattern in STEP_OUTPUTS.get(int(step), []):
+        outputs.extend(sorted(glob.glob(os.path.join(base, pattern.format(sample=sample)))))
+    return outputs
+
+
+def set_step_state(conn, sample, step, state, job_id=None, outputs=None):
+    """État d'une étape ; pour COMPLETED, les sorties sont relevées si elles ne sont pas fournies."""
+    if state == "COMPLETED" and outputs is None:
+        outputs = step_outputs(sample, step)
+    now = _now()
+    with _transaction(conn):
+        _ensure_sample(conn, sample, now)
+        conn.execute(
+            "INSERT INTO steps (sample, step, state, job_id, outputs, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (sample, step) DO UPDATE SET state = excluded.state,"
+            " job_id = COALESCE(excluded.job_id, steps.job_id), outputs = excluded.outputs,"
+            " updated_at = excluded.updated_at",
+            (sample, str(step), state, job_id, json.dumps(outputs) if outputs is not None else None, now),
+        )
+
+
+def sync_telemetry(conn, telemetry_db=TELEMETRY_DB):
+    """Reporte l'état sacct (base de télémétrie) du dernier job des étapes non terminées."""
+    if not os.path.exists(telemetry_db):
+        return 0
+    pending = conn.execute("SELECT sample, step, state, job_id FROM steps WHERE state != 'COMPLETED'").fetchall()
+    if not pending:
+        return 0
+    with closing(sqlite3.connect(telemetry_db, timeout=30)) as tconn:
+        states = dict(tconn.execute("SELECT job_id, state FROM jobs WHERE state IS NOT NULL"))
+    updated = 0
+    for row in pending:
+        state = states.get(row["job_id"])
+        if not state or state == row["state"]:
+            continue
+        # Job terminé sans manifeste (commit annulé ou antérieur au registre) : sorties relevées
+        set_step_state(conn, row["sample"], row["step"], state)
+        updated += 1
+    return updated
+
+
+def sample_status(step_states):
+    """Statut global (SAMPLE_STATUSES) d'après les états des étapes."""
+    states = list(step_states.values())
+    if not states:
+        return "configuré"
+    if any(s not in TERMINAL_STATES for s in states):
+        return "en cours"
+    if any(s != "COMPLETED" for s in states):
+        return "échec"
+    return "terminé"
+
+
+def list_samples(conn, status=None, reference=None, since=None):
+    """Échantillons (paramètres principaux, états des étapes, statut), filtrés, triés par nom."""
+    query = "SELECT sample, reference, partition, threads, created_at, updated_at FROM samples WHERE 1 = 1"
+    params = []
+    if reference:
+        query += " AND reference = ?"
+        params.append(reference)
+    if since:
+        query += " AND updated_at >= ?"
+        params.append(since)
+    steps = {}
+    for row in conn.execute("SELECT sample, step, state FROM steps ORDER BY step"):
+        steps.setdefault(row["sample"], {})[row["step"]] = row["state"]
+    rows = []
+    for row in conn.execute(query + " ORDER BY sample", params):
+        sample_steps = steps.get(row["sample"], {})
+        entry = {**dict(row), "steps": sample_steps, "status": sample_status(sample_steps)}
+        if status and entry["status"] != status:
+            continue
+        rows.append(entry)
+    return rows
+
+
+def sample_jobs(conn, sample):
+    return [dict(row) for row in conn.execute(
+        "SELECT job_id, step, submitted_at FROM jobs WHERE sample = ? ORDER BY submitted_at, job_id", (sample,))]
+
+
+def sample_steps(conn, sample):
+    """{étape: {state, job_id, outputs, updated_at}}."""
+    return {
+        row["step"]: {"state": row["state"], "job_id": row["job_id"], "updated_at": row["updated_at"],
+                      "outputs": json.loads(row["outputs"]) if row["outputs"] else []}
+        for row in conn.execute("SELECT * FROM steps WHERE sample = ? ORDER BY step", (sample,))
+    }
+
+
+def _pairs(values):
+    result = {}
+    for item in values:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"clé=valeur attendu : {item}")
+        result[key] = value
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registre des échantillons (results/samples.sqlite)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_set = sub.add_parser("set", help="Enregistre des paramètres et exporte config_<sample>.txt")
+    p_set.add_argument("--sample", required=True)
+    p_set.add_argument("--replace", action="store_true", help="Remplace tous les paramètres")
+    p_set.add_argument("params", nargs="*", help="clé=valeur")
+
+    p_get = sub.add_parser("get", help="Paramètres au format key=value")
+    p_get.add_argument("--sample", required=True)
+
+    p_export = sub.add_parser("export", help="Réécrit config_<sample>.txt depuis le registre")
+    p_export.add_argument("--sample", required=True)
+
+    p_import = sub.add_parser("import", help="Importe des configs (par défaut celles de results/ non enregistrées)")
+    p_import.add_argument("--config", action="append", help="config_<sample>.txt à importer (répétable)")
+
+    sub.add_parser("record-jobs", help="Soumissions lues sur l'entrée standard : sample<TAB>étape<TAB>job")
+
+    p_step = sub.add_parser("step", help="État d'une étape")
+    p_step.add_argument("--sample", required=True)
+    p_step.add_argument("--step", required=True)
+    p_step.add_argument("--state", required=True)
+    p_step.add_argument("--job")
+
+    sub.add_parser("sync", help="États sacct (télémétrie) des étapes non terminées")
+
+    p_list = sub.add_parser("list", help="Échantillons enregistrés (TSV)")
+    p_list.add_argument("--status", choices=SAMPLE_STATUSES)
+    p_list.add_argument("--reference")
+    p_list.add_argument("--since", help="Modifiés depuis (AAAA-MM-JJ)")
+    args = parser.parse_args(argv)
+
+    with closing(connect()) as conn:
+        if args.command == "set":
+            save_config(conn, args.sample, _pairs(args.params), replace=args.replace)
+        elif args.command in ("get", "export"):
+            params = get_params(conn, args.sample)
+            if params is None:
+                print(f"Échantillon inconnu du registre : {args.sample}", file=sys.stderr)
+                return 1
+            if args.command == "export":
+                print(write_config_file(args.sample, params))
+            else:
+                for key, value in params.items():
+                    print(f"{key}={value}")
+        elif args.command == "import":
+            if args.config:
+                for path in args.config:
+                    import_config(conn, path)
+                print(f"{len(args.config)} config(s) importée(s)")
+            else:
+                print(f"{import_legacy(conn)} échantillon(s) importé(s)")
+        elif args.command == "record-jobs":
+            rows = [line.rstrip("\n").split("\t") for line in sys.stdin if line.strip()]
+            record_jobs(conn, [r for r in rows if len(r) == 3 and all(r)])
+        elif args.command == "step":
+            set_step_state(conn, args.sample, args.step, args.state, args.job)
+        elif args.command == "sync":
+            print(f"{sync_telemetry(conn)} étape(s) mise(s) à jour")
+        else:
+            print("\t".join(["sample", "status", "reference", "threads", "updated_at", "steps"]))
+            for row in list_samples(conn, args.status, args.reference, args.since):
+                steps = ",".join(f"{step}:{state}" for step, state in row["steps"].items())
+                print("\t".join(str(v if v is not None else "") for v in (
+                    row["sample"], row["status"], row["reference"], row["threads"], row["updated_at"], steps)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""Lancement multi-échantillons à partir d'une feuille d'échantillons (sample sheet).
+
+La feuille est un TSV, une ligne par échantillon (en-tête et lignes "#" ignorés) :
+
+    sample    input                      bed               phasing
+    P01       /data/run1/P01/fastq_pass  panels/hema.bed   yes
+    P02       /data/run1/P02.bam                           no
+
+`input` est un dossier ou fichier FASTQ (alignement à faire) ou un BAM déjà
+aligné ; `bed` et `phasing` sont optionnels.
+
+`prepare` écrit dans le dossier du lot un fichier de tâches par étape
+(step<N>.tasks) : la ligne i contient le script sbatch et ses arguments pour le
+i-ème échantillon, "-" si l'échantillon n'a rien à faire pour cette étape (BAM
+fourni à l'alignement). Toutes les étapes ont ainsi les mêmes indices, ce qui
+permet de chaîner les job arrays avec --dependency=aftercorr (la tâche i d'une
+étape attend seulement la tâche i de l'étape amont).
+
+`prepare` écrit aussi resources.tsv : mémoire et durée de chaque étape,
+prédites par scripts/resource_model.py pour le plus gros échantillon du lot.
+
+`status` croise les états sacct des tâches avec la présence des sorties pour
+produire la matrice échantillon × étape affichée par l'interface.
+
+Usage (depuis run_pipeline.sh) :
+    python3 -m scripts.sample_sheet prepare --sheet lot.tsv --reference hg38.fa \\
+        --partition bigmem --threads 16 --batch-dir results/batches/lot 1 2 3 4 6 7
+    python3 -m scripts.sample_sheet status --batch-dir results/batches/lot
+"""
+import argparse
+import glob
+import os
+import re
+import subprocess
+import sys
+from contextlib import closing
+
+from scripts.executor import is_local_job, sacct_rows
+from scripts import resource_model, sample_registry
+from scripts.step_manifest import STEP_NAMES, STEP_OUTPUTS, STEP_SCRIPTS
+
+BATCHES_DIR = os.path.join("results", "batches")
+
+SAMPLE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+YES = {"yes", "y", "o", "oui", "true", "1"}
+
+# Étapes disponibles en mode lot (la méthylation demande un BAM modifié par échantillon)
+ARRAY_STEPS = ("1", "2", "3", "4", "6", "7")
+
+
+class SampleSheetError(ValueError):
+    pass
+
+
+def read_sheet(path):
+    """Liste de {sample, input, bed, phasing} ; lève SampleSheetError si la feuille est invalide."""
+    samples = []
+    errors = []
+    with open(path) as f:
+        first = True
+        for lineno, line in enumerate(f, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = [v.strip() for v in line.rstrip("\n").split("\t")]
+            # En-tête : première ligne hors commentaires
+            if first and fields[0].lower() in ("sample", "sample_name", "echantillon"):
+                first = False
+                continue
+            first = False
+            fields += [""] * (4 - len(fields))
+            name, input_path, bed, phasing = fields[:4]
+            if not SAMPLE_NAME.match(name):
+                errors.append(f"ligne {lineno} : nom d'échantillon invalide « {name} »")
+                continue
+            if any(s["sample"] == name for s in samples):
+                errors.append(f"ligne {lineno} : échantillon {name} en double")
+                continue
+            if not input_path or not os.path.exists(input_path):
+                errors.append(f"ligne {lineno} : entrée introuvable pour {name} : {input_path}")
+            if bed and not os.path.isfile(bed):
+                errors.append(f"ligne {lineno} : BED introuvable pour {name} : {bed}")
+            samples.append({
+                "sample": name,
+                "input": input_path,
+                "bed": bed,
+                "phasing": "yes" if phasing.lower() in YES else "no",
+            })
+    if errors:
+        raise SampleSheetError("\n".join(errors))
+    if not samples:
+        raise SampleSheetError(f"aucun échantillon dans {path}")
+    return samples
+
+
+def sample_paths(entry):
+    """(FASTQ à aligner ou None, BAM utilisé par les étapes suivantes)."""
+    sample = entry["sample"]
+    if entry["input"].endswith(".bam"):
+        return None, entry["input"]
+    return entry["input"], f"results/{sample}/mapping/{sample}.bam"
+
+
+def task_args(step, entry, reference, threads):
+    """Arguments de la tâche d'un échantillon, dans l'ordre attendu par le script sbatch de l'étape."""
+    sample, bed = entry["sample"], entry["bed"]
+    fastq, bam = sample_paths(entry)
+    threads = str(threads)
+    if step == "1":
+        return [sample, threads, fastq, reference] if fastq else None
+    if step == "2":
+        return [sample, bam, reference, threads, bed, entry["phasing"]]
+    if step == "3":
+        return [sample, bam, reference, threads, bed]
+    if step == "4":
+        return [sample, reference, threads, bed, bam]
+    if step == "6":
+        return [sample, bam, threads, reference, bed]
+    if step == "7":
+        return [sample, f"results/{sample}/snps_clair3/merge_output.vcf.gz", threads, reference]
+    raise SampleSheetError(f"étape {step} non disponible en mode lot")
+
+
+def step_resources(step, samples, threads):
+    """(mémoire, durée SLURM) d'une tâche de l'étape (scripts/resource_model.py) ; None sans prédiction.
+
+    Toutes les tâches d'un job array ont les mêmes ressources : celles du plus
+    gros échantillon du lot."""
+    mem_gb = time_s = 0
+    for entry in samples:
+        fastq, bam = sample_paths(entry)
+        if step == "1" and not fastq:
+            continue
+        path = {"1": fastq, "7": f"results/{entry['sample']}/snps_clair3/merge_output.vcf.gz"}.get(step, bam)
+        prediction = resource_model.predict_input(step, path, fastq, entry["bed"], int(threads))[0]
+        if prediction is None:
+            return None
+        mem_gb = max(mem_gb, prediction["mem_gb"])
+        time_s = max(time_s, prediction["time_s"])
+    if not mem_gb:
+        return None
+    return f"{mem_gb}G", resource_model.format_time(time_s)
+
+
+def write_sample_config(conn, entry, reference, partition, threads):
+    """Paramètres de l'échantillon dans le registre, exportés au format de run_pipeline.sh."""
+    sample = entry["sample"]
+    fastq, bam = sample_paths(entry)
+    params = {
+        "sample_name": sample,
+        "reference": reference,
+        "partition": partition,
+        "threads": threads,
+        "bed_file": entry["bed"],
+        "do_phasing": entry["phasing"],
+        "bam_file": bam,
+    }
+    if fastq:
+        params["fastq_dir" if os.path.isdir(fastq) else "fastq_files"] = fastq
+    sample_registry.save_config(conn, sample, params, replace=True)
+
+
+def prepare(sheet, steps, batch_dir, reference, partition, threads):
+    """Écrit samples.tsv et step<N>.tasks dans batch_dir ; retourne le nombre d'échantillons."""
+    unsupported = [s for s in steps if s not in ARRAY_STEPS]
+    if unsupported:
+        raise SampleSheetError(f"étape(s) non disponible(s) en mode lot : {' '.join(unsupported)}")
+    samples = read_sheet(sheet)
+    if "1" not in steps:
+        missing = [e["sample"] for e in samples if not os.path.isfile(sample_paths(e)[1])]
+        if missing:
+            raise SampleSheetError(f"BAM absent sans étape d'alignement : {', '.join(missing)}")
+
+    os.makedirs(batch_dir, exist_ok=True)
+    with open(os.path.join(batch_dir, "samples.tsv"), "w") as f:
+        for i, entry in enumerate(samples, 1):
+            f.write(f"{i}\t{entry['sample']}\n")
+    for step in steps:
+        with open(os.path.join(batch_dir, f"step{step}.tasks"), "w") as f:
+            for entry in samples:
+                args = task_args(step, entry, reference, threads)
+                f.write("\t".join([STEP_SCRIPTS[int(step)], *args]) + "\n" if args else "-\n")
+    # Ressources des job arrays (étape absente : valeurs fixes de run_pipeline.sh)
+    with open(os.path.join(batch_dir, "resources.tsv"), "w") as f:
+        for step in steps:
+            resources = step_resources(step, samples, threads)
+            if resources:
+                f.write(f"{step}\t{resources[0]}\t{resources[1]}\n")
+    with closing(sample_registry.connect()) as conn:
+        for entry in samples:
+            write_sample_config(conn, entry, reference, partition, threads)
+    return len(samples)
+
+
+def read_batch(batch_dir):
+    """(échantillons dans l'ordre des indices, {étape: job array})."""
+    with open(os.path.join(batch_dir, "samples.tsv")) as f:
+        samples = [line.rstrip("\n").split("\t")[1] for line in f if line.strip()]
+    jobs = {}
+    jobs_path = os.path.join(batch_dir, "jobs.tsv")
+    if os.path.exists(jobs_path):
+        with open(jobs_path) as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) >= 3:
+                    jobs[fields[1]] = fields[2]
+    return samples, jobs
+
+
+def list_batches(results_dir="results"):
+    """Dossiers de lots, du plus récent au plus ancien."""
+    paths = glob.glob(os.path.join(results_dir, "batches", "*", "samples.tsv"))
+    return [os.path.dirname(p) for p in sorted(paths, key=os.path.getmtime, reverse=True)]
+
+
+def _expand_indices(spec):
+    """"1-3,7%2" -> [1, 2, 3, 7]."""
+    indices = []
+    for part in spec.split("%")[0].split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            indices.extend(range(int(start), int(end) + 1))
+        elif part:
+            indices.append(int(part))
+    return indices
+
+
+def array_states(job_ids):
+    """{(job array, indice): état} d'après sacct (pool local : executor) ; vide si sacct est indisponible."""
+    lines = [f"{row['JobID']}|{row['State']}" for row in sacct_rows([j for j in job_ids if is_local_job(j)])]
+    job_ids = [j for j in job_ids if not is_local_job(j)]
+    if job_ids:
+        try:
+            result = subprocess.run(
+                ["sacct", "-n", "-P", "-X", "--format=JobID,State", "-j", ",".join(job_ids)],
+                capture_output=True, text=True, timeout=60,
+            )
+            lines += result.stdout.splitlines()
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    states = {}
+    for line in lines:
+        job, _, state = line.partition("|")
+        state = state.split()[0] if state else ""
+        match = re.match(r"^(\d+)_(\d+)$", job)
+        if match:
+            states[(match.group(1), int(match.group(2)))] = state
+            continue
+        match = re.match(r"^(\d+)_\[(.+)\]$", job)
+        if match:
+            for index in _expand_indices(match.group(2)):
+                states[(match.group(1), index)] = state
+    return states
+
+
+def outputs_done(sample, step):
+    base = os.path.join("results", sample)
+    return all(glob.glob(os.path.join(base, pattern.format(sample=sample))) for pattern in STEP_OUTPUTS[int(step)])
+
+
+def output_matrix(samples, steps=ARRAY_STEPS):
+    """[{sample, <étape>: "COMPLETED" | ""}] d'après la seule présence des sorties."""
+    return [
+        {"sample": sample, **{step: "COMPLETED" if outputs_done(sample, step) else "" for step in steps}}
+        for sample in samples
+    ]
+
+
+def batch_status(batch_dir):
+    """Matrice [{sample, <étape>: état}] d'un lot : état sacct de la tâche, à défaut présence des sorties."""
+    samples, jobs = read_batch(batch_dir)
+    states = array_states(list(jobs.values()))
+    rows = []
+    for index, sample in enumerate(samples, 1):
+        row = {"sample": sample}
+        for step, job in jobs.items():
+            state = states.get((job, index))
+            if state is None:
+                state = "COMPLETED" if outputs_done(sample, step) else "UNKNOWN"
+            row[step] = state
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lancement multi-échantillons (sample sheet)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_prepare = sub.add_parser("prepare", help="Valide la feuille et écrit les fichiers de tâches")
+    p_prepare.add_argument("--sheet", required=True)
+    p_prepare.add_argument("--reference", required=True)
+    p_prepare.add_argument("--partition", default="")
+    p_prepare.add_argument("--threads", default="16")
+    p_prepare.add_argument("--batch-dir", required=True)
+    p_prepare.add_argument("steps", nargs="+")
+
+    p_status = sub.add_parser("status", help="Matrice échantillon × étape d'un lot")
+    p_status.add_argument("--batch-dir", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "prepare":
+        try:
+            n = prepare(args.sheet, args.steps, args.batch_dir, args.reference, args.partition, args.threads)
+        except (OSError, SampleSheetError) as e:
+            print(f"[ERREUR] Feuille d'échantillons invalide :\n{e}", file=sys.stderr)
+            return 1
+        print(n)
+        return 0
+
+    rows = batch_status(args.batch_dir)
+    steps = [k for k in rows[0] if k != "sample"] if rows else []
+    print("\t".join(["sample"] + [STEP_NAMES[int(s)] for s in steps]))
+    for row in rows:
+        print("\t".join([row["sample"]] + [row[s] for s in steps]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Graphe de dépendances des étapes du pipeline, déduit des artefacts consommés et produits.
+
+Chaque étape déclare les artefacts qu'elle lit et ceux qu'elle écrit. Une étape
+sélectionnée dépend uniquement des étapes sélectionnées qui produisent ses
+entrées ; les entrées dont le producteur n'est pas sélectionné doivent déjà
+exister sur disque. run_pipeline.sh soumet donc chaque étape dès que ses
+vraies entrées sont prêtes : CNVkit, SVs, SNPs et QC ne dépendent que du BAM,
+la méthylation ne dépend que du BAM modifié fourni. Si ce BAM modifié est la
+sortie de l'alignement (results/<sample>/mapping/, option --modified-bam), la
+méthylation attend l'alignement, comme les soumissions de run_pipeline.sh.
+
+La durée estimée d'une étape est la médiane des jobs terminés dans la base de
+télémétrie (scripts/telemetry.py), à défaut DEFAULT_HOURS. Le chemin critique
+est le plus long chemin du graphe pondéré par ces durées ; sa longueur est la
+durée totale estimée si le cluster ne fait pas attendre les jobs.
+
+Usage :
+    python3 -m scripts.step_graph plan 1 2 3 4 6 7      # "étape<TAB>dépendances", ordre de soumission
+    python3 -m scripts.step_graph report --sample S 1 2 3 4 6 7
+    python3 -m scripts.step_graph plan --sample S --modified-bam results/S/mapping/S.bam 1 5
+"""
+import argparse
+import os
+import statistics
+import sys
+
+from scripts.telemetry import DB_PATH, STEP_LABELS, connect, efficiency_rows
+
+STEPS = {
+    "1": {"consumes": ["fastq", "reference"], "produces": ["bam"]},
+    "2": {"consumes": ["bam", "reference", "bed"], "produces": ["snv_vcf"]},
+    "3": {"consumes": ["bam", "reference", "bed"], "produces": ["sv_vcf"]},
+    "4": {"consumes": ["bam", "reference", "bed"], "produces": ["cnv_segments"]},
+    "5": {"consumes": ["modified_bam", "reference", "regions"], "produces": ["methylation"]},
+    "6": {"consumes": ["bam", "reference", "bed"], "produces": ["qc_report"]},
+    "7": {"consumes": ["snv_vcf", "reference"], "produces": ["annotation"]},
+}
+
+# Emplacement des artefacts produits par le pipeline (relatif au dossier de travail)
+ARTIFACTS = {
+    "bam": "results/{sample}/mapping/{sample}.bam",
+    "snv_vcf": "results/{sample}/snps_clair3/merge_output.vcf.gz",
+    "sv_vcf": "results/{sample}/svs/final_SVs.vcf",
+    "cnv_segments": "results/{sample}/cnvkit",
+    "methylation": "results/{sample}/methylation",
+    "qc_report": "results/{sample}/qc/multiqc_report.html",
+    "annotation": "results/{sample}/annotation",
+}
+
+# Durées par défaut (heures, échantillon ~30x) tant que la télémétrie est vide
+DEFAULT_HOURS = {"1": 6.0, "2": 4.0, "3": 3.0, "4": 1.5, "5": 2.0, "6": 1.0, "7": 2.0}
+
+
+def producers():
+    """{artefact: étape qui le produit}."""
+    return {artifact: step for step, info in STEPS.items() for artifact in info["produces"]}
+
+
+def aliases(sample, modified_bam):
+    """{artefact consommé: artefact du pipeline qu'il désigne} (BAM modifié issu de l'alignement)."""
+    if sample and modified_bam and os.path.normpath(modified_bam).startswith(
+            os.path.join("results", sample, "mapping") + os.sep):
+        return {"modified_bam": "bam"}
+    return {}
+
+
+def consumed(step, alias=None):
+    return [(alias or {}).get(a, a) for a in STEPS[step]["consumes"]]
+
+
+def dependencies(selected, alias=None):
+    """{étape: [étapes sélectionnées dont elle consomme une sortie]} pour les étapes sélectionnées."""
+    made_by = producers()
+    deps = {}
+    for step in selected:
+        upstream = {made_by[a] for a in consumed(step, alias) if a in made_by}
+        deps[step] = sorted(s for s in upstream if s in selected and s != step)
+    return deps
+
+
+def submission_order(selected, alias=None):
+    """Tri topologique stable (à dépendances égales, ordre numérique des étapes)."""
+    deps = dependencies(selected, alias)
+    order, done = [], set()
+    while len(order) < len(deps):
+        ready = [s for s in sorted(deps, key=int) if s not in done and all(d in done for d in deps[s])]
+        if not ready:
+            raise ValueError("cycle dans le graphe des étapes")
+        order.append(ready[0])
+        done.add(ready[0])
+    return order, deps
+
+
+def estimated_hours(db_path=DB_PATH):
+    """Médiane des durées des jobs COMPLETED par étape, complétée par DEFAULT_HOURS."""
+    hours = dict(DEFAULT_HOURS)
+    if not os.path.exists(db_path):
+        return hours, set()
+    by_step = {}
+    for row in efficiency_rows(connect(db_path)):
+        if row["state"] == "COMPLETED" and row["elapsed_h"]:
+            by_step.setdefault(row["step"], []).append(row["elapsed_h"])
+    for step, values in by_step.items():
+        hours[step] = statistics.median(values)
+    return hours, set(by_step)
+
+
+def critical_path(selected, hours, alias=None):
+    """(chemin critique, {étape: début au plus tôt}, durée totale) en heures."""
+    order, deps = submission_order(selected, alias)
+    start, finish, previous = {}, {}, {}
+    for step in order:
+        start[step] = max((finish[d] for d in deps[step]), default=0.0)
+        previous[step] = max(deps[step], key=lambda d: finish[d], default=None)
+        finish[step] = start[step] + hours[step]
+    if not order:
+        return [], start, 0.0
+    step = max(order, key=lambda s: finish[s])
+    makespan = finish[step]
+    path = []
+    while step is not None:
+        path.append(step)
+        step = previous[step]
+    return path[::-1], start, makespan
+
+
+def external_inputs(selected, sample, alias=None):
+    """Artefacts du pipeline consommés sans que leur producteur soit sélectionné."""
+    made_by = producers()
+    missing = []
+    for step in selected:
+        for artifact in consumed(step, alias):
+            if made_by.get(artifact) not in (None, *selected) and artifact in ARTIFACTS:
+                path = ARTIFACTS[artifact].format(sample=sample)
+                if (artifact, path) not in missing:
+                    missing.append((artifact, path))
+    return missing
+
+
+def report(selected, sample, alias=None):
+    hours, measured = estimated_hours()
+    order, deps = submission_order(selected, alias)
+    path, start, makespan = critical_path(selected, hours, alias)
+    lines = ["📐 Plan de soumission (dépendances réelles entre artefacts) :"]
+    for step in order:
+        after = ", ".join(STEP_LABELS[d] for d in deps[step]) or "immédiat"
+        source = "mesuré" if step in measured else "défaut"
+        lines.append(f"   ➤ {step} {STEP_LABELS[step]:<14} après : {after:<22} "
+                     f"début ≈ +{start[step]:.1f} h, durée ≈ {hours[step]:.1f} h ({source})")
+    lines.append("   Chemin critique : " + " → ".join(f"{STEP_LABELS[s]} ({hours[s]:.1f} h)" for s in path))
+    lines.append(f"   Durée totale estimée : {makespan:.1f} h (hors attente en file SLURM)")
+    for artifact, artifact_path in external_inputs(selected, sample or "<sample>", alias):
+        lines.append(f"   Entrée existante requise ({artifact}) : {artifact_path}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Graphe de dépendances des étapes du pipeline")
+    parser.add_argument("command", choices=("plan", "report"))
+    parser.add_argument("--sample")
+    parser.add_argument("--modified-bam", help="BAM modifié de la méthylation (étape 5)")
+    parser.add_argument("steps", nargs="+")
+    args = parser.parse_args(argv)
+
+    selected = list(dict.fromkeys(args.steps))
+    unknown = [s for s in selected if s not in STEPS]
+    if unknown:
+        print(f"Étape(s) inconnue(s) : {' '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    alias = aliases(args.sample, args.modified_bam)
+    if args.command == "plan":
+        order, deps = submission_order(selected, alias)
+        for step in order:
+            print(f"{step}\t{','.join(deps[step])}")
+        return 0
+
+    print(report(selected, args.sample, alias))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Manifestes d'étape : saut des étapes dont les entrées n'ont pas changé.
+
+Après chaque étape réussie, un manifeste results/<sample>/manifests/step<N>.json
+enregistre l'empreinte de ses entrées (BAM, VCF, référence, BED...), ses
+paramètres, l'empreinte de ses outils et celle de ses sorties. Au lancement
+suivant, run_pipeline.sh appelle `check` : si tout correspond encore, l'étape
+est marquée à jour et n'est pas soumise.
+
+Empreinte d'un fichier : taille + SHA-1 de SAMPLE_BLOCKS blocs de 64 Kio
+répartis régulièrement (début et fin compris), soit ~1 Mio lu même pour un BAM
+de 60 Go. Un dossier (FASTQ) est résumé par la liste de ses fichiers avec
+taille et date de modification.
+
+Les outils sont identifiés par le script sbatch de l'étape et par l'historique
+des environnements conda qu'il active (conda-meta/history change à chaque
+installation ou mise à jour de paquet).
+
+Usage (depuis run_pipeline.sh) :
+    python3 scripts/step_manifest.py check --sample S --step 2 \\
+        --input bam=results/S/mapping/S.bam --input reference=hg38.fa --param phasing=no
+    python3 scripts/step_manifest.py commit --sample S --step 2 --job 1234 [mêmes options]
+    python3 scripts/step_manifest.py status --sample S
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+MANIFEST_VERSION = 1
+
+SAMPLE_BLOCKS = 16
+BLOCK_SIZE = 64 * 1024
+
+PIPELINE_DIR = os.environ.get("PIPELINE_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOME = os.path.expanduser("~")
+
+STEP_NAMES = {
+    1: "Alignement", 2: "SNPs", 3: "SVs", 4: "CNVkit",
+    5: "Méthylation", 6: "QC", 7: "Annotation",
+}
+
+# Sorties vérifiées (relatives à results/<sample>, motifs glob acceptés)
+STEP_OUTPUTS = {
+    1: ["mapping/*.bam"],
+    2: ["snps_clair3/merge_output.vcf.gz"],
+    3: ["svs/final_SVs.vcf"],
+    4: ["cnvkit/*.cns"],
+    5: ["methylation/*.segmeth.tsv"],
+    6: ["qc/multiqc_report.html"],
+    7: ["annotation/fusion/{sample}_annotation_final.tsv"],
+}
+
+STEP_SCRIPTS = {
+    1: "sbatch/step1_align.sbatch", 2: "sbatch/step2_snps.sbatch", 3: "sbatch/step3_svs.sbatch",
+    4: "sbatch/step4_cnvkit.sbatch", 5: "sbatch/step5_methylation.sbatch",
+    6: "sbatch/step6_qc.sbatch", 7: "sbatch/step7_annotation.sbatch",
+}
+
+_SV_ENV = [os.path.join(PIPELINE_DIR, ".conda_envs", "sv_env")]
+STEP_TOOLS = {
+    1: _SV_ENV,
+    2: _SV_ENV,
+    3: _SV_ENV + [os.path.join(PIPELINE_DIR, ".conda_envs", "sv_sniff")],
+    4: [os.path.join(PIPELINE_DIR, ".conda_envs", "cnvkit_env")],
+    5: _SV_ENV,
+    6: _SV_ENV,
+    7: [
+        os.path.join(HOME, "local", "bin", "miniconda", "envs", "sv_env"),
+        os.path.join(HOME, "local", "bin", "ensembl-vep", "vep"),
+        os.path.join(HOME, "local", "bin", "annovar", "table_annovar.pl"),
+    ],
+}
+
+
+def file_fingerprint(path):
+    """Taille + SHA-1 de blocs échantillonnés (lecture bornée quelle que soit la taille)."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        if size <= SAMPLE_BLOCKS * BLOCK_SIZE:
+            digest.update(f.read())
+        else:
+            step = (size - BLOCK_SIZE) / (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                f.seek(int(i * step))
+                digest.update(f.read(BLOCK_SIZE))
+    return f"{size}:{digest.hexdigest()[:20]}"
+
+
+def dir_fingerprint(path):
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(full, path)}\t{st.st_size}\t{st.st_mtime_ns}\n".encode())
+    return f"dir:{digest.hexdigest()[:20]}"
+
+
+def fingerprint(path):
+    """Empreinte d'un fichier, d'un dossier ou d'une liste "a,b,c" ; None si absent."""
+    if "," in path and not os.path.exists(path):
+        parts = [fingerprint(p) for p in path.split(",")]
+        return None if None in parts else "list:" + hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+    if os.path.isdir(path):
+        return dir_fingerprint(path)
+    if os.path.isfile(path):
+        return file_fingerprint(path)
+    return None
+
+
+def env_fingerprint(path):
+    """Empreinte d'un environnement conda (historique des paquets) ou d'un fichier outil."""
+    history = os.path.join(path, "conda-meta", "history")
+    if os.path.isfile(history):
+        return file_fingerprint(history)
+    if os.path.isfile(path):
+        return file_fingerprint(path)
+    return None
+
+
+def tool_fingerprints(step):
+    tools = {}
+    script = os.path.join(PIPELINE_DIR, STEP_SCRIPTS[step])
+    if os.path.isfile(script):
+        tools[STEP_SCRIPTS[step]] = file_fingerprint(script)
+    for path in STEP_TOOLS.get(step, []):
+        value = env_fingerprint(path)
+        if value:
+            tools[path] = value
+    return tools
+
+
+def sample_dir(sample):
+    return os.path.join("results", sample)
+
+
+def manifest_path(sample, step):
+    return os.path.join(sample_dir(sample), "manifests", f"step{step}.json")
+
+
+def load_manifest(sample, step):
+    try:
+        with open(manifest_path(sample, step)) as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            return data
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def load_manifests(sample):
+    """{numéro d'étape: manifeste} des étapes déjà enregistrées (lu par l'interface)."""
+    return {step: m for step in STEP_NAMES if (m := load_manifest(sample, step))}
+
+
+def _write_manifest(sample, step, data):
+    path = manifest_path(sample, step)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def output_fingerprints(sample, step):
+    """{chemin relatif: empreinte} des sorties ; None si une sortie attendue manque."""
+    base = sample_dir(sample)
+    outputs = {}
+    for pattern in STEP_OUTPUTS[step]:
+        matches = sorted(glob.glob(os.path.join(base, pattern.format(sample=sample))))
+        if not matches:
+            return None
+        for path in matches:
+            outputs[os.path.relpath(path, base)] = file_fingerprint(path)
+    return outputs
+
+
+def current_state(step, inputs, params):
+    return {
+        "inputs": {role: {"path": path, "fingerprint": fingerprint(path)} for role, path in inputs.items()},
+        "params": params,
+        "tools": tool_fingerprints(step),
+    }
+
+
+def compare(manifest, state, outputs):
+    """Liste des différences entre le manifeste et l'état courant (vide = à jour)."""
+    reasons = []
+    old_inputs = manifest.get("inputs", {})
+    for role, info in state["inputs"].items():
+        if info["fingerprint"] is None:
+            reasons.append(f"entrée {role} introuvable : {info['path']}")
+        elif role not in old_inputs:
+            reasons.append(f"nouvelle entrée {role}")
+        elif old_inputs[role]["fingerprint"] != info["fingerprint"]:
+            reasons.append(f"entrée {role} modifiée ({info['path']})")
+    for role in old_inputs:
+        if role not in state["inputs"]:
+            reasons.append(f"entrée {role} retirée")
+    for key in sorted(set(manifest.get("params", {})) | set(state["params"])):
+        old = manifest.get("params", {}).get(key)
+        new = state["params"].get(key)
+        if old != new:
+            reasons.append(f"paramètre {key} : {old!r} -> {new!r}")
+    old_tools = manifest.get("tools", {})
+    for name in sorted(set(old_tools) | set(state["tools"])):
+        if old_tools.get(name) != state["tools"].get(name):
+            reasons.append(f"outil modifié : {os.path.basename(name)}")
+    if outputs is None:
+        reasons.append("sortie manquante")
+    elif outputs != manifest.get("outputs"):
+        reasons.append("sorties modifiées depuis le dernier lancement")
+    return reasons
+
+
+def check(sample, step, inputs, params):
+    """(à jour ?, raisons). Un passage à jour est horodaté dans le manifeste (last_skipped)."""
+    manifest = load_manifest(sample, step)
+    if manifest is None:
+        return False, ["aucun manifeste (étape jamais terminée)"]
+    reasons = compare(manifest, current_state(step, inputs, params), output_fingerprints(sample, step))
+    if not reasons:
+        manifest["last_skipped"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        _write_manifest(sample, step, manifest)
+    return not reasons, reasons
+
+
+def commit(sample, step, inputs, params, job=None):
+    outputs = output_fingerprints(sample, step)
+    if outputs is None:
+        raise ValueError(f"sorties de l'étape {step} introuvables, manifeste non écrit")
+    state = current_state(step, inputs, params)
+    missing = [role for role, info in state["inputs"].items() if info["fingerprint"] is None]
+    if missing:
+        raise ValueError(f"entrées introuvables : {', '.join(missing)}")
+    _write_manifest(sample, step, {
+        "version": MANIFEST_VERSION,
+        "step": step,
+        "name": STEP_NAMES[step],
+        "sample": sample,
+        "job": job,
+        "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **state,
+        "outputs": outputs,
+    })
+
+
+def _pairs(values, option):
+    result = {}
+    for item in values or []:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"{option} attend clé=valeur : {item}")
+        result[key] = value
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manifestes d'étape du pipeline")
+    parser.add_argument("command", choices=("check", "commit", "status"))
+    parser.add_argument("--sample", required=True)
+    parser.add_argument("--step", type=int, choices=sorted(STEP_NAMES))
+    parser.add_argument("--input", action="append", help="rôle=chemin (répétable)")
+    parser.add_argument("--param", action="append", help="clé=valeur (répétable)")
+    parser.add_argument("--job", help="Job SLURM de l'étape (commit)")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        manifests = load_manifests(args.sample)
+        for step, name in STEP_NAMES.items():
+            m = manifests.get(step)
+            print(f"{step}\t{name}\t{m['completed_at'] if m else '-'}\t{m.get('last_skipped', '-') if m else '-'}")
+        return 0
+
+    if args.step is None:
+        parser.error("--step est requis pour check et commit")
+    inputs = {role: path for role, path in _pairs(args.input, "--input").items() if path}
+    params = _pairs(args.param, "--param")
+
+    if args.command == "check":
+        current, reasons = check(args.sample, args.step, inputs, params)
+        if current:
+            print(f"Étape {args.step} ({STEP_NAMES[args.step]}) à jour : entrées, paramètres et outils inchangés")
+            return 0
+        print(f"Étape {args.step} ({STEP_NAMES[args.step]}) à relancer : {'; '.join(reasons)}")
+        return 1
+
+    try:
+        commit(args.sample, args.step, inputs, params, args.job)
+    except (OSError, ValueError) as e:
+        print(f"Manifeste de l'étape {args.step} non enregistré : {e}", file=sys.stderr)
+        return 1
+    print(f"Manifeste enregistré : {manifest_path(args.sample, args.step)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""Télémétrie des jobs SLURM du pipeline, collectée avec sacct dans une base SQLite locale.
+
+Les identifiants de jobs sont lus dans results/<sample>/jobs.tsv (écrit par
+run_pipeline.sh au moment de la soumission). `collect` interroge sacct en un
+seul appel par lot de jobs et enregistre durée, MaxRSS, TotalCPU et état
+final. Les jobs terminés ne sont plus réinterrogés.
+
+Usage :
+    python3 -m scripts.telemetry collect [--watch 300]
+    python3 -m scripts.telemetry report [--sample S]
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+DB_PATH = os.environ.get("PIPELINE_TELEMETRY_DB", os.path.join("results", "telemetry.sqlite"))
+
+STEP_LABELS = {
+    "1": "Alignement",
+    "2": "SNPs (Clair3)",
+    "3": "SVs",
+    "4": "CNVkit",
+    "5": "Méthylation",
+    "6": "QC",
+    "7": "Annotation",
+}
+
+TERMINAL_STATES = {
+    "COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY",
+    "NODE_FAIL", "PREEMPTED", "BOOT_FAIL", "DEADLINE",
+}
+
+SACCT_FIELDS = [
+    "JobID", "State", "ExitCode", "Elapsed", "TotalCPU", "MaxRSS",
+    "AllocCPUS", "ReqMem", "Timelimit", "Start", "End",
+]
+
+# Nombre de jobs par appel sacct
+SACCT_BATCH = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    sample TEXT NOT NULL,
+    step TEXT NOT NULL,
+    submitted_at TEXT,
+    state TEXT,
+    exit_code TEXT,
+    elapsed_s REAL,
+    total_cpu_s REAL,
+    alloc_cpus INTEGER,
+    alloc_cpu_s REAL,
+    req_mem_bytes REAL,
+    max_rss_bytes REAL,
+    timelimit_s REAL,
+    start TEXT,
+    end TEXT,
+    updated_at REAL
+)
+"""
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4, "P": 1024 ** 5}
+
+
+def connect(db_path=DB_PATH):
+    """Ouvre (et crée si besoin) la base de télémétrie."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def parse_duration(value):
+    """Convertit une durée sacct ([D-]HH:MM:SS[.mmm] ou MM:SS.mmm) en secondes."""
+    if not value or value in ("UNLIMITED", "Partition_Limit", "INVALID"):
+        return None
+    days = 0
+    if "-" in value:
+        day_part, value = value.split("-", 1)
+        days = int(day_part)
+    parts = [float(p) for p in value.split(":")]
+    while len(parts) < 3:
+        parts.insert(0, 0.0)
+    hours, minutes, seconds = parts
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def parse_size(value, alloc_cpus=None):
+    """Convertit une taille sacct (ex. 12345K, 256G, 4000Mc, 256Gn) en octets."""
+    if not value:
+        return None
+    per_cpu = False
+    if value[-1] in "cn":
+        per_cpu = value[-1] == "c"
+        value = value[:-1]
+    multiplier = 1
+    if value and value[-1].upper() in _UNITS:
+        multiplier = _UNITS[value[-1].upper()]
+        value = value[:-1]
+    try:
+        size = float(value) * multiplier
+    except ValueError:
+        return None
+    if per_cpu and alloc_cpus:
+        size *= alloc_cpus
+    return size
+
+
+def register_job(conn, sample, step, job_id, submitted_at=None):
+    """Ajoute un job à suivre (sans effet s'il est déjà connu)."""
+    conn.execute(
+        "INSERT OR IGNORE INTO jobs (job_id, sample, step, submitted_at) VALUES (?, ?, ?, ?)",
+        (job_id, sample, step, submitted_at),
+    )
+
+
+def import_ledgers(conn, results_dir="results"):
+    """Importe les jobs listés dans results/<sample>/jobs.tsv."""
+    count = 0
+    for ledger in glob.glob(os.path.join(results_dir, "*", "jobs.tsv")):
+        sample = os.path.basename(os.path.dirname(ledger))
+        with open(ledger) as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) >= 3 and fields[2]:
+                    register_job(conn, sample, fields[1], fields[2], fields[0])
+                    count += 1
+    conn.commit()
+    return count
+
+
+def _run_sacct(job_ids):
+    # Jobs du pool local (run_pipeline.sh --executor local) : même format, sans sacct
+    from scripts.executor import is_local_job, sacct_rows
+    rows = sacct_rows([j for j in job_ids if is_local_job(j)])
+    job_ids = [j for j in job_ids if not is_local_job(j)]
+    if not job_ids:
+        return rows
+    cmd = [
+        "sacct", "-j", ",".join(job_ids),
+        "--parsable2", "--noheader", "--noconvert",
+        "--format=" + ",".join(SACCT_FIELDS),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "sacct a échoué")
+    for line in result.stdout.splitlines():
+        values = line.split("|")
+        if len(values) == len(SACCT_FIELDS):
+            rows.append(dict(zip(SACCT_FIELDS, values)))
+    return rows
+
+
+def _aggregate(job_id, rows):
+    """Agrège les lignes sacct d'un job (allocation, .batch, .extern, tâches d'array)."""
+    alloc_rows = [r for r in rows if "." not in r["JobID"]]
+    if not alloc_rows:
+        return None
+
+    # Pour un job array : une tâche en cours, sinon une tâche en échec, l'emporte
+    states = [r["State"].split()[0] for r in alloc_rows]
+    state = next(
+        (s for s in states if s not in TERMINAL_STATES),
+        next((s for s in states if s != "COMPLETED"), "COMPLETED"),
+    )
+
+    alloc_cpus = max(int(r["AllocCPUS"] or 0) for r in alloc_rows)
+    elapsed = [parse_duration(r["Elapsed"]) for r in alloc_rows]
+    # Capacité CPU réservée (somme sur les tâches pour un job array)
+    alloc_cpu_s = sum((e or 0) * int(r["AllocCPUS"] or 0) for e, r in zip(elapsed, alloc_rows))
+    total_cpu = [parse_duration(r["TotalCPU"]) for r in alloc_rows]
+    req_mem = [parse_size(r["ReqMem"], int(r["AllocCPUS"] or 0)) for r in alloc_rows]
+    max_rss = [parse_size(r["MaxRSS"]) for r in rows if r["MaxRSS"]]
+    timelimit = [parse_duration(r["Timelimit"]) for r in alloc_rows]
+
+    return {
+        "state": state,
+        "exit_code": alloc_rows[0]["ExitCode"],
+        "elapsed_s": max((e for e in elapsed if e is not None), default=None),
+        "total_cpu_s": sum(t for t in total_cpu if t is not None),
+        "alloc_cpus": alloc_cpus,
+        "alloc_cpu_s": alloc_cpu_s,
+        "req_mem_bytes": max((m for m in req_mem if m is not None), default=None),
+        "max_rss_bytes": max((m for m in max_rss if m is not None), default=None),
+        "timelimit_s": max((t for t in timelimit if t is not None), default=None),
+        "start": min(r["Start"] for r in alloc_rows),
+        "end": max(r["End"] for r in alloc_rows),
+    }
+
+
+def collect(conn, results_dir="results"):
+    """Met à jour, via sacct, tous les jobs non terminés. Retourne le nombre de jobs mis à jour."""
+    import_ledgers(conn, results_dir)
+    pending = [
+        row["job_id"] for row in conn.execute("SELECT job_id, state FROM jobs")
+        if row["state"] not in TERMINAL_STATES
+    ]
+    updated = 0
+    for i in range(0, len(pending), SACCT_BATCH):
+        batch = pending[i:i + SACCT_BATCH]
+        by_job = {}
+        for row in _run_sacct(batch):
+            base = row["JobID"].split(".")[0]
+            for job_id in batch:
+                if base == job_id or base.startswith(job_id + "_"):
+                    by_job.setdefault(job_id, []).append(row)
+        for job_id, rows in by_job.items():
+            stats = _aggregate(job_id, rows)
+            if stats is None:
+                continue
+            stats["updated_at"] = time.time()
+            stats["job_id"] = job_id
+            conn.execute(
+                "UPDATE jobs SET " + ", ".join(f"{k} = :{k}" for k in stats if k != "job_id")
+                + " WHERE job_id = :job_id",
+                stats,
+            )
+            updated += 1
+        conn.commit()
+    return updated
+
+
+def efficiency_rows(conn, sample=None):
+    """Jobs terminés avec leurs efficacités CPU (utilisé / demandé) et mémoire (pic / demandé)."""
+    query = "SELECT * FROM jobs WHERE elapsed_s IS NOT NULL"
+    params = []
+    if sample:
+        query += " AND sample = ?"
+        params.append(sample)
+    rows = []
+    for row in conn.execute(query + " ORDER BY submitted_at, job_id", params):
+        if row["state"] not in TERMINAL_STATES:
+            continue
+        cpu_capacity = row["alloc_cpu_s"]
+        rows.append({
+            "job_id": row["job_id"],
+            "sample": row["sample"],
+            "step": row["step"],
+            "label": STEP_LABELS.get(row["step"], row["step"]),
+            "state": row["state"],
+            "elapsed_h": row["elapsed_s"] / 3600 if row["elapsed_s"] is not None else None,
+            "cpus": row["alloc_cpus"],
+            "cpu_eff": row["total_cpu_s"] / cpu_capacity if cpu_capacity else None,
+            "max_rss_gb": row["max_rss_bytes"] / 1024 ** 3 if row["max_rss_bytes"] else None,
+            "req_mem_gb": row["req_mem_bytes"] / 1024 ** 3 if row["req_mem_bytes"] else None,
+            "mem_eff": (row["max_rss_bytes"] / row["req_mem_bytes"]
+                        if row["max_rss_bytes"] and row["req_mem_bytes"] else None),
+        })
+    return rows
+
+
+def step_summary(rows):
+    """Moyennes par étape des efficacités calculées par efficiency_rows."""
+    by_step = {}
+    for row in rows:
+        by_step.setdefault(row["step"], []).append(row)
+    summary = []
+    for step in sorted(by_step):
+        items = by_step[step]
+
+        def mean(key):
+            values = [r[key] for r in items if r[key] is not None]
+            return sum(values) / len(values) if values else None
+
+        summary.append({
+            "step": step,
+            "label": STEP_LABELS.get(step, step),
+            "jobs": len(items),
+            "elapsed_h": mean("elapsed_h"),
+            "cpu_eff": mean("cpu_eff"),
+            "max_rss_gb": max((r["max_rss_gb"] for r in items if r["max_rss_gb"] is not None), default=None),
+            "mem_eff": mean("mem_eff"),
+        })
+    return summary
+
+
+def _fmt(value, pattern):
+    return pattern.format(value) if value is not None else "-"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Télémétrie sacct des jobs du pipeline")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--results", default="results")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_collect = sub.add_parser("collect", help="Interroge sacct pour les jobs non terminés")
+    p_collect.add_argument("--watch", type=int, default=0, help="Répète la collecte toutes les N secondes")
+
+    p_report = sub.add_parser("report", help="Affiche l'efficacité par étape")
+    p_report.add_argument("--sample")
+
+    args = parser.parse_args(argv)
+    conn = connect(args.db)
+
+    if args.command == "collect":
+        while True:
+            print(f"{collect(conn, args.results)} job(s) mis à jour")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    elif args.command == "report":
+        print("step\tlabel\tjobs\telapsed_h\tcpu_eff\tmax_rss_gb\tmem_eff")
+        for row in step_summary(efficiency_rows(conn, args.sample)):
+            print("\t".join([
+                row["step"], row["label"], str(row["jobs"]),
+                _fmt(row["elapsed_h"], "{:.2f}"), _fmt(row["cpu_eff"], "{:.0%}"),
+                _fmt(row["max_rss_gb"], "{:.1f}"), _fmt(row["mem_eff"], "{:.0%}"),
+            ]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Données de l'interface issues du système de fichiers et de SLURM, en cache partagé.
+
+Chaque interaction Streamlit relance le script : sans cache, la liste des
+échantillons (listdir + un stat de config par échantillon), la vue d'ensemble
+(un glob par échantillon et par étape), les FASTQ, squeue et les bases SQLite
+seraient relus à chaque clic. Les résultats sont conservés au niveau du module,
+donc partagés par toutes les sessions du serveur, et recalculés quand leur TTL
+expire ou que le mtime d'un dossier surveillé change.
+
+Les valeurs renvoyées sont partagées : ne pas les modifier.
+"""
+import functools
+import os
+import subprocess
+import threading
+import time
+
+from scripts.fastq_inventory import load_inventory, list_fastq
+from scripts.sample_sheet import list_batches, output_matrix
+from scripts import executor
+from scripts import sample_registry
+from scripts import telemetry
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def memoize(ttl, watch=None):
+    """Résultat partagé, recalculé après `ttl` secondes ou quand le mtime d'un
+    des chemins renvoyés par watch(*args) change. func.clear() vide son cache."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (func.__name__, args)
+            stamp = tuple(_mtime(p) for p in watch(*args)) if watch else None
+            now = time.monotonic()
+            with _lock:
+                cached = _memory_cache.get(key)
+            if cached is not None and cached[1] == stamp and now - cached[0] < ttl:
+                return cached[2]
+            # Calcul hors verrou : deux sessions simultanées peuvent recalculer, sans se bloquer
+            value = func(*args)
+            with _lock:
+                _memory_cache[key] = (now, stamp, value)
+            return value
+
+        def clear():
+            with _lock:
+                for key in [k for k in _memory_cache if k[0] == func.__name__]:
+                    del _memory_cache[key]
+
+        wrapper.clear = clear
+        return wrapper
+    return decorator
+
+
+def clear_all():
+    with _lock:
+        _memory_cache.clear()
+
+
+# Créer config_<sample>.txt dans un dossier existant ne change pas le mtime de
+# results/ : le TTL borne ce délai (save_config vide aussi le cache)
+@memoize(ttl=30, watch=lambda results_dir="results", with_config=True: [results_dir])
+def list_samples(results_dir="results", with_config=True):
+    """Échantillons de results/ (avec un config_<sample>.txt si with_config), triés."""
+    samples = []
+    try:
+        with os.scandir(results_dir) as it:
+            for entry in it:
+                if not entry.is_dir() or entry.name == "batches":
+                    continue
+                if with_config and not os.path.exists(os.path.join(entry.path, f"config_{entry.name}.txt")):
+                    continue
+                samples.append(entry.name)
+    except OSError:
+        pass
+    return sorted(samples)
+
+
+# Chaque transaction du registre (mode WAL) modifie samples.sqlite-wal
+@memoize(ttl=30, watch=lambda *args: [sample_registry.DB_PATH, sample_registry.DB_PATH + "-wal"])
+def registered_samples(status=None, reference=None):
+    """sample_registry.list_samples ; les configs antérieures au registre sont importées au premier appel."""
+    conn = sample_registry.connect()
+    try:
+        if conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == 0:
+            sample_registry.import_legacy(conn)
+        return sample_registry.list_samples(conn, status, reference)
+    finally:
+        conn.close()
+
+
+@memoize(ttl=60, watch=lambda results_dir="results": [results_dir])
+def sample_overview(results_dir="results"):
+    """Matrice de présence des sorties (sample_sheet.output_matrix) des échantillons configurés."""
+    return output_matrix(list_samples(results_dir))
+
+
+# Les FASTQ arrivent dans les sous-dossiers barcodeXX : seul le TTL s'applique
+@memoize(ttl=60)
+def fastq_files(base_path, extensions=None):
+    """FASTQ relatifs à base_path (inventaire fastq_inventory), [] si le dossier n'existe pas."""
+    if not os.path.exists(base_path):
+        return []
+    return list_fastq(load_inventory(base_path), list(extensions) if extensions else None)
+
+
+@memoize(ttl=300, watch=lambda folder: [folder])
+def bed_files(folder):
+    try:
+        return sorted(f for f in os.listdir(folder) if f.endswith(".bed"))
+    except OSError:
+        return []
+
+
+@memoize(ttl=60, watch=lambda results_dir="results": [os.path.join(results_dir, "batches")])
+def batches(results_dir="results"):
+    return list_batches(results_dir)
+
+
+@memoize(ttl=10, watch=lambda log_dir="logs": [log_dir])
+def log_files(log_dir="logs"):
+    """Fichiers .out de log_dir, du plus récent au plus ancien."""
+    entries = []
+    try:
+        with os.scandir(log_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".out"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.name))
+                    except OSError:
+                        continue
+    except OSError:
+        pass
+    return [name for _, name in sorted(entries, reverse=True)]
+
+
+@memoize(ttl=15)
+def squeue(user):
+    """(code de retour, sortie) de squeue -u user ; (None, message) si squeue est indisponible."""
+    try:
+        result = subprocess.run(["squeue", "-u", user], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return None, str(e)
+    return result.returncode, result.stdout
+
+
+@memoize(ttl=5)
+def local_jobs(window_s=3600):
+    """Jobs du pool local en attente, en cours ou terminés depuis window_s secondes."""
+    return executor.queue_rows(include_done_since=time.time() - window_s)
+
+
+@memoize(ttl=60)
+def telemetry_rows(sample=None):
+    """telemetry.efficiency_rows (vider après une collecte)."""
+    conn = telemetry.connect()
+    try:
+        return telemetry.efficiency_rows(conn, sample)
+    finally:
+        conn.close()
@@ -0,0 +1,127 @@
+"""Découpage d'un VCF en shards pour l'annotation (étape 7) et réassemblage des sorties.
+
+Le VCF est coupé en N blocs contigus d'environ le même nombre de variants, dans
+l'ordre du fichier (un chromosome peut être partagé entre deux shards voisins).
+VEP et ANNOVAR conservent l'ordre de leur entrée : concaténer les sorties des
+shards dans l'ordre des numéros redonne donc exactement l'ordre du VCF.
+
+Usage :
+    python3 scripts/vcf_shards.py split --vcf S.vcf.gz --shards 10 --outdir annotation/shards
+    python3 scripts/vcf_shards.py gather --header comments -o S_annotation_vep.tsv shard_*_vep.tsv
+    python3 scripts/vcf_shards.py gather --header first-line -o S.hg38_multianno.txt shard_*.txt
+
+split affiche le nombre de shards écrits.
+"""
+import argparse
+import glob
+import gzip
+import os
+import shutil
+import sys
+
+# Nombre minimal de variants par shard (démarrage VEP + plugins coûteux)
+MIN_SHARD_VARIANTS = 2000
+
+
+def _open_vcf(path):
+    return gzip.open(path, "rt") if path.endswith((".gz", ".bgz")) else open(path)
+
+
+def count_variants(path):
+    with _open_vcf(path) as f:
+        return sum(1 for line in f if not line.startswith("#"))
+
+
+def split_vcf(path, n_shards, outdir, min_variants=MIN_SHARD_VARIANTS):
+    """Écrit outdir/shard_NNNN.vcf (en-tête complet + bloc de variants) ; retourne les chemins."""
+    total = count_variants(path)
+    n_shards = max(1, min(n_shards, -(-total // min_variants))) if total else 1
+    per_shard = -(-total // n_shards) if total else 0
+
+    os.makedirs(outdir, exist_ok=True)
+    for old in glob.glob(os.path.join(outdir, "shard_*")):
+        os.remove(old)
+
+    header = []
+    paths = []
+    out = None
+    written = 0
+    with _open_vcf(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                header.append(line)
+                continue
+            if out is None or (written >= per_shard and len(paths) < n_shards):
+                if out:
+                    out.close()
+                paths.append(os.path.join(outdir, f"shard_{len(paths) + 1:04d}.vcf"))
+                out = open(paths[-1], "w")
+                out.writelines(header)
+                written = 0
+            out.write(line)
+            written += 1
+    if out:
+        out.close()
+    elif header:
+        # VCF sans variant : un shard avec l'en-tête seul
+        paths.append(os.path.join(outdir, "shard_0001.vcf"))
+        with open(paths[-1], "w") as out:
+            out.writelines(header)
+    return paths
+
+
+def gather(parts, dest, header="comments"):
+    """Concatène les sorties des shards en ne gardant que l'en-tête du premier.
+
+    header="comments" : en-tête = lignes commençant par "#" (VEP --tab, VCF) ;
+    header="first-line" : en-tête = première ligne (table_annovar .txt).
+    """
+    tmp_path = f"{dest}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as out:
+        for i, part in enumerate(parts):
+            with open(part) as f:
+                if i == 0:
+                    shutil.copyfileobj(f, out)
+                    continue
+                if header == "first-line":
+                    next(f, None)
+                    shutil.copyfileobj(f, out)
+                else:
+                    for line in f:
+                        if not line.startswith("#"):
+                            out.write(line)
+                            break
+                    shutil.copyfileobj(f, out)
+    os.replace(tmp_path, dest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shards VCF pour l'annotation VEP / ANNOVAR")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_split = sub.add_parser("split")
+    p_split.add_argument("--vcf", required=True)
+    p_split.add_argument("--shards", type=int, default=8)
+    p_split.add_argument("--min-variants", type=int, default=MIN_SHARD_VARIANTS)
+    p_split.add_argument("--outdir", required=True)
+
+    p_gather = sub.add_parser("gather")
+    p_gather.add_argument("--header", choices=("comments", "first-line"), default="comments")
+    p_gather.add_argument("-o", "--output", required=True)
+    p_gather.add_argument("parts", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        paths = split_vcf(args.vcf, args.shards, args.outdir, args.min_variants)
+        if not paths:
+            print(f"VCF vide ou sans en-tête : {args.vcf}", file=sys.stderr)
+            return 1
+        print(len(paths))
+        return 0
+
+    gather(sorted(args.parts), args.output, args.header)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
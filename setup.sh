@@ -141,6 +141,17 @@ validate_installation() {
     fi
 }
 
+# Activation en cache des environnements de chaque étape (scripts/activate_env.sh) :
+# les jobs sourcent un script de variables au lieu de relancer conda activate
+build_activation_cache() {
+    log "Construction du cache d'activation des environnements..."
+    if PIPELINE_DIR="$PIPELINE_DIR" bash "$PIPELINE_DIR/scripts/activate_env.sh" build | tee -a "$LOG_FILE"; then
+        log "✓ Cache d'activation construit"
+    else
+        log "ATTENTION: cache d'activation incomplet, les jobs activeront conda directement"
+    fi
+}
+
 # AJOUT: Fonction pour créer un script d'initialisation
 create_init_script() {
     log "Création du script d'initialisation..."
@@ -177,6 +188,7 @@ main() {
     install_conda
     setup_conda_environments
     validate_installation
+    build_activation_cache
     create_init_script
     
     log "=== Installation terminée avec succès ==="
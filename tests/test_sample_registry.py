@@ -0,0 +1,23 @@
+"""Registre des échantillons : clés ajoutées à config_<sample>.txt hors du registre."""
+from contextlib import closing
+
+from scripts import sample_registry
+
+
+def test_cles_ajoutees_au_fichier_conservees_au_relancement(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = sample_registry.write_config_file("S", {"sample_name": "S", "reference": "ref.fa",
+                                                   "partition": "p", "threads": "2"})
+    with closing(sample_registry.connect("results/samples.sqlite")) as conn:
+        sample_registry.import_config(conn, path)
+        # Écritures directes de step1_align.sbatch et run_pipeline.sh (echo >>)
+        with open(path, "a") as f:
+            f.write("bam_file=/data/custom.bam\ncnv_bam=/data/cnv.bam\n")
+        # Relancement : run_pipeline.sh enregistre les paramètres du lancement
+        sample_registry.save_config(conn, "S", {"reference": "ref.fa", "partition": "p", "threads": "4"})
+
+        params = sample_registry.read_config_file(path)
+        assert params["bam_file"] == "/data/custom.bam"
+        assert params["cnv_bam"] == "/data/cnv.bam"
+        assert params["threads"] == "4"
+        assert sample_registry.get_params(conn, "S")["bam_file"] == "/data/custom.bam"